@@ -0,0 +1,169 @@
+# app/asgi_app.py
+"""
+ASGI application behind asgi.py.
+
+POST /api/chat and /api/chat/stream run on asyncio: the request still goes
+through Flask's request context (rate limits, session, after-request hooks),
+but the RAG call awaits app.chatbot.async_core instead of blocking a thread.
+Every other route is the unchanged Flask app behind asgiref's WSGI adapter.
+"""
+import io, sys, asyncio
+from flask import session, jsonify
+from asgiref.wsgi import WsgiToAsgi
+from app.main import app as flask_app
+from app.chatbot.core import route_message
+from app.chatbot import async_core, health
+from app.chatbot.clients import CLIENT_WARMUP
+from app.routes.chat import _read_query, _log_query, _critical_error, _json_response, _sse, SSE_HEADERS
+
+# path -> streaming?
+ASYNC_ROUTES = {"/api/chat": False, "/api/chat/stream": True}
+
+_wsgi = WsgiToAsgi(flask_app)
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] == "http" and scope["method"] == "POST":
+        stream = ASYNC_ROUTES.get(_path(scope))
+        if stream is not None:
+            return await _chat(scope, receive, send, stream)
+    await _wsgi(scope, receive, send)
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            if CLIENT_WARMUP:
+                # In the background: the server starts accepting requests right away
+                asyncio.ensure_future(async_core.warm_up())
+            health.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await async_core.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+# --- Chat Routes ---
+async def _chat(scope, receive, send, stream: bool):
+    body = await _read_body(receive)
+    ctx = flask_app.request_context(_build_environ(scope, body))
+    ctx.push()
+    events = None
+    try:
+        try:
+            rv = flask_app.preprocess_request()   # rate limits and other before_request hooks
+            if rv is None:
+                rv, events = await _chat_view(stream)
+        except Exception as e:
+            rv = flask_app.handle_user_exception(e)
+        response = flask_app.finalize_request(rv)  # saves the session, runs after_request hooks
+    finally:
+        ctx.pop()
+
+    if events is None:
+        await _start_response(send, response)
+        await send({"type": "http.response.body", "body": response.get_data()})
+    else:
+        await _start_response(send, response, streaming=True)
+        await _stream_events(receive, send, events)
+
+async def _chat_view(stream: bool):
+    """Mirrors chat() / chat_stream() in app/routes/chat.py. Returns (rv, events)."""
+    route = "/api/chat/stream" if stream else "/api/chat"
+    try:
+        q = _read_query()
+        if not q:
+            return (jsonify({"error": "query is required"}), 400), None
+        _log_query(q)
+
+        # Off the event loop: a form's last step writes to Google Sheets (blocking gspread calls)
+        result = await asyncio.to_thread(route_message, q, session)
+        if stream:
+            if result is not None:
+                body = _sse("done", result)
+                return flask_app.response_class(body, mimetype="text/event-stream", headers=SSE_HEADERS), None
+            events = async_core.get_rag_answer_stream(q)
+            return flask_app.response_class(mimetype="text/event-stream", headers=SSE_HEADERS), events
+
+        if result is None:
+            result = await async_core.get_rag_answer(q)
+        return (_json_response(result), 200), None
+    except Exception as e:
+        return _critical_error(route), None
+
+async def _stream_events(receive, send, events):
+    """Sends SSE frames as they are produced; stops generating if the client goes away."""
+    async def pump():
+        async for event, payload in events:
+            await send({"type": "http.response.body", "body": _sse(event, payload).encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def wait_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    pump_task = asyncio.ensure_future(pump())
+    watch_task = asyncio.ensure_future(wait_disconnect())
+    try:
+        await asyncio.wait({pump_task, watch_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (pump_task, watch_task):
+            task.cancel()
+        await asyncio.gather(pump_task, watch_task, return_exceptions=True)
+        await events.aclose()
+    if pump_task.done() and not pump_task.cancelled() and pump_task.exception():
+        print(f"[ASGI Error] Stream failed: {pump_task.exception()}")
+
+# --- ASGI <-> WSGI Plumbing ---
+def _path(scope) -> str:
+    path, root = scope["path"], scope.get("root_path", "")
+    return path[len(root):] if root and path.startswith(root) else path
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+def _build_environ(scope, body: bytes) -> dict:
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": _path(scope).encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("ascii"),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "SERVER_NAME": (scope.get("server") or ("localhost", 80))[0],
+        "SERVER_PORT": str((scope.get("server") or ("localhost", 80))[1]),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope.get("headers", []):
+        name, value = name.decode("latin1"), value.decode("latin1")
+        if name == "content-length":
+            continue
+        key = "CONTENT_TYPE" if name == "content-type" else "HTTP_" + name.upper().replace("-", "_")
+        sep = "; " if name == "cookie" else ","
+        environ[key] = f"{environ[key]}{sep}{value}" if key in environ else value
+    return environ
+
+async def _start_response(send, response, streaming: bool = False):
+    headers = [
+        (name.lower().encode("latin1"), value.encode("latin1"))
+        for name, value in response.headers.items()
+        if not (streaming and name.lower() == "content-length")
+    ]
+    await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
@@ -0,0 +1,333 @@
+# app/chatbot/async_core.py
+"""
+asyncio twin of the RAG pipeline in core.py, used by the ASGI entry point
+(asgi.py). Cohere, Groq and Pinecone are called through async clients, each
+on its own httpx connection pool, so a waiting request holds no thread and
+one dependency's streams can't take another's connections.
+DDGS has no async API and runs on core's web-search thread pool. Calls go
+through the same deadlines and circuit breakers as core's (resilience.py).
+"""
+import os, time, asyncio
+import httpx
+from app.chatbot import core
+from app.utils import metrics, resilience
+from app.chatbot.cache import normalize_query
+from app.chatbot.clients import CLIENT_KEEPALIVE_EXPIRY
+from app.chatbot.singleflight import AsyncSingleFlight, SINGLEFLIGHT_ENABLED
+from app.chatbot.batcher import AsyncEmbedBatcher, EMBED_BATCH_ENABLED
+# Prompts, gating and result shaping are core's; only the I/O differs here
+from app.chatbot.core import (
+    COHERE_API_KEY, GROQ_API_KEY, PINECONE_API_KEY, INDEX_NAME, EMBED_MODEL, TOP_K,
+    NO_RESULTS_MESSAGE, WEB_ERROR_MESSAGE, WEB_NOTE,
+    answer_cache, llm_router, _build_prompt, _build_web_prompt, _count_answer, _error_result,
+    _first_token, _rag_result, _remember, _reply, _search_web, _select_contexts, _semantic_lookup,
+    _NoInfoFilter,
+)
+
+# --- Connection Pool ---
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "200"))
+ASYNC_HTTP_MAX_KEEPALIVE = int(os.getenv("ASYNC_HTTP_MAX_KEEPALIVE", "50"))
+ASYNC_HTTP_TIMEOUT = float(os.getenv("ASYNC_HTTP_TIMEOUT", "30"))
+PINECONE_API_VERSION = os.getenv("PINECONE_API_VERSION", "2025-04")
+
+# Identical questions in flight on this worker's event loop share one pipeline run
+rag_flights = AsyncSingleFlight()
+
+# Created on first use inside the server's event loop (httpx pools are loop-bound)
+_http = None        # Pinecone data-plane requests
+_pools = []         # every pool, for aclose()
+_co = None
+_groq = None
+_pinecone_host = None
+
+def _pool():
+    pool = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=ASYNC_HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=ASYNC_HTTP_MAX_KEEPALIVE,
+                            keepalive_expiry=CLIENT_KEEPALIVE_EXPIRY),
+        timeout=ASYNC_HTTP_TIMEOUT,
+    )
+    _pools.append(pool)
+    return pool
+
+def _clients():
+    global _http, _co, _groq
+    if _http is None:
+        import cohere
+        from groq import AsyncGroq
+        _http = _pool()
+        _co = cohere.AsyncClient(COHERE_API_KEY, httpx_client=_pool(), timeout=resilience.TIMEOUTS["cohere"]) if COHERE_API_KEY else None
+        _groq = AsyncGroq(api_key=GROQ_API_KEY, http_client=_pool(), timeout=resilience.TIMEOUTS["groq"]) if GROQ_API_KEY else None
+    return _http
+
+async def aclose():
+    """Closes the connection pools (ASGI lifespan shutdown)."""
+    global _http, _co, _groq
+    for pool in _pools:
+        await pool.aclose()
+    _pools.clear()
+    _http = _co = _groq = None
+
+async def warm_up():
+    """Opens the async pool's connections before the first request (lifespan startup)."""
+    started = time.perf_counter()
+    _clients()
+    calls = []
+    if _co: calls.append(_co.models.list(page_size=1))
+    if _groq: calls.append(_groq.models.list())
+    if PINECONE_API_KEY and core.retriever.name == "pinecone":
+        calls.append(_query_pinecone_stats())
+    results = await asyncio.gather(*calls, return_exceptions=True)
+    failed = [r for r in results if isinstance(r, Exception)]
+    for e in failed:
+        print(f"[Clients Error] Async warm-up call failed: {e}")
+    print(f"[Clients] Async warm-up finished in {(time.perf_counter() - started) * 1000:.0f} ms "
+          f"({len(results) - len(failed)}/{len(results)} ok)")
+
+async def _pinecone_post(path: str, body: dict, **kwargs) -> dict:
+    global _pinecone_host
+    if _pinecone_host is None:
+        # One control-plane lookup per process; requests then go straight to the data plane
+        desc = await asyncio.to_thread(lambda: core.pinecone_client().describe_index(INDEX_NAME))
+        _pinecone_host = desc.host
+    resp = await _clients().post(
+        f"https://{_pinecone_host}/{path}",
+        headers={"Api-Key": PINECONE_API_KEY, "X-Pinecone-API-Version": PINECONE_API_VERSION},
+        json=body, **kwargs,
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+def _discard_pinecone_host():
+    # Re-resolved on the next request, like core's discarded index handle (a moved index gets a new host)
+    global _pinecone_host
+    _pinecone_host = None
+
+async def _query_pinecone_stats():
+    try:
+        await _pinecone_post("describe_index_stats", {})
+    except Exception:
+        _discard_pinecone_host()
+        raise
+
+# --- Pipeline Steps ---
+async def _embed_texts(texts: list) -> list:
+    _clients()
+    with metrics.span("embed", dependency="cohere"):
+        resp = await resilience.acall("cohere", _co.embed, model=EMBED_MODEL, input_type="search_query", texts=texts)
+    return resp.embeddings
+
+embed_batcher = AsyncEmbedBatcher(_embed_texts)
+
+async def _embed_query(text: str):
+    if EMBED_BATCH_ENABLED:
+        return await embed_batcher.embed(text)
+    return (await _embed_texts([text]))[0]
+
+async def _try_embed_query(text: str):
+    try:
+        return await _embed_query(text)
+    except Exception as e:
+        print(f"[RAG Error] Query embedding failed, using the lexical index only: {e}")
+        return None
+
+async def _query_pinecone(qvec, top_k: int):
+    if not PINECONE_API_KEY: return None
+    try:
+        body = {"vector": list(qvec), "topK": top_k, "includeMetadata": True}
+        res = await resilience.acall("pinecone", _pinecone_post, "query", body, timeout=resilience.TIMEOUTS["pinecone"])
+        matches = res.get("matches", [])
+        return [dict(m.get("metadata") or {}, score=m["score"]) for m in matches]
+    except resilience.RejectedError as e:
+        print(f"[RAG Error] Skipping Pinecone: {e}")
+        return None
+    except Exception as e:
+        metrics.error("pinecone")
+        print(f"[RAG Error] Pinecone query failed: {e}")
+        _discard_pinecone_host()
+        return None
+
+async def _query_index(qvec, top_k=TOP_K):
+    """Dense matches, or None when the vector index (or the query vector) is unavailable."""
+    if qvec is None:
+        return None
+    with metrics.span("retrieve", dependency=core.retriever.name):
+        if core.retriever.name == "pinecone":
+            return await _query_pinecone(qvec, top_k)
+        # The local index is an in-memory matrix product (a few ms)
+        return core.retriever.query(qvec, top_k)
+
+async def _retrieve(query: str, qvec):
+    """Same gating as core._retrieve; the speculative search is an asyncio Future."""
+    contexts, speculate = _select_contexts(query, await _query_index(qvec, top_k=TOP_K))
+    if not speculate:
+        return contexts, None
+    return contexts, asyncio.get_running_loop().run_in_executor(core._web_pool, _search_web, query)
+
+async def _call_groq(prompt: str, route) -> str:
+    _clients()
+    if not _groq: return "Groq client not configured."
+    with metrics.span("llm", dependency="groq"), llm_router.timed(route) as call:
+        chat = await resilience.acall(
+            "groq", _groq.chat.completions.create,
+            model=route.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3,
+            max_tokens=route.max_tokens
+        )
+        call.truncated = chat.choices[0].finish_reason == "length"
+    return chat.choices[0].message.content.strip()
+
+async def _stream_groq(prompt: str, route):
+    _clients()
+    if not _groq:
+        yield "Groq client not configured."
+        return
+    with metrics.span("llm_stream", dependency="groq"), llm_router.timed(route, mode="stream") as call:
+        stream = await resilience.acall(
+            "groq", _groq.chat.completions.create,
+            model=route.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3,
+            max_tokens=route.max_tokens,
+            stream=True
+        )
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                call.truncated = chunk.choices[0].finish_reason == "length"
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            await stream.close()
+
+async def _get_internet_answer(query: str, search=None) -> dict:
+    print(f"[Core] RAG failed. Falling back to internet search for: '{query}'")
+    try:
+        if search is None:
+            search = asyncio.get_running_loop().run_in_executor(core._web_pool, _search_web, query)
+        results = await search
+        if not results:
+            return _reply(NO_RESULTS_MESSAGE)
+        answer = await _call_groq(_build_web_prompt(query, results), llm_router.route(query, web=True))
+        return _reply(answer + WEB_NOTE)
+    except Exception as e:
+        print(f"[Internet Fallback Error] {e}")
+        return _reply(WEB_ERROR_MESSAGE)
+
+# --- Public API ---
+async def _rag_pipeline(query: str):
+    """Async version of core._rag_pipeline. Returns (source, result)."""
+    qvec = await _try_embed_query(query)
+    cached = _semantic_lookup(query, qvec)
+    if cached:
+        return "cache_semantic", cached
+
+    contexts, search = await _retrieve(query, qvec)
+    if not contexts:
+        print(f"[Core] No PDF context found for '{query}'.")
+        result = await _get_internet_answer(query)
+    else:
+        answer = await _call_groq(_build_prompt(query, contexts), llm_router.route(query, contexts))
+        result = _rag_result(query, answer, contexts, search) or await _get_internet_answer(query, search)
+
+    _remember(query, qvec, result)
+    return None, result
+
+async def get_rag_answer(query: str) -> dict:
+    """Async version of core.get_rag_answer (same cache, gating, fallback and coalescing)."""
+    started = time.perf_counter()
+    try:
+        if answer_cache:
+            cached = answer_cache.lookup_text(query)
+            if cached:
+                _count_answer(cached, started, "cache_text")
+                return cached
+
+        source, result = await rag_flights.do(normalize_query(query), lambda: _rag_pipeline(query))
+        _count_answer(result, started, source)
+        return result
+    except Exception as e:
+        result = _error_result(e)
+        _count_answer(result, started)
+        return result
+
+async def _rag_stream_pipeline(query: str, started: float):
+    """Async version of core._rag_stream_pipeline (token events, then one "result" event)."""
+    qvec = await _try_embed_query(query)
+    cached = _semantic_lookup(query, qvec)
+    if cached:
+        yield "result", ("cache_semantic", cached)
+        return
+
+    contexts, search = await _retrieve(query, qvec)
+    if not contexts:
+        print(f"[Core] No PDF context found for '{query}'.")
+        result = await _get_internet_answer(query)
+    else:
+        tokens = _NoInfoFilter()
+        first = True
+        # Closed explicitly: breaking out must end the Groq stream (and its span) now, not at GC
+        deltas = _stream_groq(_build_prompt(query, contexts), llm_router.route(query, contexts))
+        try:
+            async for delta in deltas:
+                text = tokens.feed(delta)
+                if tokens.stopped:
+                    break
+                if text is None:
+                    continue
+                if first:
+                    first = False
+                    _first_token(started, query)
+                yield "token", {"text": text}
+        finally:
+            await deltas.aclose()
+
+        result = _rag_result(query, tokens.answer, contexts, search) or await _get_internet_answer(query, search)
+
+    _remember(query, qvec, result)
+    yield "result", (None, result)
+
+async def get_rag_answer_stream(query: str):
+    """Async version of core.get_rag_answer_stream (same events)."""
+    started = time.perf_counter()
+    try:
+        if answer_cache:
+            cached = answer_cache.lookup_text(query)
+            if cached:
+                _count_answer(cached, started, "cache_text", mode="stream")
+                yield "done", cached
+                return
+
+        key = normalize_query(query)
+        flight, leader = rag_flights.begin(key) if SINGLEFLIGHT_ENABLED else (None, False)
+        if flight is not None and not leader:
+            shared = await rag_flights.wait(flight)
+            if shared is not None:
+                _count_answer(shared[1], started, shared[0], mode="stream")
+                yield "done", shared[1]
+                return
+
+        shared = error = None
+        pipeline = _rag_stream_pipeline(query, started)
+        try:
+            async for event, payload in pipeline:
+                if event == "result":
+                    shared = payload
+                else:
+                    yield event, payload
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            await pipeline.aclose()
+            if leader:
+                rag_flights.finish(key, flight, shared, error)
+        _count_answer(shared[1], started, shared[0], mode="stream")
+        yield "done", shared[1]
+    except Exception as e:
+        result = _error_result(e)
+        _count_answer(result, started, mode="stream")
+        yield "done", result
@@ -0,0 +1,169 @@
+# app/chatbot/batcher.py
+"""
+Micro-batching for query embeddings.
+
+Concurrent requests each need one embedding. Instead of one co.embed call
+per request, texts are collected for up to EMBED_BATCH_WINDOW_MS (or until
+EMBED_BATCH_MAX are waiting) and sent as one call; each caller gets its own
+vector back. Under load this means fewer round-trips and fewer Cohere
+rate-limit hits per connection. A lone request pays at most the window.
+"""
+import os, time, asyncio, threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from app.utils import metrics
+
+EMBED_BATCH_ENABLED = os.getenv("EMBED_BATCH_ENABLED", "true").lower() == "true"
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "32"))             # Cohere accepts up to 96 texts per call
+EMBED_BATCH_CONCURRENCY = int(os.getenv("EMBED_BATCH_CONCURRENCY", "4"))  # batches in flight at once
+EMBED_BATCH_TIMEOUT = float(os.getenv("EMBED_BATCH_TIMEOUT", "30"))
+
+class _Stats:
+    def __init__(self, max_batch):
+        self.max_batch = max_batch
+        self._stats_lock = threading.Lock()
+        self.stats = {"batches": 0, "texts": 0, "largest_batch": 0, "errors": 0}
+
+    def _record_batch(self, batch, sent_at):
+        """batch is [(text, future, queued_at)]; records sizes and each caller's queue wait."""
+        with self._stats_lock:
+            self.stats["batches"] += 1
+            self.stats["texts"] += len(batch)
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+        metrics.inc("embed_batches_total")
+        metrics.inc("embed_batch_texts_total", len(batch))
+        for _, _, queued_at in batch:
+            metrics.observe("embed_queue_wait_seconds", sent_at - queued_at)
+
+    def _record_error(self):
+        with self._stats_lock:
+            self.stats["errors"] += 1
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["mean_batch"] = round(stats["texts"] / stats["batches"], 2) if stats["batches"] else 0
+        stats.update(pending=len(self._pending), window_ms=self.window * 1000, max_batch=self.max_batch, enabled=EMBED_BATCH_ENABLED)
+        return stats
+
+class EmbedBatcher(_Stats):
+    """
+    Thread version. embed_fn(texts) -> list of vectors (same order). A
+    dispatcher thread closes batches; up to EMBED_BATCH_CONCURRENCY of them
+    are sent at a time.
+    """
+
+    def __init__(self, embed_fn, window_ms=EMBED_BATCH_WINDOW_MS, max_batch=EMBED_BATCH_MAX,
+                 concurrency=EMBED_BATCH_CONCURRENCY, timeout=EMBED_BATCH_TIMEOUT):
+        super().__init__(max_batch)
+        self.embed_fn = embed_fn
+        self.window = window_ms / 1000
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._pending = []   # [(text, Future, queued_at)]
+        self._pool = None
+        self._dispatcher_pid = None
+
+    def embed(self, text: str):
+        """Blocks until this text's vector is back (or raises the batch's error)."""
+        fut = Future()
+        self._ensure_dispatcher()
+        with self._cond:
+            self._pending.append((text, fut, time.perf_counter()))
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        return fut.result(timeout=self.timeout)
+
+    def _ensure_dispatcher(self):
+        # Started on first use in each process (threads don't survive a fork)
+        if self._dispatcher_pid == os.getpid():
+            return
+        with self._cond:
+            if self._dispatcher_pid != os.getpid():
+                self._pending = []
+                self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed-batch")
+                threading.Thread(target=self._dispatch_loop, name="embed-batcher", daemon=True).start()
+                self._dispatcher_pid = os.getpid()
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.perf_counter() + self.window
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+            self._pool.submit(self._send, batch)
+
+    def _send(self, batch):
+        try:
+            self._record_batch(batch, time.perf_counter())
+            vectors = self.embed_fn([text for text, _, _ in batch])
+            if len(vectors) != len(batch):
+                raise ValueError(f"embed returned {len(vectors)} vectors for {len(batch)} texts")
+        except Exception as e:
+            self._record_error()
+            for _, fut, _ in batch:
+                fut.set_exception(e)
+            return
+        for (_, fut, _), vec in zip(batch, vectors):
+            fut.set_result(vec)
+
+class AsyncEmbedBatcher(_Stats):
+    """asyncio version: embed_fn is async; the window is a loop timer, no extra threads."""
+
+    def __init__(self, embed_fn, window_ms=EMBED_BATCH_WINDOW_MS, max_batch=EMBED_BATCH_MAX):
+        super().__init__(max_batch)
+        self.embed_fn = embed_fn
+        self.window = window_ms / 1000
+        self._pending = []   # [(text, asyncio.Future, queued_at)]
+        self._timer = None
+        self._tasks = set()  # batches in flight; the loop only keeps weak references to tasks
+
+    async def embed(self, text: str):
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((text, fut, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        try:
+            self._record_batch(batch, time.perf_counter())
+            vectors = await self.embed_fn([text for text, _, _ in batch])
+            if len(vectors) != len(batch):
+                raise ValueError(f"embed returned {len(vectors)} vectors for {len(batch)} texts")
+        except Exception as e:
+            self._record_error()
+            for _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        except asyncio.CancelledError:
+            for _, fut, _ in batch:   # the batch itself was cancelled (e.g. loop shutdown)
+                fut.cancel()
+            raise
+        for (_, fut, _), vec in zip(batch, vectors):
+            if not fut.done():   # the caller may have been cancelled
+                fut.set_result(vec)
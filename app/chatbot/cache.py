@@ -0,0 +1,180 @@
+# app/chatbot/cache.py
+import os, re, time, threading
+from collections import OrderedDict
+
+_WS_RE = re.compile(r"\s+")
+
+def normalize_query(text: str) -> str:
+    """Lower-cases, collapses whitespace and drops trailing punctuation."""
+    return _WS_RE.sub(" ", (text or "").lower()).strip().rstrip("?!.").strip()
+
+class SemanticCache:
+    """
+    In-process answer cache keyed on the query embedding.
+
+    A lookup returns the cached answer of the most similar stored query when
+    its cosine similarity is above `threshold`. Entries expire after `ttl`
+    seconds and the least recently used entry is evicted when full. If
+    `version_path` is set, the cache is cleared whenever that file changes
+    (the ingestion script touches it after every run).
+    """
+
+    def __init__(self, max_entries=256, ttl=3600, threshold=0.92, version_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.version_path = version_path
+        self._lock = threading.Lock()
+        self._matrix = None                 # (max_entries, dim) normalized vectors, built on first store
+        self._valid = None                  # (max_entries,) bool
+        self._created = None                # (max_entries,) monotonic store time
+        self._entries = OrderedDict()       # slot -> {"result", "created", "aliases"}
+        self._aliases = {}                  # normalized query -> slot
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._version = self._read_version()
+        self._version_checked = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # --- Public API ---
+    def lookup_text(self, query: str):
+        """Exact (normalized) match; lets repeats skip the embedding call."""
+        key = normalize_query(query)
+        with self._lock:
+            self._check_version()
+            slot = self._aliases.get(key)
+            if slot is not None and self._alive(slot):
+                self._entries.move_to_end(slot)
+                self.hits += 1
+                return self._copy(self._entries[slot]["result"])
+        return None
+
+    def lookup(self, query: str, qvec):
+        """Nearest-neighbour match on the query embedding. Counts a miss."""
+        q = self._normalize(qvec)
+        with self._lock:
+            self._check_version()
+            if self._matrix is not None and self._entries:
+                self._expire()
+                scores = self._matrix @ q
+                scores[~self._valid] = -1.0
+                slot = int(scores.argmax())
+                if scores[slot] >= self.threshold and self._alive(slot):
+                    entry = self._entries[slot]
+                    self._entries.move_to_end(slot)
+                    self._add_alias(normalize_query(query), slot)
+                    self.hits += 1
+                    return self._copy(entry["result"])
+            self.misses += 1
+        return None
+
+    def store(self, query: str, qvec, result: dict):
+        q = self._normalize(qvec)
+        with self._lock:
+            if self._matrix is None:
+                import numpy as np
+                self._matrix = np.zeros((self.max_entries, q.shape[0]), dtype=np.float32)
+                self._valid = np.zeros(self.max_entries, dtype=bool)
+                self._created = np.zeros(self.max_entries, dtype=np.float64)
+            if not self._free:
+                old, entry = self._entries.popitem(last=False)
+                self._release(old, entry, evicted=True)
+            slot = self._free.pop()
+            self._matrix[slot] = q
+            self._valid[slot] = True
+            self._created[slot] = now = time.monotonic()
+            self._entries[slot] = {"result": self._copy(result), "created": now, "aliases": set()}
+            self._add_alias(normalize_query(query), slot)
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    # --- Internal Helpers (call with the lock held) ---
+    def _alive(self, slot) -> bool:
+        entry = self._entries.get(slot)
+        if entry is None:
+            return False
+        if time.monotonic() - entry["created"] > self.ttl:
+            del self._entries[slot]
+            self._release(slot, entry, evicted=True)
+            return False
+        return True
+
+    def _expire(self):
+        # Drops every expired row, so an expired best match can't hide a live one below it
+        import numpy as np
+        for slot in np.flatnonzero(self._valid & (time.monotonic() - self._created > self.ttl)):
+            self._alive(int(slot))
+
+    def _add_alias(self, key, slot):
+        prev = self._aliases.get(key)
+        if prev is not None and prev != slot and prev in self._entries:
+            self._entries[prev]["aliases"].discard(key)
+        self._aliases[key] = slot
+        self._entries[slot]["aliases"].add(key)
+
+    def _release(self, slot, entry, evicted=False):
+        self._valid[slot] = False
+        for key in entry["aliases"]:
+            if self._aliases.get(key) == slot:
+                del self._aliases[key]
+        self._free.append(slot)
+        if evicted:
+            self.evictions += 1
+
+    def _clear(self):
+        self._entries.clear()
+        self._aliases.clear()
+        if self._valid is not None:
+            self._valid[:] = False
+        self._free = list(range(self.max_entries - 1, -1, -1))
+        self.invalidations += 1
+
+    def _read_version(self):
+        if not self.version_path:
+            return None
+        try:
+            return os.stat(self.version_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _check_version(self):
+        # stat() at most once every few seconds, not on every lookup
+        now = time.monotonic()
+        if not self.version_path or now - self._version_checked < 5:
+            return
+        self._version_checked = now
+        version = self._read_version()
+        if version != self._version:
+            print("[Cache] Index version changed. Clearing semantic cache.")
+            self._version = version
+            self._clear()
+
+    @staticmethod
+    def _normalize(qvec):
+        import numpy as np
+        q = np.asarray(qvec, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        return q / norm if norm else q
+
+    @staticmethod
+    def _copy(result: dict) -> dict:
+        out = dict(result)
+        if isinstance(out.get("buttons"), list):
+            out["buttons"] = list(out["buttons"])
+        return out
@@ -0,0 +1,202 @@
+# app/chatbot/clients.py
+"""
+Process-wide registry for the Pinecone, Cohere and Groq clients.
+
+Everything is built once per process on first use (and rebuilt after a
+fork), including the Pinecone index handle: building one costs a
+describe_index lookup and a fresh urllib3 pool, i.e. a new TLS handshake.
+Cohere and Groq each get their own httpx pool (so long Groq streams can't
+take the connections Cohere embeds wait for), whose idle connections are
+kept for CLIENT_KEEPALIVE_EXPIRY seconds (httpx's default is 5 s, so a quiet
+worker would otherwise re-handshake on most requests). warm_up() opens the
+connections ahead of the first request; gunicorn.conf.py calls it at
+worker boot.
+"""
+import os, time, threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from app.utils.resilience import TIMEOUTS
+
+# --- Load Env ---
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+load_dotenv(os.path.join(BASE_DIR, ".env"))
+PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+INDEX_NAME = os.getenv("PINECONE_INDEX", "flcs-chatbot")
+COHERE_API_KEY = os.getenv("COHERE_API_KEY")
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Connections per client (each SDK has its own pool); size it to the worker's request threads (gunicorn --threads)
+CLIENT_POOL_MAXSIZE = int(os.getenv("CLIENT_POOL_MAXSIZE", os.getenv("GUNICORN_THREADS", "8")))
+CLIENT_KEEPALIVE_EXPIRY = float(os.getenv("CLIENT_KEEPALIVE_EXPIRY", "120"))
+CLIENT_WARMUP = os.getenv("CLIENT_WARMUP", "true").lower() == "true"
+
+# --- Registry ---
+_registry = {}      # name -> (pid, client)
+_lock = threading.Lock()
+_build_locks = {}   # name -> Lock; one per client so a slow build doesn't block the others
+_builds = {}        # name -> {"pid", "built_ms"}
+_warmup = {}        # name -> {"ok", "ms", "error"}
+_pinned = set()     # names set by install(); discard() keeps them
+
+def _get(name, build):
+    pid = os.getpid()
+    entry = _registry.get(name)
+    if entry is None or entry[0] != pid:
+        with _lock:
+            build_lock = _build_locks.setdefault(name, threading.Lock())
+        with build_lock:
+            entry = _registry.get(name)
+            if entry is None or entry[0] != pid:
+                started = time.perf_counter()
+                entry = _registry[name] = (pid, build())
+                _builds[name] = {"pid": pid, "built_ms": round((time.perf_counter() - started) * 1000, 1)}
+    return entry[1]
+
+def discard(name: str):
+    """Drops a cached client so the next call rebuilds it (e.g. after the index moved)."""
+    with _lock:
+        if name not in _pinned:
+            _registry.pop(name, None)
+
+def install(name: str, client):
+    """Pins `client` as this process's `name` client (offline fakes, see scripts/loadtest.py)."""
+    with _lock:
+        _registry[name] = (os.getpid(), client)
+        _pinned.add(name)
+
+def http_client(dependency: str):
+    """Keep-alive pool of one dependency's SDK client ("cohere" or "groq")."""
+    def build():
+        import httpx
+        return httpx.Client(limits=httpx.Limits(
+            max_connections=CLIENT_POOL_MAXSIZE,
+            max_keepalive_connections=CLIENT_POOL_MAXSIZE,
+            keepalive_expiry=CLIENT_KEEPALIVE_EXPIRY,
+        ))
+    return _get(f"http_{dependency}", build)
+
+def pinecone_client():
+    def build():
+        if not PINECONE_API_KEY: return None
+        from pinecone import Pinecone
+        return Pinecone(api_key=PINECONE_API_KEY)
+    return _get("pinecone", build)
+
+def pinecone_index():
+    """The index handle, built once; None when Pinecone is not configured."""
+    def build():
+        pc = pinecone_client()
+        if not pc: return None
+        return pc.Index(INDEX_NAME, connection_pool_maxsize=CLIENT_POOL_MAXSIZE)
+    return _get("pinecone_index", build)
+
+def cohere_client():
+    def build():
+        if not COHERE_API_KEY: return None
+        import cohere
+        # Socket-level timeouts match the resilience deadlines (app/utils/resilience.py)
+        return cohere.Client(COHERE_API_KEY, httpx_client=http_client("cohere"), timeout=TIMEOUTS["cohere"])
+    return _get("cohere", build)
+
+def groq_client():
+    def build():
+        if not GROQ_API_KEY: return None
+        from groq import Groq
+        return Groq(api_key=GROQ_API_KEY, http_client=http_client("groq"), timeout=TIMEOUTS["groq"])
+    return _get("groq", build)
+
+# --- Warm-up ---
+def _warm_pinecone():
+    index = pinecone_index()
+    if index is None: return False
+    index.describe_index_stats()
+    return True
+
+def _warm_cohere():
+    co = cohere_client()
+    if co is None: return False
+    co.models.list(page_size=1)
+    return True
+
+def _warm_groq():
+    groq = groq_client()
+    if groq is None: return False
+    groq.models.list()
+    return True
+
+WARMERS = {"pinecone": _warm_pinecone, "cohere": _warm_cohere, "groq": _warm_groq}
+
+def warm_up(background: bool = False):
+    """
+    Builds every configured client and makes one cheap metadata call each,
+    so imports, DNS, TLS and the index host lookup happen before the first
+    user request. Failures are logged and left for the request path to retry.
+    """
+    if background:
+        threading.Thread(target=warm_up, name="client-warmup", daemon=True).start()
+        return
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(WARMERS), thread_name_prefix="client-warmup") as pool:
+        futures = {name: pool.submit(_timed, fn) for name, fn in WARMERS.items()}
+    for name, future in futures.items():
+        _warmup[name] = future.result()
+    summary = ", ".join(
+        f"{name}={'skipped' if r['ok'] is None else ('ok' if r['ok'] else 'failed')} ({r['ms']} ms)"
+        for name, r in _warmup.items()
+    )
+    print(f"[Clients] Warm-up finished in {(time.perf_counter() - started) * 1000:.0f} ms: {summary}")
+
+def _timed(fn):
+    started = time.perf_counter()
+    try:
+        ok, error = (True if fn() else None), None
+    except Exception as e:
+        ok, error = False, str(e)
+        print(f"[Clients Error] Warm-up call failed: {e}")
+    return {"ok": ok, "ms": round((time.perf_counter() - started) * 1000, 1), "error": error}
+
+# --- Pool Statistics ---
+def _httpx_pool_stats(client) -> dict:
+    hosts = {}
+    for conn in client._transport._pool.connections:
+        host = conn._origin.host.decode("ascii", "replace")
+        stats = hosts.setdefault(host, {"open": 0, "idle": 0})
+        stats["open"] += 1
+        stats["idle"] += conn.is_idle()
+    return hosts
+
+def _urllib3_pool_stats(index) -> dict:
+    manager = index._vector_api.api_client.rest_client.pool_manager
+    hosts = {}
+    for key in manager.pools.keys():
+        pool = manager.pools.get(key)
+        if pool is not None:
+            hosts[pool.host] = {"created": pool.num_connections, "idle": pool.pool.qsize() if pool.pool else 0}
+    return hosts
+
+def pool_stats() -> dict:
+    """Connection pool usage for /api/health (per worker process)."""
+    pid = os.getpid()
+    stats = {
+        "pid": pid,
+        "pool_maxsize": CLIENT_POOL_MAXSIZE,
+        "keepalive_expiry": CLIENT_KEEPALIVE_EXPIRY,
+        "built_ms": {
+            name: b["built_ms"] for name, b in _builds.items()
+            if b["pid"] == pid and _registry.get(name, (None, None))[1] is not None
+        },
+        "warmup": dict(_warmup),
+    }
+    for key in ("http_cohere", "http_groq"):
+        entry = _registry.get(key)
+        if entry and entry[0] == pid:
+            try:
+                stats[key] = _httpx_pool_stats(entry[1])
+            except Exception as e:  # private httpx/httpcore attributes; never fail health for them
+                stats[key] = {"error": str(e)}
+    entry = _registry.get("pinecone_index")
+    if entry and entry[0] == pid and entry[1] is not None:
+        try:
+            stats["pinecone"] = _urllib3_pool_stats(entry[1])
+        except Exception as e:
+            stats["pinecone"] = {"error": str(e)}
+    return stats
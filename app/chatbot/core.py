@@ -1,11 +1,19 @@
 # app/chatbot/core.py
-import os, traceback, re
+import os, traceback, re, time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from pinecone import Pinecone
-import cohere
-from groq import Groq
-from app.utils import sheets 
-from ddgs import DDGS # <-- NEW: For internet fallback
+from app.utils import sheets, metrics, resilience
+from app.chatbot.cache import SemanticCache, normalize_query
+from app.chatbot.singleflight import SingleFlight, SINGLEFLIGHT_ENABLED
+from app.chatbot.batcher import EmbedBatcher, EMBED_BATCH_ENABLED
+from app.chatbot.router import ModelRouter
+from app.chatbot.menu import MenuRouter, load_menu_spec
+from app.chatbot import clients
+# Clients are built once per process on first use (see clients.py)
+from app.chatbot.clients import pinecone_client, pinecone_index, cohere_client, groq_client
+# pinecone, cohere, groq, ddgs and numpy are imported on first use: together
+# they are most of the app's import time, and menu clicks never need them.
 
 # --- Load Env ---
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -17,30 +25,221 @@ EMBED_MODEL = os.getenv("COHERE_EMBED_MODEL", "embed-english-v3.0")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
 TOP_K = int(os.getenv("TOP_K", "4"))
-
-# --- Clients ---
-pc = Pinecone(api_key=PINECONE_API_KEY) if PINECONE_API_KEY else None
-co = cohere.Client(COHERE_API_KEY) if COHERE_API_KEY else None
-groq = Groq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "256"))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+# Touched by scripts/ingest_data.py after every run so caches drop stale answers
+INDEX_VERSION_PATH = os.getenv("INDEX_VERSION_PATH", os.path.join(BASE_DIR, "data", ".index_version"))
+# "pinecone" (default) or "local" (in-process index written by scripts/ingest_data.py)
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "pinecone").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join(BASE_DIR, "data", "local_index"))
+# BM25 index written next to the vectors by scripts/ingest_data.py. Its hits are
+# fused with the dense ones, and used alone when the vector store is down.
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", os.path.join(BASE_DIR, "data", "lexical_index"))
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))   # reciprocal rank fusion constant
+# Retrieval score gates (cosine similarity). Below RAG_MIN_SCORE a chunk is
+# ignored; if no chunk reaches it the RAG LLM call is skipped and the web
+# answers directly. Below RAG_CONFIDENT_SCORE the web search is started
+# speculatively while the RAG answer is generated.
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.25"))
+RAG_CONFIDENT_SCORE = float(os.getenv("RAG_CONFIDENT_SCORE", "0.45"))
+
+# Runs speculative web searches next to the RAG completion
+_web_pool = ThreadPoolExecutor(max_workers=int(os.getenv("WEB_SEARCH_WORKERS", "4")), thread_name_prefix="web-search")
+
+# --- Semantic Answer Cache ---
+answer_cache = SemanticCache(
+    max_entries=SEMANTIC_CACHE_SIZE,
+    ttl=SEMANTIC_CACHE_TTL,
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    version_path=INDEX_VERSION_PATH,
+) if SEMANTIC_CACHE_ENABLED else None
+
+# --- Request Coalescing (identical in-flight questions share one pipeline run) ---
+rag_flights = SingleFlight()
+
+# --- LLM Routing (fast or large model, max_tokens by question type; see router.py) ---
+llm_router = ModelRouter()
+
+# --- RAG "no answer" sentence (must match the wording in _build_prompt) ---
+NO_INFO_PHRASE = "I don't have specific information"
+NO_INFO_SENTENCE = f"Based on the provided FLCS documents, {NO_INFO_PHRASE}"
+WEB_NOTE = "\n\n*(This information was found on the web and is not from FLCS documents.)*"
+NO_RESULTS_MESSAGE = "Sorry, I couldn't find any information on that topic from my documents or the web."
+WEB_ERROR_MESSAGE = "Sorry, I ran into an error trying to search the internet for that topic."
+INTERNAL_ERROR_MESSAGE = "Sorry, an internal error occurred while processing your AI request."
 
 # --- NEW: Phone number validation regex ---
 # This checks for a +, a non-zero digit, and 7-14 more digits.
 PHONE_REGEX = re.compile(r"^\+[1-9]\d{7,14}$")
 
 # --- AI RAG Functions ---
+# External calls go through app/utils/resilience.py (deadline, circuit breaker, hedging)
+def _embed_texts(texts: list) -> list:
+    with metrics.span("embed", dependency="cohere"):
+        resp = resilience.call("cohere", cohere_client().embed, model=EMBED_MODEL, input_type="search_query", texts=texts)
+    return resp.embeddings
+
+# Concurrent requests' queries are sent to Cohere together (see batcher.py)
+embed_batcher = EmbedBatcher(_embed_texts)
+
 def _embed_query(text: str):
-    resp = co.embed(model=EMBED_MODEL, input_type="search_query", texts=[text])
-    return resp.embeddings[0]
+    if EMBED_BATCH_ENABLED:
+        return embed_batcher.embed(text)
+    return _embed_texts([text])[0]
 
-def _query_index(qvec, top_k=TOP_K):
-    if not pc: return []
+def _try_embed_query(text: str):
+    """The query vector, or None when embedding failed (retrieval is then BM25 only)."""
     try:
-        index = pc.Index(INDEX_NAME)
-        res = index.query(vector=qvec, top_k=top_k, include_metadata=True)
-        return [m["metadata"] for m in res["matches"]]
+        return _embed_query(text)
     except Exception as e:
-        print(f"[RAG Error] Pinecone query failed: {e}")
-        return []
+        print(f"[RAG Error] Query embedding failed, using the lexical index only: {e}")
+        return None
+
+# --- Retrievers ---
+# Both backends return the matched chunks' metadata dicts ("text", "source",
+# "page") plus their "score", best match first. Selected with RETRIEVER_BACKEND.
+# Retrievers return a list of matches, or None when the index is unavailable
+# (then the BM25 index answers alone, see _hybrid_matches).
+class PineconeRetriever:
+    name = "pinecone"
+
+    def query(self, qvec, top_k: int):
+        try:
+            index = pinecone_index()
+            if not index: return None
+            res = resilience.call("pinecone", index.query, vector=qvec, top_k=top_k, include_metadata=True,
+                                  _request_timeout=resilience.TIMEOUTS["pinecone"])
+            return [dict(m["metadata"], score=m["score"]) for m in res["matches"]]
+        except resilience.RejectedError as e:
+            print(f"[RAG Error] Skipping Pinecone: {e}")
+            return None
+        except Exception as e:
+            metrics.error("pinecone")
+            print(f"[RAG Error] Pinecone query failed: {e}")
+            clients.discard("pinecone_index")  # rebuilt (host re-resolved) on the next query
+            return None
+
+    def status(self):
+        """Data-plane check through the cached handle (no control-plane list_indexes call)."""
+        if not PINECONE_API_KEY:
+            return None, "Pinecone not configured"
+        try:
+            pinecone_index().describe_index_stats()
+        except Exception as e:
+            clients.discard("pinecone_index")
+            return False, f"Pinecone error: {e}"
+        return True, None
+
+class _FileIndex(ABC):
+    """Loads an index written by the ingestion script once, and again when the script rewrites it."""
+    label = "index"
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self._index = None
+        self._checked = 0.0
+        self._error = None
+
+    @abstractmethod
+    def _open(self):
+        """Returns (mtime_ns of the file that marks a rewrite, loader class)."""
+
+    def _load(self):
+        now = time.monotonic()
+        if self._index is not None and now - self._checked < 5:
+            return self._index
+        self._checked = now
+        try:
+            mtime, loader = self._open()
+            if self._index is None or self._index.mtime != mtime:
+                self._index = loader(self.index_dir)
+                self._error = None
+                print(f"[RAG] Loaded {self.label} with {len(self._index)} chunks from {self.index_dir}")
+        except (OSError, ValueError, KeyError) as e:
+            if str(e) != self._error:  # logged once, not on every retry
+                self._error = str(e)
+                print(f"[RAG Error] Could not load {self.label}: {e}")
+        return self._index
+
+    def status(self):
+        if self._load() is None:
+            return False, f"{self.label.capitalize()} not found in {self.index_dir}"
+        return True, None
+
+class LocalRetriever(_FileIndex):
+    """Memory-mapped NumPy index; reloaded when the ingestion script rewrites it."""
+    name = "local"
+    label = "local index"
+
+    def _open(self):
+        from app.chatbot.local_index import LocalIndex, VECTORS_FILE
+        return os.stat(os.path.join(self.index_dir, VECTORS_FILE)).st_mtime_ns, LocalIndex
+
+    def query(self, qvec, top_k: int):
+        index = self._load()
+        if index is None: return None
+        return [dict(meta, score=score) for score, meta in index.query(qvec, top_k)]
+
+class LexicalRetriever(_FileIndex):
+    """BM25 keyword search over the same chunks as the vector index."""
+    name = "bm25"
+    label = "lexical index"
+
+    def _open(self):
+        from app.chatbot.lexical_index import LexicalIndex, POSTINGS_FILE
+        return os.stat(os.path.join(self.index_dir, POSTINGS_FILE)).st_mtime_ns, LexicalIndex
+
+    def query(self, text: str, top_k: int) -> list:
+        """
+        Matches with their raw BM25 score ("bm25") and the share of the
+        query's weight they contain ("coverage"). No "score": the gates only
+        trust dense similarity, see _gate_matches.
+        """
+        index = self._load()
+        if index is None: return []
+        return [dict(meta, bm25=bm25, coverage=coverage) for bm25, coverage, meta in index.query(text, top_k)]
+
+retriever = LocalRetriever(LOCAL_INDEX_DIR) if RETRIEVER_BACKEND == "local" else PineconeRetriever()
+lexical_retriever = LexicalRetriever(LEXICAL_INDEX_DIR)
+
+def _query_index(qvec, top_k=TOP_K):
+    """Dense matches, or None when the vector index (or the query vector) is unavailable."""
+    if qvec is None:
+        return None
+    with metrics.span("retrieve", dependency=retriever.name):
+        return retriever.query(qvec, top_k)
+
+def _hybrid_matches(query: str, dense, top_k=TOP_K) -> list:
+    """
+    Fuses the dense matches with BM25 matches for the same question by
+    reciprocal rank fusion; dense=None (vector index down) means BM25 alone.
+    A chunk found by both keeps its dense match (and score); BM25-only chunks
+    have no "score".
+    """
+    if not HYBRID_SEARCH_ENABLED:
+        metrics.inc("rag_retrieval_total", mode="dense" if dense is not None else "unavailable")
+        return dense or []
+    with metrics.span("lexical"):
+        lexical = lexical_retriever.query(query, top_k)
+    if dense is None:
+        mode = "lexical_only" if lexical else "unavailable"
+        print(f"[Core] Vector index unavailable; {len(lexical)} BM25 matches for '{query}'.")
+    else:
+        mode = "hybrid" if lexical else "dense"
+    metrics.inc("rag_retrieval_total", mode=mode)
+
+    fused = {}   # chunk text -> [rrf score, match]
+    for ranked in (dense or [], lexical):
+        for rank, match in enumerate(ranked):
+            entry = fused.get(match.get("text"))
+            if entry is None:
+                entry = fused[match.get("text")] = [0.0, match]
+            entry[0] += 1 / (HYBRID_RRF_K + rank + 1)
+    ranked = sorted(fused.values(), key=lambda e: e[0], reverse=True)
+    return [match for _, match in ranked[:top_k]]
 
 def _build_prompt(question: str, contexts: list) -> str:
     context_block = "\n\n---\n".join([c.get("text", "") for c in contexts if c.get("text")])
@@ -60,32 +259,83 @@ Question: {question}
 
 Answer:"""
 
-# --- UPDATED: _call_groq now takes a max_tokens argument ---
-def _call_groq(prompt: str, max_tokens: int = 200) -> str:
+# --- UPDATED: _call_groq takes its model and max_tokens from a router.Route ---
+def _call_groq(prompt: str, route) -> str:
+    groq = groq_client()
     if not groq: return "Groq client not configured."
-    chat = groq.chat.completions.create(
-        model=GROQ_MODEL, 
-        messages=[{"role": "user", "content": prompt}], 
-        temperature=0.3, 
-        max_tokens=max_tokens # Use the max_tokens argument
-    )
+    with metrics.span("llm", dependency="groq"), llm_router.timed(route) as call:
+        chat = resilience.call(
+            "groq", groq.chat.completions.create,
+            model=route.model,
+            messages=[{"role": "user", "content": prompt}], 
+            temperature=0.3, 
+            max_tokens=route.max_tokens
+        )
+        call.truncated = chat.choices[0].finish_reason == "length"
     return chat.choices[0].message.content.strip()
 
+def _stream_groq(prompt: str, route):
+    """Same request as _call_groq, but yields the text deltas as they arrive."""
+    groq = groq_client()
+    if not groq:
+        yield "Groq client not configured."
+        return
+    # Covers the whole stream; a consumer that stops early ends the span without an error
+    with metrics.span("llm_stream", dependency="groq"), llm_router.timed(route, mode="stream") as call:
+        # The deadline covers the time to the response headers; the client's read timeout covers each chunk
+        stream = resilience.call(
+            "groq", groq.chat.completions.create,
+            model=route.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3,
+            max_tokens=route.max_tokens,
+            stream=True
+        )
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                call.truncated = chunk.choices[0].finish_reason == "length"
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            stream.close()
+
+class _NoInfoFilter:
+    """
+    Holds streamed tokens back while the answer could still be the "no info"
+    sentence, so the user never sees it flash before the web fallback.
+    """
+
+    def __init__(self):
+        self.answer = ""
+        self.holding = True
+        self.stopped = False   # the answer is the "no info" sentence
+
+    def feed(self, delta: str):
+        """Returns the text to emit now, or None while holding back."""
+        self.answer += delta
+        if not self.holding:
+            return delta
+        probe = self.answer.lstrip(' "\n')
+        if probe.startswith(NO_INFO_SENTENCE):
+            self.stopped = True
+            return None
+        if NO_INFO_SENTENCE.startswith(probe):
+            return None
+        self.holding = False
+        return self.answer
+
 # --- NEW: Internet Fallback Function ---
-def _get_internet_answer(query: str) -> dict:
-    print(f"[Core] RAG failed. Falling back to internet search for: '{query}'")
-    try:
-        with DDGS() as ddgs:
-            results = ddgs.text(query, max_results=3)
-            if not results:
-                return {
-                    "markdown": "Sorry, I couldn't find any information on that topic from my documents or the web.",
-                    "buttons": MAIN_MENU_BUTTONS
-                }
-
-        web_context = "\n\n---\n".join([r['body'] for r in results])
-        
-        web_prompt = f"""You are a helpful AI assistant. Answer the user's question based *only* on the provided Web Search Context. 
+def _search_web(query: str) -> list:
+    from ddgs import DDGS
+    with metrics.span("web_search", dependency="ddgs"), DDGS() as ddgs:
+        return resilience.call("ddgs", ddgs.text, query, max_results=3) or []
+
+def _build_web_prompt(query: str, results: list) -> str:
+    web_context = "\n\n---\n".join([r['body'] for r in results])
+    return f"""You are a helpful AI assistant. Answer the user's question based *only* on the provided Web Search Context. 
 Keep your answer very short and concise (under 150 words).
 
 Web Search Context:
@@ -94,268 +344,306 @@ Web Search Context:
 Question: {query}
 
 Short Answer:"""
-        
-        # Use a short token limit for a concise answer
-        answer = _call_groq(web_prompt, max_tokens=100)
-        answer += "\n\n*(This information was found on the web and is not from FLCS documents.)*"
-        
-        return {"markdown": answer, "buttons": MAIN_MENU_BUTTONS}
+
+def _get_internet_answer(query: str, search=None) -> dict:
+    """`search` is an optional Future from a speculative _search_web call."""
+    print(f"[Core] RAG failed. Falling back to internet search for: '{query}'")
+    try:
+        results = search.result() if search else _search_web(query)
+        if not results:
+            return _reply(NO_RESULTS_MESSAGE)
+
+        # The router keeps web answers short (and on the fast model)
+        answer = _call_groq(_build_web_prompt(query, results), llm_router.route(query, web=True))
+        return _reply(answer + WEB_NOTE)
         
     except Exception as e:
         print(f"[Internet Fallback Error] {e}")
-        return {
-            "markdown": "Sorry, I ran into an error trying to search the internet for that topic.",
-            "buttons": MAIN_MENU_BUTTONS
-        }
+        return _reply(WEB_ERROR_MESSAGE)
+
+# --- Pipeline Helpers (shared with async_core.py, which only swaps the I/O) ---
+def _reply(markdown: str) -> dict:
+    return {"markdown": markdown, "buttons": MAIN_MENU_BUTTONS}
+
+def _error_result(e: Exception) -> dict:
+    traceback.print_exc()
+    return {"markdown": INTERNAL_ERROR_MESSAGE, "error": str(e), "buttons": MAIN_MENU_BUTTONS}
+
+def _select_contexts(query: str, dense):
+    """Fusion and gating of the dense matches (None: vector index down). Returns (contexts, speculate)."""
+    # BM25 scoring is local NumPy work (a few ms)
+    return _gate_matches(query, _hybrid_matches(query, dense), dense is not None)
+
+def _rag_result(query: str, answer: str, contexts: list, search=None):
+    """
+    The document answer, or None when the LLM said it has no information
+    (the caller then falls back to the web). Cancels a speculative search
+    that is no longer needed.
+    """
+    if NO_INFO_PHRASE in answer:
+        print(f"[Core] RAG answer was not helpful.")
+        return None
+    if search:
+        search.cancel()
+    return _reply(answer.strip() + _format_sources(contexts))
+
+def _semantic_lookup(query: str, qvec):
+    if not answer_cache or qvec is None:
+        return None
+    cached = answer_cache.lookup(query, qvec)
+    if cached:
+        print(f"[Core] Semantic cache hit for '{query}'.")
+    return cached
+
+def _remember(query: str, qvec, result: dict):
+    if answer_cache and qvec is not None and _is_cacheable(result):
+        answer_cache.store(query, qvec, result)
+
+def _first_token(started: float, query: str):
+    metrics.observe("rag_first_token_seconds", time.perf_counter() - started)
+    print(f"[Core] First token after {(time.perf_counter() - started) * 1000:.0f} ms for '{query}'.")
+
+def _is_cacheable(result: dict) -> bool:
+    """Only real answers are cached; errors and apologies are retried next time."""
+    return bool(GROQ_API_KEY) and "error" not in result and not result.get("markdown", "").startswith("Sorry")
+
+def _count_answer(result: dict, started: float, source: str = None, mode: str = "json"):
+    """Records rag_answers_total{source} and the end-to-end duration of one AI answer."""
+    if source is None:
+        markdown = result.get("markdown", "")
+        if "error" in result:
+            source = "error"
+        elif markdown.endswith(WEB_NOTE):
+            source = "web"
+        elif markdown in (NO_RESULTS_MESSAGE, WEB_ERROR_MESSAGE):
+            source = "web_failed"
+        else:
+            source = "documents"
+    metrics.inc("rag_answers_total", source=source)
+    metrics.observe("rag_duration_seconds", time.perf_counter() - started, mode=mode, source=source)
+
+def _gate_matches(query: str, matches: list, dense: bool = True):
+    """
+    Returns (contexts, speculate). Only dense scores are gated on: chunks
+    under RAG_MIN_SCORE are dropped, and if none reaches it the BM25-only
+    chunks go too. speculate is True when the best dense score is
+    borderline, or when there are only BM25 matches (dense=False: the vector
+    index is down) and their relevance is unknown.
+    """
+    if not dense:
+        return matches, bool(matches)
+    # Fused matches are in rank order, not score order
+    scores = [c["score"] for c in matches if "score" in c]
+    best = max(scores, default=None)
+    if best is None or best < RAG_MIN_SCORE:
+        if scores:
+            print(f"[Core] Best retrieval score {best:.3f} < {RAG_MIN_SCORE} for '{query}'. Skipping RAG LLM call.")
+        return [], False
+    contexts = [c for c in matches if c.get("score", RAG_MIN_SCORE) >= RAG_MIN_SCORE]
+    if best < RAG_CONFIDENT_SCORE:
+        print(f"[Core] Borderline retrieval score {best:.3f} for '{query}'. Starting web search speculatively.")
+        return contexts, True
+    return contexts, False
+
+def _retrieve(query: str, qvec):
+    """
+    Returns (contexts, speculative_search); a borderline best score starts
+    the web search in the background.
+    """
+    contexts, speculate = _select_contexts(query, _query_index(qvec, top_k=TOP_K))
+    return contexts, (_web_pool.submit(_search_web, query) if speculate else None)
+
+def _answer_from_context(query: str, qvec) -> dict:
+    contexts, search = _retrieve(query, qvec)
+    
+    # --- Fallback Check 1: No (relevant) Context ---
+    if not contexts:
+        print(f"[Core] No PDF context found for '{query}'.")
+        return _get_internet_answer(query)
+
+    prompt = _build_prompt(query, contexts)
+    answer = _call_groq(prompt, llm_router.route(query, contexts))
+    
+    # --- Fallback Check 2: RAG answer wasn't helpful ---
+    # (on success a speculative search result is just discarded)
+    return _rag_result(query, answer, contexts, search) or _get_internet_answer(query, search)
+
+def _format_sources(contexts: list) -> str:
+    sources = list(set(f"{c.get('source')} (Page {c.get('page')})" for c in contexts if c.get('source') and c.get('page')))
+    if not sources:
+        return ""
+    return f"\n\n---\n*Sources: {', '.join(sources)}*"
+
+def _rag_pipeline(query: str):
+    """Everything after the exact-text cache. Returns (source, result); source is None unless it was a cache hit."""
+    qvec = _try_embed_query(query)
+    cached = _semantic_lookup(query, qvec)
+    if cached:
+        return "cache_semantic", cached
+
+    result = _answer_from_context(query, qvec)
+    _remember(query, qvec, result)
+    return None, result
 
 # --- UPDATED: get_rag_answer now includes the fallback logic ---
 def get_rag_answer(query: str) -> dict:
     """The main AI (RAG) function with web fallback."""
+    started = time.perf_counter()
     try:
-        # Log the query to analytics *before* any search
-        sheets.write_query(query)
-        
-        qvec = _embed_query(query)
-        contexts = _query_index(qvec, top_k=TOP_K)
-        
-        # --- Fallback Check 1: No Context ---
-        if not contexts:
-            print(f"[Core] No PDF context found for '{query}'.")
-            return _get_internet_answer(query)
-
-        prompt = _build_prompt(query, contexts)
-        answer = _call_groq(prompt) # Uses default 200-token limit
-        
-        # --- Fallback Check 2: RAG answer wasn't helpful ---
-        if "I don't have specific information" in answer:
-            print(f"[Core] RAG answer was not helpful.")
-            return _get_internet_answer(query)
-        
-        # Success! Return the RAG answer
-        sources = list(set(f"{c.get('source')} (Page {c.get('page')})" for c in contexts if c.get('source') and c.get('page')))
-        if sources:
-             answer += f"\n\n---\n*Sources: {', '.join(sources)}*"
-
-        return {"markdown": answer, "buttons": MAIN_MENU_BUTTONS}
+        # (The query is logged to analytics once, by the chat route)
+
+        # --- Semantic Cache: exact repeats skip even the embedding call ---
+        if answer_cache:
+            cached = answer_cache.lookup_text(query)
+            if cached:
+                _count_answer(cached, started, "cache_text")
+                return cached
+
+        # Concurrent identical questions wait for the first one's answer
+        source, result = rag_flights.do(normalize_query(query), lambda: _rag_pipeline(query))
+        _count_answer(result, started, source)
+        return result
     except Exception as e:
-        traceback.print_exc()
-        return {"markdown": "Sorry, an internal error occurred while processing your AI request.", "error": str(e), "buttons": MAIN_MENU_BUTTONS}
-
-# --- Main Menu Button Definitions (Unchanged) ---
-MAIN_MENU_BUTTONS = ["Services", "Packages", "Destinations", "About Us", "Book Appointment", "Give Feedback"]
-CANCEL_BUTTONS = ["Cancel"]
-
-# --- Main Conversational "State Machine" ---
-def process_message(query: str, session: dict) -> dict:
-    query_lower = query.lower().strip()
-    state = session.get("chat_state")
-    form_data = session.get("form_data", {})
-
-    # --- 1. Global "Cancel" Keyword (Unchanged) ---
-    if query_lower in ["cancel", "main menu", "stop", "exit", "quit", "⬅ menu"]:
-        session.pop("chat_state", None)
-        session.pop("form_data", None)
-        return {
-            "markdown": "Welcome to FLCS! How can I help you today?",
-            "buttons": MAIN_MENU_BUTTONS
-        }
-
-    # --- 2. Handle State-Based Flows (Data Collection) ---
-    
-    # ... (Appointment Name & Email states are unchanged) ...
-    if state == "AWAITING_APPOINTMENT_NAME":
-        form_data["name"] = query
-        session["chat_state"] = "AWAITING_APPOINTMENT_EMAIL"
-        session["form_data"] = form_data
-        return {"markdown": f"Thanks, {query}. What is your email address?", "buttons": CANCEL_BUTTONS}
-    
-    elif state == "AWAITING_APPOINTMENT_EMAIL":
-        form_data["email"] = query # We could add email regex here too, but let's keep it simple
-        session["chat_state"] = "AWAITING_APPOINTMENT_MOBILE"
-        session["form_data"] = form_data
-        return {"markdown": "Great. What is your mobile number? (e.g., +919876543210)", "buttons": CANCEL_BUTTONS}
-        
-    # --- UPDATED: Appointment Mobile State ---
-    elif state == "AWAITING_APPOINTMENT_MOBILE":
-        if PHONE_REGEX.match(query):
-            form_data["mobile"] = query
-            session["chat_state"] = "AWAITING_APPOINTMENT_REASON"
-            session["form_data"] = form_data
-            return {"markdown": "Perfect. And briefly, what is the reason for your appointment?", "buttons": CANCEL_BUTTONS}
-        else:
-            # Stay in the same state and ask again
-            return {"markdown": "That doesn't look like a valid phone number. Please enter it in the full international format (e.g., +919876543210).", "buttons": CANCEL_BUTTONS}
-
-    elif state == "AWAITING_APPOINTMENT_REASON":
-        form_data["reason"] = query
-        ok, msg = sheets.write_appointment(form_data)
-        session.pop("chat_state", None)
-        session.pop("form_data", None)
-        if ok:
-            return {"markdown": "Thank you! Your appointment request is submitted. We will contact you soon.", "buttons": MAIN_MENU_BUTTONS}
-        else:
-            print(f"[Core Error] Appointment write failed: {msg}")
-            return {"markdown": f"Sorry, there was an error submitting your request. Admins notified.", "buttons": MAIN_MENU_BUTTONS}
-
-    # --- Feedback Flow ---
-    # ... (Feedback Name & Email states are unchanged) ...
-    elif state == "AWAITING_FEEDBACK_NAME":
-        form_data["name"] = query
-        session["chat_state"] = "AWAITING_FEEDBACK_EMAIL"
-        session["form_data"] = form_data
-        return {"markdown": f"Thanks, {query}. What is your email address?", "buttons": CANCEL_BUTTONS}
-
-    elif state == "AWAITING_FEEDBACK_EMAIL":
-        form_data["email"] = query
-        session["chat_state"] = "AWAITING_FEEDBACK_MOBILE"
-        session["form_data"] = form_data
-        return {"markdown": "Got it. What is your mobile number? (e.g., +919876543210)", "buttons": CANCEL_BUTTONS}
-        
-    # --- UPDATED: Feedback Mobile State ---
-    elif state == "AWAITING_FEEDBACK_MOBILE":
-        if PHONE_REGEX.match(query):
-            form_data["mobile"] = query
-            session["chat_state"] = "AWAITING_FEEDBACK_SUGGESTION"
-            session["form_data"] = form_data
-            return {"markdown": "Finally, what is your feedback or suggestion?", "buttons": CANCEL_BUTTONS}
-        else:
-            # Stay in the same state and ask again
-            return {"markdown": "That doesn't look like a valid phone number. Please enter it in the full international format (e.g., +919876543210).", "buttons": CANCEL_BUTTONS}
-
-    elif state == "AWAITING_FEEDBACK_SUGGESTION":
-        form_data["suggestion"] = query
-        ok, msg = sheets.write_feedback(form_data)
-        session.pop("chat_state", None)
-        session.pop("form_data", None)
-        if ok:
-            return {"markdown": "Thank you! Your feedback has been received.", "buttons": MAIN_MENU_BUTTONS}
-        else:
-            print(f"[Core Error] Feedback write failed: {msg}")
-            return {"markdown": f"Sorry, there was an error submitting your feedback. Admins notified.", "buttons": MAIN_MENU_BUTTONS}
-            
-    # --- 3. Handle Menu Keywords (when in no state) ---
-    if not state:
-        # ... (All menu logic is unchanged) ...
-        if query_lower in ["hi", "hello", "hey"]:
-            return {
-                "markdown": "Welcome to FLCS! How can I help you today?",
-                "buttons": MAIN_MENU_BUTTONS
-            }
-        
-        if query_lower == "book appointment":
-            session["chat_state"] = "AWAITING_APPOINTMENT_NAME"
-            session["form_data"] = {}
-            return {"markdown": "I can help you book an appointment. What is your full name?", "buttons": CANCEL_BUTTONS}
-        
-        if query_lower == "give feedback":
-            session["chat_state"] = "AWAITING_FEEDBACK_NAME"
-            session["form_data"] = {}
-            return {"markdown": "We'd love your feedback. What is your name?", "buttons": CANCEL_BUTTONS}
-
-        elif query_lower == "services":
-            return {
-                "markdown": "We offer end-to-end support for your study abroad journey. What would you like to know more about?",
-                "buttons": ["Admission", "Visa", "Scholarships", "Post-Arrival", "⬅ Menu"]
-            }
-        elif query_lower == "admission":
-            return {
-                "markdown": "We help you choose the right career, select top universities, and draft key documents like SOPs, LORs, and CVs.",
-                "buttons": ["Visa", "Scholarships", "⬅ Services"]
-            }
-        elif query_lower == "visa":
-            return {
-                "markdown": "We provide full visa and immigration support, including documentation, mock interviews, and appointment booking. We have a 99% visa success rate!",
-                "buttons": ["Admission", "Scholarships", "⬅ Services"]
-            }
-        elif query_lower == "scholarships":
-            return {
-                "markdown": "We assist with scholarship applications, document translation, and legalization. We've helped students secure over ₹20 Crore in scholarships.",
-                "buttons": ["Admission", "Visa", "⬅ Services"]
-            }
-        elif query_lower == "post-arrival":
-            return {
-                "markdown": "Our support continues after you land in Italy! We assist with airport pickup, accommodation, residence permits, and opening a bank account.",
-                "buttons": ["Admission", "Scholarships", "⬅ Services"]
-            }
-        elif query_lower == "⬅ services":
-            return {
-                "markdown": "What service would you like to know more about?",
-                "buttons": ["Admission", "Visa", "Scholarships", "Post-Arrival", "⬅ Menu"]
-            }
-
-        elif query_lower in ["packages", "⬅ packages"]:
-            return {
-                "markdown": "We offer three packages to fit your needs. Which one would you like to see?",
-                "buttons": ["Silver", "Gold", "Platinum", "Compare", "Add-ons", "⬅ Menu"]
-            }
-        elif query_lower == "silver":
-            return {
-                "markdown": "🪙 Silver: Best for self-starters. Includes guidance, document templates, and one mock visa interview.",
-                "buttons": ["Gold", "Platinum", "⬅ Packages"]
-            }
-        elif query_lower == "gold":
-            return {
-                "markdown": "🥇 Gold: Our most popular option. We draft your documents, file up to 7 applications with you, and provide 3 mock interviews.",
-                "buttons": ["Silver", "Platinum", "⬅ Packages"]
-            }
-        elif query_lower == "platinum":
-            return {
-                "markdown": "💎 Platinum: Our 'done-for-you' solution. We handle everything, from applications to post-arrival support, with many fees included.",
-                "buttons": ["Silver", "Gold", "⬅ Packages"]
-            }
-        elif query_lower == "compare":
-            return {
-                "markdown": "Here's a quick comparison:\n\n*🪙 Silver:* Guidance-focused.\n*🥇 Gold:* 'Done-with-you' service.\n*💎 Platinum:* 'Done-for-you' comprehensive solution.",
-                "buttons": ["Silver", "Gold", "Platinum", "⬅ Packages"]
-            }
-        elif query_lower == "add-ons":
-            return {
-                "markdown": "We also offer individual services like Italian Translation (₹1500), Mock Interviews (₹5000), and an Accommodation Hunt in Italy (₹15,000).",
-                "buttons": ["⬅ Packages"]
-            }
-        
-        elif query_lower == "destinations":
-            return {
-                "markdown": "We specialize in ITALY, but also guide students to GERMANY, USA, UK, CANADA, AUSTRALIA, and more.",
-                "buttons": ["About Us", "Packages", "⬅ Menu"]
-            }
-
-        elif query_lower == "about us":
-            return {
-                "markdown": "Why choose FLCS?\n\n*Proven Success:* 99% visa success rate.\n*Expert Team:* Personalized guidance.\n*Transparency:* You get real-time updates.\n*Dual Offices:* Support in both India and Italy.",
-                "buttons": ["📞 Contact", "Reviews", "⬅ Menu"]
-            }
-        elif query_lower == "reviews":
-            return {
-                "markdown": "Our students love us! Abhigyan Sharma said we 'genuinely help,' and Ayman Durrani said we 'guided me through the entire process.'",
-                "buttons": ["About Us", "📞 Contact", "⬅ Menu"]
-            }
-
-        elif query_lower == "📞 contact":
-            return {
-                "markdown": "Let's connect!\n\n*Phone:* +91 906 888 7041\n*WhatsApp:* +91 963 903 6869\n*Website:* www.flcs.in",
-                "buttons": ["Services", "Packages", "⬅ Menu"]
-            }
-        elif query_lower in ["bye", "exit"]:
-            return {"markdown": "Goodbye! Have a great day!", "buttons": []}
-            
-    # --- 4. Fallback to AI (RAG) ---
-    # If no state and no menu keyword, assume it's an AI question.
-    print(f"[Core] No state or menu keyword found. Passing to RAG AI: '{query}'")
+        result = _error_result(e)
+        _count_answer(result, started)
+        return result
+
+def _rag_stream_pipeline(query: str, started: float):
+    """
+    Streaming counterpart of _rag_pipeline: yields ("token", ...) events and
+    finally one ("result", (source, result)) event.
+    """
+    qvec = _try_embed_query(query)
+    cached = _semantic_lookup(query, qvec)
+    if cached:
+        yield "result", ("cache_semantic", cached)
+        return
+
+    contexts, search = _retrieve(query, qvec)
+    if not contexts:
+        print(f"[Core] No PDF context found for '{query}'.")
+        result = _get_internet_answer(query)
+    else:
+        tokens = _NoInfoFilter()
+        first = True
+        # Closed explicitly: breaking out must end the Groq stream (and its span) now, not at GC
+        deltas = _stream_groq(_build_prompt(query, contexts), llm_router.route(query, contexts))
+        try:
+            for delta in deltas:
+                text = tokens.feed(delta)
+                if tokens.stopped:
+                    break
+                if text is None:
+                    continue
+                if first:
+                    first = False
+                    _first_token(started, query)
+                yield "token", {"text": text}
+        finally:
+            deltas.close()
+
+        result = _rag_result(query, tokens.answer, contexts, search) or _get_internet_answer(query, search)
+
+    _remember(query, qvec, result)
+    yield "result", (None, result)
+
+def get_rag_answer_stream(query: str):
+    """
+    Streaming twin of get_rag_answer. Yields ("token", {"text": ...}) events
+    while Groq generates, then exactly one ("done", {"markdown", "buttons"})
+    event carrying the final answer (with sources, or the web fallback).
+    A question that is already in flight gets only the "done" event.
+    """
+    started = time.perf_counter()
+    try:
+        if answer_cache:
+            cached = answer_cache.lookup_text(query)
+            if cached:
+                _count_answer(cached, started, "cache_text", mode="stream")
+                yield "done", cached
+                return
+
+        key = normalize_query(query)
+        flight, leader = rag_flights.begin(key) if SINGLEFLIGHT_ENABLED else (None, False)
+        if flight is not None and not leader:
+            shared = rag_flights.wait(flight)
+            if shared is not None:
+                _count_answer(shared[1], started, shared[0], mode="stream")
+                yield "done", shared[1]
+                return
+
+        # The leader publishes its answer before "done"; a closed stream abandons the flight
+        shared = error = None
+        pipeline = _rag_stream_pipeline(query, started)
+        try:
+            for event, payload in pipeline:
+                if event == "result":
+                    shared = payload
+                else:
+                    yield event, payload
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            pipeline.close()
+            if leader:
+                rag_flights.finish(key, flight, shared, error)
+        _count_answer(shared[1], started, shared[0], mode="stream")
+        yield "done", shared[1]
+    except Exception as e:
+        result = _error_result(e)
+        _count_answer(result, started, mode="stream")
+        yield "done", result
+
+# --- Menu Router ---
+# Canned replies and form flows live in app/chatbot/menu.json (see menu.py)
+menu_router = MenuRouter(
+    load_menu_spec(),
+    submitters={
+        "appointment": lambda data: sheets.write_appointment(data),
+        "feedback": lambda data: sheets.write_feedback(data),
+    },
+    validators={"phone": lambda text: PHONE_REGEX.match(text) is not None},
+)
+MAIN_MENU_BUTTONS = menu_router.button_sets["main"]
+CANCEL_BUTTONS = menu_router.button_sets["cancel"]
+
+def route_message(query: str, session: dict):
+    """
+    Menu and form replies (shared StaticResponse objects; do not mutate them).
+    Returns None when the message is a question for the AI.
+    """
+    result = menu_router.route(query, session)
+    if result is None:
+        print(f"[Core] No state or menu keyword found. Passing to RAG AI: '{query}'")
+    return result
+
+def process_message(query: str, session: dict, stream: bool = False):
+    """
+    Returns the response dict. With stream=True, questions that fall through
+    to the AI return the get_rag_answer_stream() event generator instead.
+    """
+    result = route_message(query, session)
+    if result is not None:
+        return result
+
+    # --- Fallback to AI (RAG) ---
+    if stream:
+        return get_rag_answer_stream(query)
     return get_rag_answer(query)
 
 # --- Health Check Function (Unchanged) ---
-def get_status():
-    ok = True
-    reasons = []
-    if not pc: ok=False; reasons.append("Pinecone not configured")
-    if not co: ok=False; reasons.append("Cohere not configured")
-    if not groq: ok=False; reasons.append("Groq not configured")
-    
-    if pc:
-        try:
-            if INDEX_NAME not in pc.list_indexes().names(): # Fixed ()
-                ok=False; reasons.append(f"Pinecone index '{INDEX_NAME}' not found")
-        except Exception as e:
-            ok=False; reasons.append(f"Pinecone error: {e}")
-    return ok, reasons
\ No newline at end of file
+def get_cache_stats() -> dict:
+    return answer_cache.stats() if answer_cache else {"enabled": False}
+
+def get_singleflight_stats() -> dict:
+    return rag_flights.get_stats()
+
+def get_embed_batch_stats() -> dict:
+    return embed_batcher.get_stats()
+
+def get_llm_routing_stats() -> dict:
+    return llm_router.get_stats()
+
+def get_breaker_states() -> dict:
+    return resilience.get_breaker_states()
\ No newline at end of file
@@ -0,0 +1,174 @@
+# app/chatbot/health.py
+"""
+Background dependency checks behind /api/health.
+
+A daemon thread probes the vector and BM25 indexes, Cohere, Groq and Google
+Sheets every HEALTH_CHECK_INTERVAL seconds and keeps the latest result per
+dependency (latency, last success, last error). /api/health just reads that
+snapshot, so load balancer and uptime probes never wait on a third party.
+check_now() runs the probes on demand (/api/health?deep=1); concurrent deep
+checks share one run and are not repeated within HEALTH_DEEP_MIN_INTERVAL.
+"""
+import os, time, threading
+from concurrent.futures import ThreadPoolExecutor
+from app.chatbot import core, clients
+from app.utils import sheets
+
+# --- Config ---
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "30"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "5"))
+HEALTH_DEEP_MIN_INTERVAL = float(os.getenv("HEALTH_DEEP_MIN_INTERVAL", "5"))
+
+# --- Probes ---
+# Each returns (ok, msg); ok is None when the dependency is not configured.
+def _probe_cohere():
+    co = clients.cohere_client()
+    if co is None:
+        return None, "Cohere not configured"
+    co.models.list(page_size=1)
+    return True, None
+
+def _probe_groq():
+    groq = clients.groq_client()
+    if groq is None:
+        return None, "Groq not configured"
+    groq.models.list()
+    return True, None
+
+# name -> (probe, critical); a failing critical dependency makes /api/health return 503
+PROBES = {
+    "index": (core.retriever.status, True),
+    "lexical_index": (core.lexical_retriever.status, False),
+    "cohere": (_probe_cohere, True),
+    "groq": (_probe_groq, True),
+    "sheets": (sheets.check_access, False),
+}
+
+# --- State ---
+_state = {name: {"ok": None, "critical": critical, "latency_ms": None, "checked_at": None,
+                 "last_success": None, "last_error": None, "error_at": None}
+          for name, (_, critical) in PROBES.items()}
+_state_lock = threading.Lock()
+_check_lock = threading.Lock()   # one probe run at a time (background or deep)
+_last_run = {"started": None, "finished": None, "ms": None}
+_first_run = threading.Event()
+_running = {}                    # name -> Future of a probe that outlived its timeout
+_pool = None                     # (pid, ThreadPoolExecutor)
+_checker = None                  # (pid, Thread)
+
+def _probe_pool():
+    global _pool
+    pid = os.getpid()
+    if _pool is None or _pool[0] != pid:
+        _pool = (pid, ThreadPoolExecutor(max_workers=len(PROBES) * 2, thread_name_prefix="health-probe"))
+        _running.clear()
+    return _pool[1]
+
+def _timed(fn):
+    started = time.perf_counter()
+    try:
+        ok, msg = fn()
+    except Exception as e:
+        ok, msg = False, str(e) or type(e).__name__
+    return ok, msg, round((time.perf_counter() - started) * 1000, 1)
+
+def _record(name, ok, msg, latency_ms, now):
+    with _state_lock:
+        dep = _state[name]
+        dep.update(ok=ok, latency_ms=latency_ms, checked_at=now)
+        if ok:
+            dep["last_success"] = now
+        elif ok is False:
+            dep.update(last_error=msg, error_at=now)
+        else:
+            dep["last_error"] = msg
+
+def run_checks(min_age: float = 0):
+    """
+    Probes every dependency in parallel; each probe gets HEALTH_PROBE_TIMEOUT
+    seconds. Skipped if the last run started less than min_age seconds ago.
+    """
+    with _check_lock:
+        started = time.time()
+        if _last_run["started"] is not None and started - _last_run["started"] < min_age:
+            return
+        pool = _probe_pool()
+        futures = {}
+        for name, (probe, _) in PROBES.items():
+            # A probe still hung from an earlier run is not started again
+            previous = _running.get(name)
+            futures[name] = previous if previous and not previous.done() else pool.submit(_timed, probe)
+        deadline = time.monotonic() + HEALTH_PROBE_TIMEOUT
+        for name, future in futures.items():
+            try:
+                ok, msg, latency_ms = future.result(timeout=max(0, deadline - time.monotonic()))
+                _running.pop(name, None)
+            except Exception:
+                _running[name] = future
+                ok, msg, latency_ms = False, f"timed out after {HEALTH_PROBE_TIMEOUT:g}s", None
+            _record(name, ok, msg, latency_ms, time.time())
+        _last_run.update(started=started, finished=time.time(), ms=round((time.time() - started) * 1000, 1))
+        _first_run.set()
+    failed = [n for n, d in snapshot_dependencies().items() if d["ok"] is False]
+    if failed:
+        print(f"[Health] Check failed for: {', '.join(failed)}")
+
+def check_now():
+    """Deep check for /api/health?deep=1; reuses a run that started within HEALTH_DEEP_MIN_INTERVAL."""
+    run_checks(min_age=HEALTH_DEEP_MIN_INTERVAL)
+    return snapshot()
+
+# --- Background Checker ---
+def _check_loop():
+    while True:
+        try:
+            run_checks()
+        except Exception as e:
+            print(f"[Health Error] Check loop failed: {e}")
+        time.sleep(HEALTH_CHECK_INTERVAL)
+
+def start():
+    """Starts this process's checker thread (once; again after a fork)."""
+    global _checker
+    pid = os.getpid()
+    with _state_lock:
+        if _checker is not None and _checker[0] == pid and _checker[1].is_alive():
+            return
+        thread = threading.Thread(target=_check_loop, name="health-checker", daemon=True)
+        _checker = (pid, thread)
+    thread.start()
+
+# --- Snapshot ---
+def snapshot_dependencies() -> dict:
+    with _state_lock:
+        return {name: dict(dep) for name, dep in _state.items()}
+
+def snapshot(wait: float = 0) -> dict:
+    """
+    Latest results; never calls a dependency itself. Right after boot it can
+    wait up to `wait` seconds for the first run; ok stays None until then.
+    """
+    start()
+    if wait and not _first_run.is_set():
+        _first_run.wait(wait)
+    deps = snapshot_dependencies()
+    now = time.time()
+    finished = _last_run["finished"]
+    issues = []
+    for name, dep in deps.items():
+        if dep["critical"] and dep["ok"] is not True and dep["checked_at"] is not None:
+            issues.append(f"{name}: {dep['last_error']}")
+        for key in ("checked_at", "last_success", "error_at"):
+            if dep[key] is not None:
+                dep[key + "_age_s"] = round(now - dep[key], 1)
+    return {
+        "ok": None if finished is None else not issues,
+        "issues": issues,
+        "checked_at": finished,
+        "age_s": round(now - finished, 1) if finished else None,
+        # The checker thread died or is wedged if this goes well past the interval
+        "stale": finished is not None and now - finished > 3 * HEALTH_CHECK_INTERVAL + HEALTH_PROBE_TIMEOUT,
+        "check_ms": _last_run["ms"],
+        "interval_s": HEALTH_CHECK_INTERVAL,
+        "dependencies": deps,
+    }
@@ -0,0 +1,165 @@
+# app/chatbot/lexical_index.py
+import os, re, json, math, unicodedata
+from array import array
+from collections import Counter
+import numpy as np
+
+# --- On-Disk Layout ---
+# <index_dir>/postings.npz  terms (sorted), offsets (term -> postings slice), doc_ids, tfs, doc_lens
+# <index_dir>/docs.jsonl    one {"id", "metadata"} line per chunk, in doc_ids order
+POSTINGS_FILE = "postings.npz"
+DOCS_FILE = "docs.jsonl"
+
+# --- Tokenizer (shared by ingestion and queries) ---
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_TERM_LEN = 32   # longer "words" are URLs, hashes or extraction noise
+_WORD_RE = re.compile(r"\w+")
+STOPWORDS = frozenset("""
+a about am an and any are as at be been but by can could do does for from get have how i if in
+into is it its me my of on or our please tell that the their them there these they this to us
+was we what when where which who why will with would you your know need want
+il lo la i gli le un una di da del della dei delle e ed che per con su non
+""".split())
+
+def _fold(text: str) -> str:
+    # "città" and "citta" are the same term
+    return "".join(c for c in unicodedata.normalize("NFKD", text.lower()) if not unicodedata.combining(c))
+
+def tokenize(text: str) -> list:
+    """Lowercased, accent-folded words without stopwords; a plain plural "s" is dropped (fees -> fee)."""
+    terms = []
+    for word in _WORD_RE.findall(_fold(text)):
+        if word in STOPWORDS or len(word) > MAX_TERM_LEN or (len(word) == 1 and not word.isdigit()):
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+class LexicalIndexWriter:
+    """
+    Builds the BM25 index while scripts/ingest_data.py streams chunks: texts
+    go straight to docs.jsonl, only the postings are kept in memory.
+    finish() atomically replaces the previous index.
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self._docs = None
+        self._postings = {}      # term -> (array of doc numbers, array of term frequencies)
+        self._doc_lens = array("i")
+
+    def __len__(self):
+        return len(self._doc_lens)
+
+    def add(self, doc_id: str, metadata: dict):
+        """metadata is what the vector index stores for the chunk (source, page, chunk, text)."""
+        self._open()
+        terms = tokenize(metadata.get("text", ""))
+        docno = len(self._doc_lens)
+        for term, tf in Counter(terms).items():
+            docs, tfs = self._postings.setdefault(term, (array("i"), array("H")))
+            docs.append(docno)
+            tfs.append(min(tf, 65535))
+        self._doc_lens.append(len(terms))
+        self._docs.write(json.dumps({"id": doc_id, "metadata": metadata}, ensure_ascii=False) + "\n")
+
+    def finish(self):
+        """Writes postings.npz and swaps both files in. Returns the number of terms."""
+        self._open()  # an empty corpus still gets (empty) files, so readers see a valid index
+        self._docs.close()
+        terms = sorted(self._postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self._postings[t][0]) for t in terms])
+        doc_ids = np.concatenate([np.frombuffer(self._postings[t][0], dtype=np.int32) for t in terms]) if terms else np.zeros(0, np.int32)
+        tfs = np.concatenate([np.frombuffer(self._postings[t][1], dtype=np.uint16) for t in terms]) if terms else np.zeros(0, np.uint16)
+
+        post_path = os.path.join(self.index_dir, POSTINGS_FILE)
+        docs_path = os.path.join(self.index_dir, DOCS_FILE)
+        with open(post_path + ".tmp", "wb") as fh:
+            np.savez_compressed(fh, terms=np.array(terms, dtype=f"<U{MAX_TERM_LEN}"), offsets=offsets,
+                                doc_ids=doc_ids, tfs=tfs, doc_lens=np.frombuffer(self._doc_lens, dtype=np.int32))
+        os.replace(docs_path + ".tmp", docs_path)
+        os.replace(post_path + ".tmp", post_path)
+        return len(terms)
+
+    def _open(self):
+        if self._docs is None:
+            os.makedirs(self.index_dir, exist_ok=True)
+            self._docs = open(os.path.join(self.index_dir, DOCS_FILE + ".tmp"), "w", encoding="utf-8")
+
+    def abort(self):
+        if self._docs is not None:
+            self._docs.close()
+            os.remove(self._docs.name)
+            self._docs = None
+
+def read_lexical_docs(index_dir: str):
+    """Returns (ids, metadatas) in doc number order."""
+    ids, metadatas = [], []
+    with open(os.path.join(index_dir, DOCS_FILE), encoding="utf-8") as fh:
+        for line in fh:
+            doc = json.loads(line)
+            ids.append(doc["id"])
+            metadatas.append(doc["metadata"])
+    return ids, metadatas
+
+class LexicalIndex:
+    """BM25 over the inverted index, scored with NumPy one query term at a time."""
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.mtime = os.stat(os.path.join(index_dir, POSTINGS_FILE)).st_mtime_ns
+        with np.load(os.path.join(index_dir, POSTINGS_FILE)) as data:
+            terms = data["terms"].tolist()
+            self.offsets = data["offsets"]
+            self.doc_ids = data["doc_ids"]
+            self.tfs = data["tfs"].astype(np.float32)
+            doc_lens = data["doc_lens"].astype(np.float32)
+        self.ids, self.metadata = read_lexical_docs(index_dir)
+        if len(self.ids) != len(doc_lens) or len(self.offsets) != len(terms) + 1:
+            raise ValueError("postings and docs do not match (index rewritten while loading?)")
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        n = len(self.ids)
+        avg_len = float(doc_lens.mean()) if n else 0.0
+        # Per-document part of the BM25 denominator, computed once
+        self.norms = BM25_K1 * (1 - BM25_B + BM25_B * doc_lens / (avg_len or 1.0))
+        df = np.diff(self.offsets).astype(np.float64)
+        self.idf = np.log(1 + (n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self.unseen_idf = math.log(1 + (n + 0.5) / 0.5)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def query(self, text: str, top_k: int):
+        """
+        Returns [(bm25, coverage, metadata), ...] by descending BM25. coverage
+        is the share of the query's IDF weight found in the chunk (0-1); query
+        words that appear nowhere in the corpus count against it.
+        """
+        words = set(tokenize(text))
+        if not words or not len(self.ids):
+            return []
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        matched = np.zeros(len(self.ids), dtype=np.float32)
+        total = 0.0
+        for word in words:
+            t = self.term_ids.get(word)
+            if t is None:
+                total += self.unseen_idf
+                continue
+            idf = float(self.idf[t])
+            total += idf
+            lo, hi = self.offsets[t], self.offsets[t + 1]
+            docs, tf = self.doc_ids[lo:hi], self.tfs[lo:hi]
+            # A term occurs once per document in its postings, so fancy-index += is safe
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + self.norms[docs])
+            matched[docs] += idf
+        hits = np.flatnonzero(scores)
+        if not hits.size:
+            return []
+        k = min(top_k, hits.size)
+        top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), float(matched[i]) / total, self.metadata[i]) for i in top]
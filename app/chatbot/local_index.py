@@ -0,0 +1,65 @@
+# app/chatbot/local_index.py
+import os, json
+import numpy as np
+
+# --- On-Disk Layout ---
+# <index_dir>/vectors.npy    float32 (n, dim), rows L2-normalized, memory-mapped on load
+# <index_dir>/metadata.json  {"ids": [...], "metadata": [...]} in the same row order
+# vectors.npy is swapped in last, so its mtime marks a complete rewrite
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.json"
+
+def write_local_index(index_dir: str, ids: list, vectors, metadatas: list):
+    """Writes (or atomically replaces) a local index. Used by scripts/ingest_data.py."""
+    assert len(ids) == len(vectors) == len(metadatas), "ids, vectors and metadata must line up"
+    os.makedirs(index_dir, exist_ok=True)
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim != 2:
+        matrix = matrix.reshape(len(ids), -1) if len(ids) else np.zeros((0, 0), dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = matrix / norms
+
+    vec_path = os.path.join(index_dir, VECTORS_FILE)
+    meta_path = os.path.join(index_dir, METADATA_FILE)
+    with open(vec_path + ".tmp", "wb") as fh:
+        np.save(fh, matrix)
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump({"ids": list(ids), "metadata": list(metadatas)}, fh, ensure_ascii=False)
+    os.replace(meta_path + ".tmp", meta_path)
+    os.replace(vec_path + ".tmp", vec_path)
+
+def read_local_index(index_dir: str):
+    """Returns (ids, matrix, metadatas). The matrix is a read-only memory map."""
+    matrix = np.load(os.path.join(index_dir, VECTORS_FILE), mmap_mode="r")
+    with open(os.path.join(index_dir, METADATA_FILE), encoding="utf-8") as fh:
+        meta = json.load(fh)
+    if len(meta["ids"]) != matrix.shape[0] or len(meta["metadata"]) != matrix.shape[0]:
+        raise ValueError("vectors and metadata do not match (index rewritten while loading?)")
+    return meta["ids"], matrix, meta["metadata"]
+
+class LocalIndex:
+    """Brute-force cosine top-k over a memory-mapped embedding matrix."""
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        # Taken before reading: a rewrite during the load changes it, so the next check reloads
+        self.mtime = os.stat(os.path.join(index_dir, VECTORS_FILE)).st_mtime_ns
+        self.ids, self.matrix, self.metadata = read_local_index(index_dir)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def query(self, qvec, top_k: int):
+        """Returns [(score, metadata), ...] sorted by descending cosine similarity."""
+        if not len(self.ids):
+            return []
+        q = np.asarray(qvec, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+        scores = self.matrix @ q
+        k = min(top_k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.metadata[i]) for i in top]
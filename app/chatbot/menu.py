@@ -0,0 +1,182 @@
+# app/chatbot/menu.py
+import os, json, hashlib
+
+# --- Menu Spec ---
+# menu.json holds every canned reply and the appointment / feedback forms.
+# It is loaded and compiled once at import; process_message() then does one
+# dict lookup per message instead of walking an if/elif chain.
+MENU_SPEC_PATH = os.getenv(
+    "MENU_SPEC_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "menu.json"),
+)
+
+def load_menu_spec(path: str = MENU_SPEC_PATH) -> dict:
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+class StaticResponse(dict):
+    """
+    A pre-built reply shared by every request, so treat it as read-only.
+    `body` is filled in by the route with the serialized JSON on first use.
+    """
+    __slots__ = ("body",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.body = None
+
+class _FormStep:
+    __slots__ = ("field", "next_state", "reply", "reply_template", "validate", "invalid", "form")
+
+class _Form:
+    __slots__ = ("name", "first_state", "prompt", "submit", "success", "failure", "log_label")
+
+class MenuRouter:
+    """
+    Compiled dispatch tables for the menu spec.
+
+    `submitters` maps a form's "submit" name to a callable taking the form
+    data and returning (ok, msg); `validators` maps a step's "validate" name
+    to a predicate on the raw message.
+    """
+
+    def __init__(self, spec: dict, submitters: dict, validators: dict):
+        sets = spec.get("button_sets", {})
+        self.button_sets = {name: list(buttons) for name, buttons in sets.items()}
+
+        def reply(markdown, buttons):
+            if isinstance(buttons, str) and buttons.startswith("@"):
+                buttons = self.button_sets[buttons[1:]]
+            return StaticResponse(markdown=markdown, buttons=buttons)
+
+        main, cancel = "@main", "@cancel"
+
+        # --- Global reset (checked in every state) ---
+        reset = spec["reset"]
+        self.reset_keywords = frozenset(k.lower() for k in reset["keywords"])
+        self.reset_response = reply(reset["markdown"], reset["buttons"])
+
+        # --- Stateless keywords: greeting, menu pages, form triggers ---
+        self.keywords = {}
+        self.triggers = {}
+        greeting = spec.get("greeting")
+        entries = ([greeting] if greeting else []) + list(spec.get("menu", []))
+        for entry in entries:
+            response = reply(entry["markdown"], entry["buttons"])
+            for keyword in entry["keywords"]:
+                self._claim(keyword, response, self.keywords)
+
+        # --- Forms: one step per session state ---
+        self.steps = {}
+        for spec_form in spec.get("forms", []):
+            form = _Form()
+            form.name = spec_form["name"]
+            form.log_label = spec_form.get("log_label", form.name.title())
+            form.submit = submitters[spec_form["submit"]]
+            form.success = reply(spec_form["success"], main)
+            form.failure = reply(spec_form["failure"], main)
+            form.prompt = reply(spec_form["prompt"], cancel)
+            states = [s["state"] for s in spec_form["steps"]]
+            form.first_state = states[0]
+            self._claim(spec_form["trigger"], form, self.triggers)
+
+            for i, spec_step in enumerate(spec_form["steps"]):
+                step = _FormStep()
+                step.form = form
+                step.field = spec_step["field"]
+                step.next_state = states[i + 1] if i + 1 < len(states) else None
+                text = spec_step.get("reply")
+                step.reply_template = text if text and "{value}" in text else None
+                step.reply = reply(text, cancel) if text and not step.reply_template else None
+                step.validate = validators[spec_step["validate"]] if spec_step.get("validate") else None
+                step.invalid = reply(spec_step.get("invalid", ""), cancel) if step.validate else None
+                if step.next_state and not (step.reply or step.reply_template):
+                    raise ValueError(f"menu spec: step {spec_step['state']} needs a reply")
+                if spec_step["state"] in self.steps:
+                    raise ValueError(f"menu spec: duplicate state {spec_step['state']}")
+                self.steps[spec_step["state"]] = step
+
+    def is_static_keyword(self, query: str) -> bool:
+        """True for messages the widget may answer from the /api/menu bundle."""
+        key = query.lower().strip()
+        return key in self.reset_keywords or key in self.keywords
+
+    def goes_to_ai(self, query: str, session) -> bool:
+        """True when route() would return None (an AI question); the session is not changed."""
+        key = query.lower().strip()
+        if key in self.reset_keywords:
+            return False
+        state = session.get("chat_state")
+        if state:
+            return state not in self.steps
+        return key not in self.keywords and key not in self.triggers
+
+    def bundle(self) -> dict:
+        """
+        The client-side copy of the stateless replies, served by /api/menu.
+        Form steps are not included: those always go to the server, and so
+        does everything while the form cookie (routes/chat.py) says "1".
+        """
+        body = {
+            "reset": {"keywords": sorted(self.reset_keywords), "reply": self.reset_response},
+            "replies": self.keywords,
+            "form_triggers": sorted(self.triggers),
+        }
+        canonical = json.dumps(body, sort_keys=True, ensure_ascii=False)
+        return dict(body, version=hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:12])
+
+    def _claim(self, keyword, value, table):
+        key = keyword.lower().strip()
+        # Reset keywords always win, same as the old chain; anything else is a spec error
+        if key in self.reset_keywords:
+            return
+        if key in self.keywords or key in self.triggers:
+            raise ValueError(f"menu spec: keyword '{keyword}' is defined twice")
+        table[key] = value
+
+    def route(self, query: str, session: dict):
+        """Returns the reply dict, or None when the message should go to the AI."""
+        key = query.lower().strip()
+        if key in self.reset_keywords:
+            session.pop("chat_state", None)
+            session.pop("form_data", None)
+            return self.reset_response
+
+        state = session.get("chat_state")
+        if state:
+            step = self.steps.get(state)
+            return self._form_step(step, query, session) if step else None
+
+        response = self.keywords.get(key)
+        if response is not None:
+            return response
+        form = self.triggers.get(key)
+        if form is not None:
+            session["chat_state"] = form.first_state
+            session["form_data"] = {}
+            return form.prompt
+        return None
+
+    def _form_step(self, step, query, session):
+        if step.validate and not step.validate(query):
+            # Stay in the same state and ask again
+            return step.invalid
+        form_data = session.get("form_data", {})
+        form_data[step.field] = query
+
+        if step.next_state:
+            session["chat_state"] = step.next_state
+            session["form_data"] = form_data
+            if step.reply is not None:
+                return step.reply
+            return {"markdown": step.reply_template.replace("{value}", query),
+                    "buttons": self.button_sets["cancel"]}
+
+        form = step.form
+        ok, msg = form.submit(form_data)
+        session.pop("chat_state", None)
+        session.pop("form_data", None)
+        if ok:
+            return form.success
+        print(f"[Core Error] {form.log_label} write failed: {msg}")
+        return form.failure
@@ -0,0 +1,132 @@
+# app/chatbot/router.py
+"""
+Picks the Groq model and max_tokens for each LLM call.
+
+Most questions are short lookups ("How much is the Gold package?") that the
+small model answers well in a few sentences. Only explanation questions
+("How does the visa process work?") that are long or come with a lot of
+retrieved context go to the larger model. max_tokens follows the question
+type, so a lookup can't produce a long answer. Each decision is logged, and
+latency is recorded per tier (llm_duration_seconds{tier}).
+"""
+import os, re, time, threading
+from collections import namedtuple
+from app.utils import metrics
+
+# --- Config ---
+LLM_ROUTING_ENABLED = os.getenv("LLM_ROUTING_ENABLED", "true").lower() == "true"
+# GROQ_MODEL stays the model of the fast tier (and of every call when routing is off)
+GROQ_FAST_MODEL = os.getenv("GROQ_FAST_MODEL", os.getenv("GROQ_MODEL", "llama-3.1-8b-instant"))
+GROQ_LARGE_MODEL = os.getenv("GROQ_LARGE_MODEL", "llama-3.3-70b-versatile")   # "" keeps every call on the fast tier
+# Explanations with at least this much context, or this many words, use the large tier
+# (TOP_K=4 chunks of CHUNK_TOKENS=300 are ~1300; fewer chunks pass the score gate for narrow questions)
+ROUTER_LARGE_CONTEXT_TOKENS = int(os.getenv("ROUTER_LARGE_CONTEXT_TOKENS", "1000"))
+ROUTER_LONG_QUERY_WORDS = int(os.getenv("ROUTER_LONG_QUERY_WORDS", "20"))
+# max_tokens per question type, for document (RAG) and web answers
+RAG_MAX_TOKENS = {
+    "factual": int(os.getenv("RAG_MAX_TOKENS_FACTUAL", "120")),
+    "general": int(os.getenv("RAG_MAX_TOKENS_GENERAL", "200")),
+    "explanation": int(os.getenv("RAG_MAX_TOKENS_EXPLANATION", "400")),
+}
+WEB_MAX_TOKENS = {
+    "factual": int(os.getenv("WEB_MAX_TOKENS_FACTUAL", "80")),
+    "general": int(os.getenv("WEB_MAX_TOKENS_GENERAL", "100")),
+    "explanation": int(os.getenv("WEB_MAX_TOKENS_EXPLANATION", "200")),
+}
+
+# --- Question Types ---
+# Checked in this order: "How long does the process take?" is a lookup, "Why is the fee so high?" is not
+_EXPLAIN_RE = re.compile(
+    r"\b(why|explain|describe|difference|differences|compare|comparison|versus|vs|pros|cons|"
+    r"walk me through|how (do|does|can|could|should|to|is|are)|what should|which is better)\b", re.I)
+_FACTUAL_RE = re.compile(
+    r"\b(how (much|many|long|old)|when|where|who|cost|costs|fee|fees|price|prices|deadline|deadlines|"
+    r"date|dates|address|phone|email|contact|hours|open|duration)\b", re.I)
+_PROCESS_RE = re.compile(r"\b(steps|process|procedure|guide|advantages?|disadvantages?)\b", re.I)
+SHORT_QUERY_WORDS = 6
+
+Route = namedtuple("Route", "tier model max_tokens question_type reason")
+
+def classify(query: str) -> str:
+    """"factual" (a lookup), "explanation" or "general" (also: several questions in one)."""
+    if _EXPLAIN_RE.search(query):
+        return "explanation"
+    if query.count("?") > 1:
+        return "general"
+    if _FACTUAL_RE.search(query):
+        return "factual"
+    if _PROCESS_RE.search(query):
+        return "explanation"
+    return "factual" if len(query.split()) <= SHORT_QUERY_WORDS else "general"
+
+def _context_tokens(contexts) -> int:
+    # ~4/3 tokens per word for English prose; close enough for a threshold
+    return sum(len(c.get("text", "").split()) for c in contexts) * 4 // 3
+
+class ModelRouter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {}   # tier -> {"calls", "errors", "truncated", "total_ms"}
+
+    def route(self, query: str, contexts=None, web: bool = False) -> Route:
+        """contexts are the retrieved chunks (RAG answers); web=True for web-search answers."""
+        if not LLM_ROUTING_ENABLED:
+            return Route("fast", GROQ_FAST_MODEL, 100 if web else 200, "general", "routing disabled")
+        qtype = classify(query)
+        words = len(query.split())
+        ctx = _context_tokens(contexts or [])
+        tier, reason = "fast", f"{qtype}, {words} words, ~{ctx} context tokens"
+        multi_part = query.count("?") > 1
+        needs_large = multi_part or (qtype == "explanation" and (ctx >= ROUTER_LARGE_CONTEXT_TOKENS or words >= ROUTER_LONG_QUERY_WORDS))
+        # Web answers are kept short by their prompt, so the small model always suffices
+        if needs_large and not web and GROQ_LARGE_MODEL:
+            tier = "large"
+            reason += ", multi-part" if multi_part else ""
+        route = Route(tier, GROQ_LARGE_MODEL if tier == "large" else GROQ_FAST_MODEL,
+                      (WEB_MAX_TOKENS if web else RAG_MAX_TOKENS)[qtype], qtype, reason)
+        metrics.inc("llm_routes_total", tier=tier, question_type=qtype, kind="web" if web else "rag")
+        print(f"[Router] {'web' if web else 'rag'} -> {tier} ({route.model}, max_tokens={route.max_tokens}): {reason}")
+        return route
+
+    def record(self, route: Route, seconds: float, mode: str = "json", error: bool = False, truncated: bool = False):
+        """One finished LLM call; truncated means it stopped at max_tokens."""
+        metrics.observe("llm_duration_seconds", seconds, tier=route.tier, mode=mode)
+        if truncated:
+            metrics.inc("llm_truncated_total", tier=route.tier, question_type=route.question_type)
+        with self._lock:
+            s = self.stats.setdefault(route.tier, {"calls": 0, "errors": 0, "truncated": 0, "total_ms": 0.0})
+            s["calls"] += 1
+            s["errors"] += error
+            s["truncated"] += truncated
+            s["total_ms"] += seconds * 1000
+        print(f"[Router] {route.tier} tier ({route.model}) {'failed after' if error else 'took'} {seconds * 1000:.0f} ms"
+              + (" (hit max_tokens)" if truncated else ""))
+
+    def timed(self, route: Route, mode: str = "json"):
+        """
+        Times one call: `with router.timed(route) as call: ...`. Set
+        call.truncated when the response stopped at max_tokens.
+        """
+        return _Timed(self, route, mode)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            tiers = {tier: dict(s, mean_ms=round(s["total_ms"] / s["calls"], 1) if s["calls"] else 0, total_ms=round(s["total_ms"], 1))
+                     for tier, s in self.stats.items()}
+        return {"enabled": LLM_ROUTING_ENABLED, "models": {"fast": GROQ_FAST_MODEL, "large": GROQ_LARGE_MODEL or None}, "tiers": tiers}
+
+class _Timed:
+    __slots__ = ("router", "route", "mode", "started", "truncated")
+
+    def __init__(self, router, route, mode):
+        self.router, self.route, self.mode = router, route, mode
+        self.truncated = False
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.router.record(self.route, time.perf_counter() - self.started, self.mode,
+                           error=exc_type is not None and issubclass(exc_type, Exception), truncated=self.truncated)
+        return False
@@ -0,0 +1,176 @@
+# app/chatbot/singleflight.py
+"""
+Request coalescing ("singleflight") for the RAG pipeline.
+
+While a question is being answered, identical questions (same normalized
+text) don't start their own embed/retrieve/LLM calls: they wait for the
+in-flight one and get its result. The first caller is the leader. Its
+result goes to every follower; its exception is raised in each follower
+as a LeaderError of its own, chained to the original. A follower that waits longer
+than SINGLEFLIGHT_TIMEOUT, or whose leader gave up (e.g. a closed stream),
+runs the pipeline itself. Results are shared objects; do not mutate them.
+"""
+import os, asyncio, threading
+from app.utils import metrics
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+SINGLEFLIGHT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_TIMEOUT", "30"))
+
+# Outcomes of a flight, as seen by its followers
+OK, ERROR, ABANDONED = "ok", "error", "abandoned"
+
+class LeaderError(Exception):
+    """The leader's call failed. Raised `from` its exception, which is never re-raised across threads."""
+
+    def __init__(self, error: BaseException):
+        super().__init__(str(error))
+        self.error = error
+
+class _Stats:
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.stats = {"leaders": 0, "coalesced": 0, "timeouts": 0, "abandoned": 0}
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+        metrics.inc("rag_singleflight_total", result=key)
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            # Each coalesced follower skipped one embedding, one retrieval and at least one LLM call
+            return dict(self.stats, in_flight=len(self._calls), enabled=SINGLEFLIGHT_ENABLED)
+
+class _Call:
+    __slots__ = ("done", "outcome", "value")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.outcome = None
+        self.value = None
+
+class SingleFlight(_Stats):
+    """Thread version (WSGI workers)."""
+
+    def __init__(self, timeout: float = SINGLEFLIGHT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}   # key -> _Call
+
+    def begin(self, key):
+        """Returns (call, is_leader). A leader must call finish() exactly once."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+        self._count("leaders")
+        return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        """Publishes the leader's result or error; neither means the leader gave up."""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        if error is not None:
+            call.outcome, call.value = ERROR, error
+        elif result is None:
+            call.outcome = ABANDONED
+        else:
+            call.outcome, call.value = OK, result
+        call.done.set()
+
+    def wait(self, call):
+        """Follower side: the leader's result, a LeaderError for its exception, or None to run the pipeline yourself."""
+        if not call.done.wait(self.timeout):
+            self._count("timeouts")
+            return None
+        if call.outcome == ABANDONED:
+            self._count("abandoned")
+            return None
+        self._count("coalesced")
+        if call.outcome == ERROR:
+            raise LeaderError(call.value) from call.value
+        return call.value
+
+    def do(self, key, fn):
+        """fn() once per key at a time; concurrent callers with the same key share its result."""
+        if not SINGLEFLIGHT_ENABLED:
+            return fn()
+        call, leader = self.begin(key)
+        if not leader:
+            result = self.wait(call)
+            return fn() if result is None else result
+        try:
+            result = fn()
+        except Exception as e:
+            self.finish(key, call, error=e)
+            raise
+        except BaseException:
+            self.finish(key, call)
+            raise
+        self.finish(key, call, result)
+        return result
+
+class AsyncSingleFlight(_Stats):
+    """asyncio version (ASGI); futures belong to the loop that created them."""
+
+    def __init__(self, timeout: float = SINGLEFLIGHT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+        self._calls = {}   # key -> Future of (outcome, value)
+
+    def begin(self, key):
+        fut = self._calls.get(key)
+        if fut is not None and not fut.done():
+            return fut, False
+        fut = self._calls[key] = asyncio.get_running_loop().create_future()
+        self._count("leaders")
+        return fut, True
+
+    def finish(self, key, fut, result=None, error=None):
+        if self._calls.get(key) is fut:
+            del self._calls[key]
+        if fut.done():
+            return
+        # Outcomes are results, not exceptions: no "exception never retrieved" without followers
+        if error is not None:
+            fut.set_result((ERROR, error))
+        elif result is None:
+            fut.set_result((ABANDONED, None))
+        else:
+            fut.set_result((OK, result))
+
+    async def wait(self, fut):
+        try:
+            outcome, value = await asyncio.wait_for(asyncio.shield(fut), self.timeout)
+        except asyncio.TimeoutError:
+            self._count("timeouts")
+            return None
+        if outcome == ABANDONED:
+            self._count("abandoned")
+            return None
+        self._count("coalesced")
+        if outcome == ERROR:
+            raise LeaderError(value) from value
+        return value
+
+    async def do(self, key, fn):
+        """await fn() once per key at a time; concurrent callers with the same key share its result."""
+        if not SINGLEFLIGHT_ENABLED:
+            return await fn()
+        fut, leader = self.begin(key)
+        if not leader:
+            result = await self.wait(fut)
+            return await fn() if result is None else result
+        try:
+            result = await fn()
+        except Exception as e:
+            self.finish(key, fut, error=e)
+            raise
+        except BaseException:
+            self.finish(key, fut)
+            raise
+        self.finish(key, fut, result)
+        return result
@@ -55,9 +55,11 @@ print(f"Added {BASE_DIR} to sys.path")
 
 # --- Import Blueprints ---
 try:
-    from app.routes.chat import chat_bp
+    from app.routes.chat import chat_bp, is_ai_request
     from app.routes.health import health_bp
     from app.routes.analytics import analytics_bp
+    from app.routes.menu import menu_bp
+    from app.routes.metrics import metrics_bp
     blueprints_loaded = True
 except ImportError as e:
     print(f"CRITICAL ERROR: Failed to import blueprints: {e}")
@@ -80,7 +82,20 @@ if not app.secret_key:
     print("CRITICAL WARNING: FLASK_SECRET_KEY is not set. Using unsafe default.")
     app.secret_key = "default_unsafe_key_for_dev_only"
 
+# --- Server-Side Sessions (chat state; the cookie only holds an ID) ---
+from app.utils.sessions import init_session_store
+init_session_store(app)
+
 # --- Rate Limiter Setup (Security) ---
+# Counters live in a SQLite file shared by all workers (see app/utils/ratelimit.py)
+from app.utils.ratelimit import RATELIMIT_STORAGE_URI
+# Every chat message (menu clicks and form steps are cheap), and the stricter
+# budget for messages that reach the AI (embedding + retrieval + LLM)
+RATELIMIT_CHAT = os.getenv("RATELIMIT_CHAT", "150 per 5 minutes")
+RATELIMIT_RAG = os.getenv("RATELIMIT_RAG", "30 per 5 minutes")
+# Menu-click beacons (each entry is a Sheets row); a visitor sends one every few clicks
+RATELIMIT_TRACK_MENU = os.getenv("RATELIMIT_TRACK_MENU", "10 per 5 minutes")
+
 def get_ipaddr():
     forwarded_for = request.headers.get('X-Forwarded-For')
     if forwarded_for:
@@ -91,7 +106,8 @@ limiter = Limiter(
     get_ipaddr,
     app=app,
     default_limits=["200 per day", "50 per hour"],
-    storage_uri="memory://"
+    storage_uri=RATELIMIT_STORAGE_URI,
+    in_memory_fallback_enabled=True,  # per-worker counters if the shared store fails
 )
 print("Flask-Limiter initialized.")
 
@@ -100,9 +116,17 @@ if blueprints_loaded:
     app.register_blueprint(chat_bp, url_prefix="/api")
     app.register_blueprint(health_bp, url_prefix="/api")
     app.register_blueprint(analytics_bp, url_prefix="/api")
+    app.register_blueprint(menu_bp, url_prefix="/api")
+    app.register_blueprint(metrics_bp, url_prefix="/api")
     
-    limiter.limit("30 per 5 minutes")(chat_bp)
-    print("✅ Chat, Health, & Analytics blueprints registered.")
+    limiter.limit(RATELIMIT_CHAT)(chat_bp)
+    limiter.limit(RATELIMIT_RAG, scope="chat_rag", exempt_when=lambda: not is_ai_request())(chat_bp)
+    limiter.limit(RATELIMIT_TRACK_MENU, scope="track_menu",
+                  exempt_when=lambda: request.endpoint != "analytics.track_menu")(analytics_bp)
+    # Polled by load balancers and uptime monitors; it serves a cached snapshot
+    limiter.exempt(health_bp)
+    limiter.exempt(metrics_bp)
+    print("✅ Chat, Health, Analytics, Menu & Metrics blueprints registered.")
 else:
     print("❌ FAILED to register blueprints due to import error.")
 
@@ -1,6 +1,8 @@
 # app/routes/analytics.py
-from flask import Blueprint, jsonify
+import os
+from flask import Blueprint, jsonify, request
 from app.utils import sheets
+from app.chatbot.core import menu_router
 
 analytics_bp = Blueprint("analytics", __name__)
 
@@ -16,4 +18,29 @@ def track_view():
     else:
         # Don't bother the user with this error, just log it
         print(f"[Analytics Error] Failed to write view: {msg}")
-        return jsonify({"ok": False, "error": msg}), 500
\ No newline at end of file
+        return jsonify({"ok": False, "error": msg}), 500
+# The widget answers menu clicks from /api/menu without calling /api/chat,
+# so it reports them here in batches to keep the query log complete. Each
+# entry becomes a Sheets row: batches are small and rate limited (app/main.py).
+TRACK_MENU_MAX_BATCH = int(os.getenv("TRACK_MENU_MAX_BATCH", "10"))
+
+@analytics_bp.route("/track_menu", methods=["POST"])
+def track_menu():
+    data = request.get_json(silent=True, force=True) or {}
+    queries = data.get("queries")
+    if not isinstance(queries, list):
+        return jsonify({"ok": False, "error": "queries must be a list"}), 400
+    if len(queries) > TRACK_MENU_MAX_BATCH:
+        return jsonify({"ok": False, "error": f"at most {TRACK_MENU_MAX_BATCH} queries per batch"}), 413
+    queries = [q.strip() if isinstance(q, str) else q for q in queries]
+    # Only known menu keywords; anything else means the batch didn't come from the widget
+    if not all(isinstance(q, str) and menu_router.is_static_keyword(q) for q in queries):
+        return jsonify({"ok": False, "error": "queries must be menu keywords"}), 400
+
+    logged = 0
+    for q in queries:
+        # Greetings were never logged by /api/chat either
+        if q.lower() not in ["hi", "hello", "hey"]:
+            sheets.write_query(q)
+            logged += 1
+    return jsonify({"ok": True, "logged": logged}), 200
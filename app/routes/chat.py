@@ -17,13 +17,63 @@
 #     return jsonify(result), 200
 # app/routes/chat.py
 # app/routes/chat.py
-from flask import Blueprint, request, jsonify, session
-from app.chatbot.core import process_message
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context, current_app
+from app.chatbot.core import process_message, menu_router
+from app.chatbot.menu import StaticResponse
 from app.utils import sheets # Import sheets for query logging
+from app.utils.sessions import SESSION_TTL
+import json
 import traceback
 
 chat_bp = Blueprint("chat", __name__)
 
+# Shared with the ASGI entry point (app/asgi_app.py), which serves these two
+# routes on asyncio and must behave exactly like the views below.
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+# "1" while the server session is in the middle of a form. script.js reads it
+# before answering a menu click locally; a cookie is shared by every tab.
+FORM_COOKIE = "flcs_form"
+
+def _read_query() -> str:
+    data = request.get_json(silent=True) or {}
+    return (data.get("query") or "").strip()
+
+def is_ai_request() -> bool:
+    """For the RAG rate limit: True when this chat message will be answered by the AI."""
+    q = _read_query()
+    return bool(q) and menu_router.goes_to_ai(q, session)
+
+def _log_query(q: str):
+    # Queue the query for Google Sheets (flushed in the background)
+    if q.lower() not in ["hi", "hello", "hey"]: 
+         sheets.write_query(q)
+
+def _critical_error(route: str):
+    print(f"--- UNEXPECTED ERROR in {route} ---")
+    traceback.print_exc()
+    print(f"--- END ERROR ---")
+    return jsonify({
+        "markdown": "Sorry, a critical error occurred on the server.",
+        "buttons": []
+    }), 500
+
+def _json_response(result: dict):
+    # Menu replies are shared objects: serialize each one once, then reuse the bytes
+    if isinstance(result, StaticResponse):
+        if result.body is None:
+            result.body = current_app.json.dumps(result) + "\n"
+        return current_app.response_class(result.body, mimetype="application/json")
+    return jsonify(result)
+
+@chat_bp.after_request
+def _set_form_cookie(response):
+    response.set_cookie(FORM_COOKIE, "1" if session.get("chat_state") else "0",
+                        max_age=SESSION_TTL, samesite="Lax", path="/")
+    return response
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @chat_bp.route("/chat", methods=["POST"])
 def chat():
     """
@@ -31,26 +81,40 @@ def chat():
     This version does NOT have an API key check.
     """
     try:
-        data = request.get_json(silent=True) or {}
-        q = (data.get("query") or "").strip()
+        q = _read_query()
         if not q:
             return jsonify({"error": "query is required"}), 400
-        
-        # Log the query to Google Sheets (from your sheets.py)
-        if q.lower() not in ["hi", "hello", "hey"]: 
-             sheets.write_query(q)
+        _log_query(q)
         
         # Pass the query AND the user's session to the core logic
         result_dict = process_message(q, session)
         
         # Return the JSON response { "markdown": "...", "buttons": [...] }
-        return jsonify(result_dict), 200
+        return _json_response(result_dict), 200
         
     except Exception as e:
-        print(f"--- UNEXPECTED ERROR in /api/chat ---")
-        traceback.print_exc()
-        print(f"--- END ERROR ---")
-        return jsonify({
-            "markdown": "Sorry, a critical error occurred on the server.",
-            "buttons": []
-        }), 500
\ No newline at end of file
+        return _critical_error("/api/chat")
+
+@chat_bp.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Server-Sent Events version of /chat. AI answers arrive as "token" events
+    followed by one "done" event; menu and form replies are a single "done".
+    """
+    try:
+        q = _read_query()
+        if not q:
+            return jsonify({"error": "query is required"}), 400
+        _log_query(q)
+
+        result = process_message(q, session, stream=True)
+        events = [("done", result)] if isinstance(result, dict) else result
+
+        def generate():
+            for event, payload in events:
+                yield _sse(event, payload)
+
+        return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+    except Exception as e:
+        return _critical_error("/api/chat/stream")
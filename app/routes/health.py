@@ -1,10 +1,22 @@
 # app/routes/health.py
-from flask import Blueprint, jsonify
-from app.chatbot.core import get_status
+from flask import Blueprint, jsonify, request
+from app.chatbot.core import get_cache_stats, get_singleflight_stats, get_embed_batch_stats, get_llm_routing_stats, get_breaker_states
+from app.chatbot import clients, health as health_checker
+from app.chatbot.health import HEALTH_PROBE_TIMEOUT
+from app.utils import sheets
+from app.utils.sessions import get_session_stats
 
 health_bp = Blueprint("health", __name__)
 
 @health_bp.route("/health", methods=["GET"])
 def health():
-    ok, reasons = get_status()
-    return jsonify({"ok": ok, "issues": reasons}), (200 if ok else 503)
\ No newline at end of file
+    """Serves the background checker's snapshot; ?deep=1 probes the dependencies now."""
+    if request.args.get("deep", "").lower() in ("1", "true"):
+        status = health_checker.check_now()
+    else:
+        # Only the first probe after boot can wait, and only until the first run finishes
+        status = health_checker.snapshot(wait=HEALTH_PROBE_TIMEOUT + 1)
+    if status["ok"] is None:
+        status["issues"].append("first health check still running")
+    ok = bool(status["ok"])
+    return jsonify(dict(status, ok=ok, cache=get_cache_stats(), singleflight=get_singleflight_stats(), embed_batching=get_embed_batch_stats(), llm_routing=get_llm_routing_stats(), breakers=get_breaker_states(), analytics=sheets.get_analytics_stats(), sheet_handles=sheets.get_handle_cache_stats(), sessions=get_session_stats(), clients=clients.pool_stats())), (200 if ok else 503)
@@ -0,0 +1,26 @@
+# app/routes/menu.py
+import os, json
+from flask import Blueprint, request, current_app
+from app.chatbot.core import menu_router
+
+menu_bp = Blueprint("menu", __name__)
+
+# Browsers revalidate with If-None-Match after this; a changed menu gets a new ETag
+MENU_BUNDLE_MAX_AGE = int(os.getenv("MENU_BUNDLE_MAX_AGE", "3600"))
+
+# --- Pre-built Bundle (the menu only changes on deploy) ---
+_bundle = menu_router.bundle()
+_bundle_body = json.dumps(_bundle, ensure_ascii=False, separators=(",", ":"))
+_bundle_etag = _bundle["version"]
+
+@menu_bp.route("/menu", methods=["GET"])
+def menu():
+    """
+    Static menu replies for script.js, so button clicks that only navigate
+    the menu are answered in the browser instead of by /api/chat.
+    """
+    resp = current_app.response_class(_bundle_body, mimetype="application/json")
+    resp.set_etag(_bundle_etag)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = MENU_BUNDLE_MAX_AGE
+    return resp.make_conditional(request)
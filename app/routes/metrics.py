@@ -0,0 +1,10 @@
+# app/routes/metrics.py
+from flask import Blueprint, current_app
+from app.utils import metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Stage latencies, answer sources and dependency errors in Prometheus text format (all workers)."""
+    return current_app.response_class(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
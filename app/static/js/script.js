@@ -16,6 +16,12 @@ document.addEventListener("DOMContentLoaded", () => {
 
     let openedOnce = false;
 
+    // --- Client-side menu (static replies from /api/menu) ---
+    let menu = null;
+    let pendingClicks = [];
+    const TRACK_MENU_MAX_BATCH = 10;   // the server's per-beacon limit (app/routes/analytics.py)
+    loadMenu();
+
     // --- 2. Event Listeners ---
     launch?.addEventListener("click", toggleChatWindow);
     closeBtn?.addEventListener("click", toggleChatWindow);
@@ -130,8 +136,82 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     }
 
+    /**
+     * Renders Markdown into a bubble (falls back to plain text without marked.js).
+     * @param {HTMLElement} bubble - The bubble element to fill
+     * @param {string} md - The Markdown source
+     */
+    function renderMarkdown(bubble, md) {
+        if (window.marked) {
+            bubble.innerHTML = marked.parse(md);
+        } else {
+            bubble.textContent = md;
+        }
+        messages.scrollTop = messages.scrollHeight;
+    }
+
+    /**
+     * Downloads the menu bundle once; the browser cache and ETag keep repeat
+     * visits cheap. Until it arrives every message simply goes to the server.
+     */
+    async function loadMenu() {
+        try {
+            const r = await fetch("/api/menu");
+            if (r.ok) menu = await r.json();
+        } catch (e) {
+            console.warn("Could not load menu bundle", e);
+        }
+    }
+
+    /**
+     * Returns the static reply for a menu click, or null if the server must
+     * answer (form steps, form triggers and free-text questions).
+     * @param {string} text - The message text
+     */
+    function resolveLocally(text) {
+        if (!menu || serverFormActive()) return null;
+        const key = text.toLowerCase().trim();
+        if (menu.form_triggers.includes(key)) return null;
+        if (menu.reset.keywords.includes(key)) return menu.reset.reply;
+        return menu.replies[key] || null;
+    }
+
+    /**
+     * True while the server session is in the middle of a form. Every chat
+     * response sets the flcs_form cookie, so all tabs see the server's state.
+     */
+    function serverFormActive() {
+        return document.cookie.split("; ").includes("flcs_form=1");
+    }
+
+    /**
+     * Queues a locally answered click for the query log and sends the batch
+     * with sendBeacon when the page is hidden or the batch gets large.
+     * @param {string} text - The clicked button text
+     */
+    function trackMenuClick(text) {
+        pendingClicks.push(text);
+        if (pendingClicks.length >= TRACK_MENU_MAX_BATCH) flushMenuClicks();
+    }
+
+    function flushMenuClicks() {
+        if (!pendingClicks.length) return;
+        const body = JSON.stringify({ queries: pendingClicks });
+        pendingClicks = [];
+        const blob = new Blob([body], { type: "application/json" });
+        if (!(navigator.sendBeacon && navigator.sendBeacon("/api/track_menu", blob))) {
+            fetch("/api/track_menu", { method: "POST", headers: {"Content-Type": "application/json"}, body, keepalive: true })
+                .catch(e => console.warn("Could not track menu clicks", e));
+        }
+    }
+
+    document.addEventListener("visibilitychange", () => {
+        if (document.visibilityState === "hidden") flushMenuClicks();
+    });
+
     /**
      * Sends a message to the backend and renders the response.
+     * Uses the streaming endpoint so AI answers appear token by token.
      * @param {string} text - The query text to send
      * @param {boolean} isInitial - True if this is the first hidden "hello" message
      */
@@ -143,11 +223,107 @@ document.addEventListener("DOMContentLoaded", () => {
             addMsg("user", text);
         }
 
+        // Static menu navigation is answered in the browser
+        const local = resolveLocally(text);
+        if (local) {
+            renderMarkdown(addMsg("bot", "").querySelector(".bubble"), local.markdown);
+            setButtons(local.buttons || []);
+            if (!isInitial) trackMenuClick(text);
+            return;
+        }
+
         // Show typing indicator and clear old buttons
         typing.classList.remove("hidden");
         setButtons([]);
         messages.scrollTop = messages.scrollHeight;
 
+        // Older browsers without streaming fetch use the one-shot endpoint
+        if (!window.ReadableStream || !window.TextDecoder) {
+            return sendOnce(text);
+        }
+
+        let bubble = null;
+        let md = "";
+        let renderPending = false;
+
+        // Re-render at most once per animation frame while tokens pour in
+        const scheduleRender = () => {
+            if (renderPending) return;
+            renderPending = true;
+            requestAnimationFrame(() => {
+                renderPending = false;
+                renderMarkdown(bubble, md);
+            });
+        };
+
+        const handleEvent = (event, data) => {
+            if (event === "token") {
+                if (!bubble) {
+                    typing.classList.add("hidden");
+                    bubble = addMsg("bot", "").querySelector(".bubble");
+                }
+                md += data.text;
+                scheduleRender();
+            } else if (event === "done") {
+                typing.classList.add("hidden");
+                md = data.markdown || data.response || "Sorry, I'm not sure how to respond.";
+                if (!bubble) {
+                    bubble = addMsg("bot", "").querySelector(".bubble");
+                }
+                renderMarkdown(bubble, md);
+                setButtons(data.buttons || []);
+            }
+        };
+
+        try {
+            // --- Streaming fetch call to our Flask API ---
+            const r = await fetch("/api/chat/stream", {
+                method: "POST",
+                headers: {"Content-Type": "application/json"},
+                body: JSON.stringify({ query: text })
+            });
+
+            if (!r.ok || !r.body) {
+                typing.classList.add("hidden");
+                addMsg("bot", "Sorry, an error occurred. Please try again.");
+                return;
+            }
+
+            // --- Parse the Server-Sent Events frames as they arrive ---
+            const reader = r.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = "";
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                let sep;
+                while ((sep = buffer.indexOf("\n\n")) !== -1) {
+                    const frame = buffer.slice(0, sep);
+                    buffer = buffer.slice(sep + 2);
+                    let event = "message";
+                    let data = "";
+                    frame.split("\n").forEach(line => {
+                        if (line.startsWith("event:")) event = line.slice(6).trim();
+                        else if (line.startsWith("data:")) data += line.slice(5).trim();
+                    });
+                    if (data) handleEvent(event, JSON.parse(data));
+                }
+            }
+
+        } catch (e) {
+            typing.classList.add("hidden");
+            console.error(e);
+            addMsg("bot", "Network error. Please check your connection and try again.");
+        }
+    }
+
+    /**
+     * Non-streaming request to /api/chat (one JSON response).
+     * @param {string} text - The query text to send
+     */
+    async function sendOnce(text) {
         try {
             // --- Fetch call to our Flask API ---
             const r = await fetch("/api/chat", {
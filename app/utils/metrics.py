@@ -0,0 +1,306 @@
+# app/utils/metrics.py
+"""
+In-process latency histograms and counters, exported as Prometheus text on
+/api/metrics.
+
+Every process aggregates in memory. Under gunicorn, each worker also writes
+its totals to METRICS_DIR/<pid>.json every METRICS_FLUSH_INTERVAL seconds,
+and a scrape merges those files, so whichever worker answers reports the
+whole server. When a worker exits, its file is folded into archive.json, so
+counters never go backwards: by gunicorn's child_exit hook (gunicorn.conf.py),
+or by the next scrape that finds the file's process gone. Each file records
+its process's start time, so a new process that reuses a dead worker's pid
+is not mistaken for it. On platforms without fcntl (Windows dev
+servers) only the answering process is reported.
+"""
+import os, json, time, atexit, threading
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+from app.utils.runtime import runtime_path
+
+# --- Config ---
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_DIR = os.getenv("METRICS_DIR", runtime_path("metrics"))
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+PREFIX = "flcs_"
+# Upper bounds in seconds; covers cache hits (ms) through slow LLM/web calls
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# name -> (type, help); only these names are accepted by inc()/observe()
+METRICS = {
+    "stage_duration_seconds": ("histogram", "Duration of one pipeline stage or dependency call."),
+    "rag_duration_seconds": ("histogram", "End-to-end time of an AI (RAG) answer."),
+    "rag_first_token_seconds": ("histogram", "Time until the first streamed token of a RAG answer."),
+    "rag_answers_total": ("counter", "AI answers by source (cache_text, cache_semantic, documents, web, web_failed, error)."),
+    "dependency_errors_total": ("counter", "Failed calls to an external dependency."),
+    "embed_batches_total": ("counter", "co.embed calls made by the embedding micro-batcher."),
+    "embed_batch_texts_total": ("counter", "Query texts embedded through the micro-batcher (divide by batches for the mean batch size)."),
+    "embed_queue_wait_seconds": ("histogram", "Time a query waited in the micro-batcher before its batch was sent."),
+    "rag_retrieval_total": ("counter", "Retrievals by mode (hybrid, dense, lexical_only when the vector index is down, unavailable)."),
+    "llm_routes_total": ("counter", "LLM routing decisions by tier (fast, large), question type and kind (rag, web)."),
+    "llm_duration_seconds": ("histogram", "Duration of one LLM call (whole stream when streaming), by routing tier."),
+    "llm_truncated_total": ("counter", "LLM answers cut off at their routed max_tokens."),
+    "resilience_events_total": ("counter", "Deadlines hit (timeout), calls refused by an open breaker (rejected) or a full bulkhead (saturated), breaker transitions (open, half_open, closed) and hedged calls."),
+    "rag_singleflight_total": ("counter", "Request coalescing: leaders, coalesced followers (pipeline runs saved), timeouts, abandoned."),
+}
+
+# --- In-Process Aggregation ---
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value; labels is a sorted tuple of (key, value)
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_flusher = None
+_flusher_pid = None
+
+def _reset_after_fork():
+    # A forked worker starts from zero; its parent's counts are the parent's to report
+    global _lock
+    _lock = threading.Lock()
+    _counters.clear()
+    _histograms.clear()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def _key(name, labels):
+    if name not in METRICS:
+        raise KeyError(f"Unknown metric '{name}'")
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def inc(name: str, value: float = 1, **labels):
+    if not METRICS_ENABLED: return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _ensure_flusher()
+
+def observe(name: str, seconds: float, **labels):
+    if not METRICS_ENABLED: return
+    key = _key(name, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                h[i] += 1
+                break
+        else:
+            h[len(BUCKETS)] += 1
+        h[-1] += seconds
+    _ensure_flusher()
+
+def error(dependency: str):
+    """Counts a failed dependency call that was handled without raising."""
+    inc("dependency_errors_total", dependency=dependency)
+
+@contextmanager
+def span(stage: str, dependency: str = None):
+    """
+    Times the block into stage_duration_seconds{stage}. An exception raised
+    out of it also counts as an error for `dependency` (and is re-raised).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if dependency:
+            error(dependency)
+        raise
+    finally:
+        observe("stage_duration_seconds", time.perf_counter() - started, stage=stage)
+
+# --- Cross-Worker Files ---
+def _multiprocess() -> bool:
+    return METRICS_ENABLED and fcntl is not None and bool(METRICS_DIR)
+
+def _local_snapshot() -> dict:
+    with _lock:
+        return {
+            "counters": [[n, list(l), v] for (n, l), v in _counters.items()],
+            "histograms": [[n, list(l), list(h)] for (n, l), h in _histograms.items()],
+        }
+
+def _write_json(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+def flush():
+    """Writes this process's totals to METRICS_DIR/<pid>.json."""
+    if not _multiprocess(): return
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        data = dict(_local_snapshot(), buckets=BUCKETS, started=_start_token(os.getpid()))
+        _write_json(os.path.join(METRICS_DIR, f"{os.getpid()}.json"), data)
+    except Exception as e:
+        print(f"[Metrics Error] Could not write metrics file: {e}")
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        flush()
+
+def _ensure_flusher():
+    global _flusher, _flusher_pid
+    if _flusher_pid == os.getpid() or not _multiprocess():
+        return
+    with _lock:
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+            _flusher.start()
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _start_token(pid: int):
+    """The process's start time in clock ticks since boot (Linux /proc), or None where unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+        # Fields after the ")" that ends the command name; starttime is the 20th of them
+        return int(stat[stat.rindex(b")") + 2:].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _worker_alive(pid: int, data: dict) -> bool:
+    """True while the process that wrote `data` is running (not just some process with its pid)."""
+    if not _pid_alive(pid):
+        return False
+    started = data.get("started")
+    return started is None or _start_token(pid) in (None, started)
+
+def _merge(totals, data):
+    if [float(b) for b in data.get("buckets", BUCKETS)] != list(BUCKETS):
+        return   # written with different buckets (older deploy); not comparable
+    counters, histograms = totals
+    for name, labels, value in data.get("counters", []):
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, values in data.get("histograms", []):
+        key = (name, tuple(map(tuple, labels)))
+        h = histograms.setdefault(key, [0] * (len(BUCKETS) + 1) + [0.0])
+        for i, v in enumerate(values):
+            h[i] += v
+
+def _read(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+@contextmanager
+def _dir_lock():
+    with open(os.path.join(METRICS_DIR, ".lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield os.path.join(METRICS_DIR, "archive.json")
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _fold(archive, archive_path, path, data):
+    """Adds an exited worker's file to the archive (so totals stay monotonic) and removes it."""
+    archive_totals = ({}, {})
+    if archive: _merge(archive_totals, archive)
+    _merge(archive_totals, data)
+    archive = {
+        "counters": [[n, list(l), v] for (n, l), v in archive_totals[0].items()],
+        "histograms": [[n, list(l), h] for (n, l), h in archive_totals[1].items()],
+        "buckets": BUCKETS,
+    }
+    _write_json(archive_path, archive)
+    os.remove(path)
+    return archive
+
+def worker_exited(pid: int):
+    """Folds an exited worker's file into the archive (gunicorn's child_exit hook, in the master)."""
+    path = os.path.join(METRICS_DIR, f"{pid}.json")
+    if not _multiprocess() or not os.path.exists(path):
+        return
+    try:
+        with _dir_lock() as archive_path:
+            data = _read(path)
+            if data is not None:
+                _fold(_read(archive_path), archive_path, path, data)
+    except Exception as e:
+        print(f"[Metrics Error] Could not archive metrics of worker {pid}: {e}")
+
+def _collect():
+    """This process's live totals, plus every other worker's file and the archive."""
+    totals = ({}, {})
+    _merge(totals, dict(_local_snapshot(), buckets=BUCKETS))
+    if not _multiprocess() or not os.path.isdir(METRICS_DIR):
+        return totals
+    with _dir_lock() as archive_path:
+        archive = _read(archive_path)
+        folded = False
+        for entry in os.listdir(METRICS_DIR):
+            pid = entry[:-len(".json")]
+            if not entry.endswith(".json") or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            path = os.path.join(METRICS_DIR, entry)
+            data = _read(path)
+            if data is None:
+                continue
+            if _worker_alive(int(pid), data):
+                _merge(totals, data)
+                continue
+            archive = _fold(archive, archive_path, path, data)
+            folded = True
+        if archive:
+            _merge(totals, archive)
+        if folded:
+            print("[Metrics] Folded metrics of exited workers into archive.json.")
+    return totals
+
+# --- Prometheus Text Format ---
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_labels(labels, extra=()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _fmt_value(v) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+def render() -> str:
+    """All metrics (merged across workers) in the Prometheus text exposition format."""
+    counters, histograms = _collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        full = PREFIX + name
+        lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} {kind}")
+        if kind == "counter":
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{full}{_fmt_labels(labels)} {_fmt_value(value)}")
+            continue
+        for (n, labels), h in sorted(histograms.items()):
+            if n != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, h):
+                cumulative += count
+                lines.append(f"{full}_bucket{_fmt_labels(labels, [('le', repr(bound))])} {cumulative}")
+            cumulative += h[len(BUCKETS)]
+            lines.append(f"{full}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{full}_sum{_fmt_labels(labels)} {_fmt_value(float(h[-1]))}")
+            lines.append(f"{full}_count{_fmt_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+atexit.register(flush)
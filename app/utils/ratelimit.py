@@ -0,0 +1,113 @@
+# app/utils/ratelimit.py
+"""
+SQLite storage for Flask-Limiter, registered as the "sqlite://" scheme.
+
+memory:// keeps one set of counters per gunicorn worker, so with N workers a
+client gets N times the configured limit. This store keeps the counters in
+one SQLite file that every worker on the host shares. It needs no server,
+and each check is a single UPSERT. Importing this module registers the
+scheme; use storage_uri="sqlite://" + an absolute file path.
+"""
+import os, time, sqlite3, threading
+from limits.storage import Storage
+from app.utils.runtime import runtime_path
+
+# --- Config ---
+RATELIMIT_DB_PATH = runtime_path("ratelimits.sqlite3")
+# "memory://" gives per-process counters; any limits storage URI works (e.g. redis://)
+RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", f"sqlite://{RATELIMIT_DB_PATH}")
+RATELIMIT_PURGE_INTERVAL = int(os.getenv("RATELIMIT_PURGE_INTERVAL", "300"))
+
+# UPSERT ... RETURNING needs SQLite 3.35; older builds use a short transaction instead
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+_UPSERT = (
+    "INSERT INTO counters (key, count, expires) VALUES (?, ?, ?) "
+    "ON CONFLICT(key) DO UPDATE SET "
+    # An expired window restarts at `amount`; otherwise the count grows and the expiry stays
+    " count = CASE WHEN expires <= ? THEN excluded.count ELSE count + excluded.count END,"
+    " expires = CASE WHEN expires <= ? THEN excluded.expires ELSE expires END"
+)
+
+class SQLiteStorage(Storage):
+    """Fixed-window counters (Flask-Limiter's default strategy) in a shared SQLite file."""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str = None, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        path = uri[len("sqlite://"):] if uri and uri.startswith("sqlite://") else ""
+        self.path = path or RATELIMIT_DB_PATH
+        self._local = threading.local()
+        self._purge_lock = threading.Lock()
+        self._last_purge = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS counters ("
+            " key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires REAL NOT NULL)"
+        )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _conn(self):
+        # One connection per thread (and per process: forked workers reconnect)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        params = (key, amount, now + expiry, now, now)
+        conn = self._conn()
+        if _HAS_RETURNING:
+            count = conn.execute(_UPSERT + " RETURNING count", params).fetchone()[0]
+        else:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(_UPSERT, params)
+                count = conn.execute("SELECT count FROM counters WHERE key = ?", (key,)).fetchone()[0]
+            finally:
+                conn.execute("COMMIT")
+        self._maybe_purge(now)
+        return count
+
+    def get(self, key: str) -> int:
+        row = self._conn().execute(
+            "SELECT count FROM counters WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT expires FROM counters WHERE key = ? AND expires > ?", (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    def check(self) -> bool:
+        try:
+            self._conn().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        return self._conn().execute("DELETE FROM counters").rowcount
+
+    def clear(self, key: str) -> None:
+        self._conn().execute("DELETE FROM counters WHERE key = ?", (key,))
+
+    def _maybe_purge(self, now):
+        if now - self._last_purge < RATELIMIT_PURGE_INTERVAL or not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_purge = now
+            self._conn().execute("DELETE FROM counters WHERE expires <= ?", (now,))
+        finally:
+            self._purge_lock.release()
@@ -0,0 +1,364 @@
+# app/utils/resilience.py
+"""
+Deadlines, circuit breakers and hedged requests for every external call
+(Cohere, Pinecone, Groq, DDGS, Google Sheets).
+
+- Deadline: the caller stops waiting after the dependency's timeout and
+  gets DeadlineExceeded. Sync calls run on a pool thread, so a hung one is
+  abandoned, not waited for; the clients' own socket timeouts (same values,
+  see clients.py) then close it.
+- Bulkhead: each dependency has its own thread pool and at most
+  <NAME>_MAX_CONCURRENCY calls in flight (abandoned ones included). When
+  they are all busy, further calls fail at once with BulkheadFullError, so
+  a hung Groq or DDGS can't starve Cohere and Pinecone of threads.
+- Circuit breaker: after BREAKER_FAILURES failures in a row the dependency
+  is open and calls fail at once with CircuitOpenError. After
+  BREAKER_COOLDOWN seconds one trial call is let through (half-open); its
+  outcome closes the breaker or opens it again.
+- Hedging (idempotent reads only): a call still running at the
+  dependency's recent p95 latency gets an identical second call, and the
+  first answer wins. At most HEDGE_MAX_RATIO of recent calls are hedged.
+- Writes (Sheets appends) can't be repeated or abandoned safely: a late
+  append may still land. They run on the caller's thread with the breaker
+  but without the deadline, bounded by the client's socket timeout, and
+  are never hedged.
+
+State is per process. /api/health shows it under "breakers".
+"""
+import os, time, asyncio, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from app.utils import metrics
+
+# --- Config ---
+RESILIENCE_ENABLED = os.getenv("RESILIENCE_ENABLED", "true").lower() == "true"
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+HEDGE_MIN_DELAY_MS = float(os.getenv("HEDGE_MIN_DELAY_MS", "50"))
+LATENCY_WINDOW = 100     # recent calls used for the hedge delay and the hedge budget
+HEDGE_MIN_SAMPLES = 20   # no hedging until the p95 means something
+
+# name -> (timeout seconds, hedge, write, max concurrency);
+# override with <NAME>_TIMEOUT / <NAME>_HEDGE / <NAME>_MAX_CONCURRENCY
+_DEFAULTS = {
+    "cohere": (10, True, False, 16),     # query embeddings (batched, see batcher.py)
+    "pinecone": (5, True, False, 16),    # vector queries
+    "groq": (20, False, False, 32),      # completions are expensive: never sent twice
+    "ddgs": (10, False, False, 8),       # scraping several engines; a second call doubles it
+    "sheets": (20, False, True, 4),      # appends are not idempotent
+}
+TIMEOUTS = {name: float(os.getenv(f"{name.upper()}_TIMEOUT", str(d[0]))) for name, d in _DEFAULTS.items()}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class DependencyError(Exception):
+    """Raised instead of calling (or waiting for) an unhealthy dependency."""
+    def __init__(self, dependency: str, msg: str):
+        super().__init__(f"{dependency}: {msg}")
+        self.dependency = dependency
+
+class RejectedError(DependencyError):
+    """The call was refused without contacting the dependency."""
+
+class CircuitOpenError(RejectedError):
+    pass
+
+class BulkheadFullError(RejectedError):
+    pass
+
+class DeadlineExceeded(DependencyError, TimeoutError):
+    pass
+
+class Dependency:
+    def __init__(self, name: str, timeout: float, hedge: bool = False, write: bool = False, max_concurrency: int = 16):
+        self.name = name
+        self.timeout = timeout
+        self.hedge = hedge and not write
+        self.write = write          # never abandoned at the deadline (see the module docstring)
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self._pool = None           # (pid, ThreadPoolExecutor), created on first use in each process
+        self._inflight = 0          # calls running now, abandoned ones included
+        self._inflight_pid = os.getpid()
+        self.state = CLOSED
+        self._failures = 0          # in a row
+        self._opened_at = 0.0
+        self._trial = False         # a half-open trial call is in flight
+        self._latencies = deque(maxlen=LATENCY_WINDOW)   # seconds, successful calls
+        self._hedged = deque(maxlen=LATENCY_WINDOW)      # 1 per recent call that was hedged, else 0
+        self.last_error = None
+        self.stats = {"calls": 0, "failures": 0, "timeouts": 0, "rejected": 0, "saturated": 0,
+                      "opened": 0, "hedged": 0, "hedge_wins": 0}
+
+    # --- Bulkhead ---
+    def _executor(self):
+        pid = os.getpid()
+        if self._pool is None or self._pool[0] != pid:
+            with self._lock:
+                if self._pool is None or self._pool[0] != pid:
+                    self._pool = (pid, ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                                          thread_name_prefix=f"{self.name}-call"))
+        return self._pool[1]
+
+    def _done(self, _=None):
+        # Releases a slot taken by _admit or _take_hedge
+        with self._lock:
+            self._inflight -= 1
+
+    def _submit(self, pool, fn, *args, **kwargs):
+        try:
+            future = pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._done()
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _spawn(self, fn, *args, **kwargs):
+        try:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+        except BaseException:
+            self._done()
+            raise
+        task.add_done_callback(self._done)
+        return task
+
+    # --- Admission ---
+    def _admit(self):
+        """Takes a bulkhead slot and passes the breaker, or raises. The caller releases the slot."""
+        with self._lock:
+            pid = os.getpid()
+            if self._inflight_pid != pid:
+                # A forked worker inherits the count, not the calls
+                self._inflight, self._inflight_pid = 0, pid
+            if self._inflight >= self.max_concurrency:
+                self.stats["saturated"] += 1
+                refused = "saturated"
+            else:
+                if self.state == OPEN and time.monotonic() - self._opened_at >= BREAKER_COOLDOWN:
+                    self._transition(HALF_OPEN)
+                if self.state == OPEN or (self.state == HALF_OPEN and self._trial):
+                    self.stats["rejected"] += 1
+                    refused = "rejected"
+                else:
+                    self._trial = self.state == HALF_OPEN
+                    self.stats["calls"] += 1
+                    self._inflight += 1
+                    refused = None
+        if refused:
+            metrics.inc("resilience_events_total", dependency=self.name, event=refused)
+            if refused == "saturated":
+                raise BulkheadFullError(self.name, f"{self.max_concurrency} calls already in flight")
+            raise CircuitOpenError(self.name, f"circuit open after {BREAKER_FAILURES} failures ({self.last_error})")
+
+    # --- Breaker ---
+
+    def _transition(self, state):
+        # Called with self._lock held
+        print(f"[Resilience] {self.name} breaker {self.state} -> {state}")
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.stats["opened"] += 1
+        metrics.inc("resilience_events_total", dependency=self.name, event=state)
+
+    def _success(self, seconds, hedged, hedge_won):
+        with self._lock:
+            self._failures = 0
+            self._trial = False
+            self._latencies.append(seconds)
+            self._hedged.append(int(hedged))
+            self.stats["hedge_wins"] += hedge_won
+            if self.state != CLOSED:
+                self._transition(CLOSED)
+
+    def _failure(self, error, hedged=False):
+        timeout = isinstance(error, DeadlineExceeded)
+        with self._lock:
+            self._failures += 1
+            self._trial = False
+            self._hedged.append(int(hedged))
+            self.stats["failures"] += 1
+            self.stats["timeouts"] += timeout
+            self.last_error = str(error) or type(error).__name__
+            if self.state == HALF_OPEN or (self.state == CLOSED and self._failures >= BREAKER_FAILURES):
+                self._transition(OPEN)
+        if timeout:
+            metrics.inc("resilience_events_total", dependency=self.name, event="timeout")
+
+    def _abandon(self):
+        # The caller went away (e.g. a closed stream): neither success nor failure
+        with self._lock:
+            self._trial = False
+
+    # --- Hedging ---
+    def _hedge_delay(self):
+        """Seconds after which to hedge, or None (hedging off or not enough data yet)."""
+        if not self.hedge:
+            return None
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        delay = max(ordered[int(len(ordered) * 0.95) - 1], HEDGE_MIN_DELAY_MS / 1000)
+        return delay if delay < self.timeout else None
+
+    def _take_hedge(self) -> bool:
+        with self._lock:
+            if self._inflight >= self.max_concurrency:
+                return False   # the duplicate would take the bulkhead's last slots
+            if sum(self._hedged) >= max(1, int(HEDGE_MAX_RATIO * LATENCY_WINDOW)):
+                return False
+            self.stats["hedged"] += 1
+            self._inflight += 1   # the duplicate's slot, released by _submit/_spawn
+        metrics.inc("resilience_events_total", dependency=self.name, event="hedged")
+        return True
+
+    # --- Calls ---
+    def call(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) under this dependency's deadline, breaker and hedging."""
+        if not RESILIENCE_ENABLED:
+            return fn(*args, **kwargs)
+        pool = None if self.write else self._executor()
+        self._admit()
+        if self.write:
+            return self._call_inline(fn, *args, **kwargs)
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        hedge_at = self._hedge_delay()
+        futures = [self._submit(pool, fn, *args, **kwargs)]
+        primary, hedged, finished = futures[0], False, False
+        try:
+            while True:
+                now = time.perf_counter()
+                until = deadline if hedge_at is None or hedged else min(deadline, started + hedge_at)
+                done, _ = wait(futures, timeout=max(until - now, 0), return_when=FIRST_COMPLETED)
+                for f in done:
+                    futures.remove(f)
+                    if f.exception() is None:
+                        finished = True
+                        self._success(time.perf_counter() - started, hedged, f is not primary)
+                        return f.result()
+                    error = f.exception()
+                if done and not futures:
+                    finished = True
+                    self._failure(error, hedged)
+                    raise error
+                now = time.perf_counter()
+                if now >= deadline:
+                    finished = True
+                    error = DeadlineExceeded(self.name, f"no response within {self.timeout:g}s")
+                    self._failure(error, hedged)
+                    raise error
+                if not hedged and hedge_at is not None and now >= started + hedge_at:
+                    if self._take_hedge():
+                        futures.append(self._submit(pool, fn, *args, **kwargs))
+                    hedged = True   # tried once either way
+        finally:
+            for f in futures:
+                f.cancel()   # only stops calls still queued; running ones are abandoned
+            if not finished:
+                self._abandon()
+
+    def _call_inline(self, fn, *args, **kwargs):
+        # The outcome is always known: success, or the client's own error (e.g. its socket timeout)
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._failure(e)
+            raise
+        except BaseException:
+            self._abandon()
+            raise
+        finally:
+            self._done()
+        self._success(time.perf_counter() - started, False, False)
+        return result
+
+    async def _acall_inline(self, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            self._failure(e)
+            raise
+        except BaseException:
+            self._abandon()
+            raise
+        finally:
+            self._done()
+        self._success(time.perf_counter() - started, False, False)
+        return result
+
+    async def acall(self, fn, *args, **kwargs):
+        """Async version: fn(*args, **kwargs) returns a fresh awaitable per attempt. Losers are cancelled."""
+        if not RESILIENCE_ENABLED:
+            return await fn(*args, **kwargs)
+        self._admit()
+        if self.write:
+            return await self._acall_inline(fn, *args, **kwargs)
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        hedge_at = self._hedge_delay()
+        tasks = [self._spawn(fn, *args, **kwargs)]
+        primary, hedged, finished = tasks[0], False, False
+        try:
+            while True:
+                now = time.perf_counter()
+                until = deadline if hedge_at is None or hedged else min(deadline, started + hedge_at)
+                done, _ = await asyncio.wait(tasks, timeout=max(until - now, 0), return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    tasks.remove(t)
+                    if t.exception() is None:
+                        finished = True
+                        self._success(time.perf_counter() - started, hedged, t is not primary)
+                        return t.result()
+                    error = t.exception()
+                if done and not tasks:
+                    finished = True
+                    self._failure(error, hedged)
+                    raise error
+                now = time.perf_counter()
+                if now >= deadline:
+                    finished = True
+                    error = DeadlineExceeded(self.name, f"no response within {self.timeout:g}s")
+                    self._failure(error, hedged)
+                    raise error
+                if not hedged and hedge_at is not None and now >= started + hedge_at:
+                    if self._take_hedge():
+                        tasks.append(self._spawn(fn, *args, **kwargs))
+                    hedged = True
+        finally:
+            for t in tasks:
+                t.cancel()
+            if not finished:
+                self._abandon()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snap = dict(self.stats, state=self.state, consecutive_failures=self._failures,
+                        timeout_s=self.timeout, hedge=self.hedge, write=self.write, last_error=self.last_error,
+                        in_flight=self._inflight, max_concurrency=self.max_concurrency)
+            if self.state == OPEN:
+                snap["retry_in_s"] = round(max(BREAKER_COOLDOWN - (time.monotonic() - self._opened_at), 0), 1)
+        delay = self._hedge_delay()
+        snap["hedge_after_ms"] = round(delay * 1000, 1) if delay is not None else None
+        return snap
+
+# --- Registry ---
+DEPENDENCIES = {
+    name: Dependency(name, TIMEOUTS[name], os.getenv(f"{name.upper()}_HEDGE", str(hedge)).lower() == "true", write,
+                     int(os.getenv(f"{name.upper()}_MAX_CONCURRENCY", str(concurrency))))
+    for name, (_, hedge, write, concurrency) in _DEFAULTS.items()
+}
+
+def call(name: str, fn, *args, **kwargs):
+    return DEPENDENCIES[name].call(fn, *args, **kwargs)
+
+async def acall(name: str, fn, *args, **kwargs):
+    return await DEPENDENCIES[name].acall(fn, *args, **kwargs)
+
+def get_breaker_states() -> dict:
+    return {name: dep.snapshot() for name, dep in DEPENDENCIES.items()}
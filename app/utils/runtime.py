@@ -0,0 +1,21 @@
+# app/utils/runtime.py
+import os, tempfile
+
+# --- Runtime Directory ---
+# Files the app writes while it runs (session and rate-limit databases,
+# per-worker metrics). Kept out of data/, which holds the source documents
+# and the ingested indexes. Override with RUNTIME_DIR.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def _default_runtime_dir() -> str:
+    path = os.path.join(BASE_DIR, "instance")
+    # Read-only deploys (e.g. serverless bundles) fall back to the temp directory
+    if os.access(path if os.path.isdir(path) else BASE_DIR, os.W_OK):
+        return path
+    return os.path.join(tempfile.gettempdir(), "flcs-chatbot")
+
+RUNTIME_DIR = os.getenv("RUNTIME_DIR") or _default_runtime_dir()
+
+def runtime_path(*parts) -> str:
+    """A path under RUNTIME_DIR; the caller creates the directory when it writes."""
+    return os.path.join(RUNTIME_DIR, *parts)
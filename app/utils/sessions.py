@@ -0,0 +1,198 @@
+# app/utils/sessions.py
+import os, json, time, sqlite3, secrets, threading
+from collections import OrderedDict
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from app.utils.runtime import runtime_path
+
+# --- Config ---
+# "sqlite" (default, shared by all workers on one host), "memory" (per process) or "cookie"
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite").lower()
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", runtime_path("sessions.sqlite3"))
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))             # idle seconds before a session is dropped
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))  # memory backend only
+SESSION_PURGE_INTERVAL = int(os.getenv("SESSION_PURGE_INTERVAL", "300"))
+
+def _dumps(data: dict) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+# --- Backends ---
+class MemorySessionStore:
+    """Per-process LRU with idle expiry. Only correct with a single worker."""
+
+    def __init__(self, max_entries=SESSION_MAX_ENTRIES, ttl=SESSION_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()      # sid -> (expires, serialized)
+        self.evictions = 0
+
+    def get(self, sid):
+        with self._lock:
+            item = self._data.get(sid)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self._data[sid]
+                return None
+            self._data.move_to_end(sid)
+            return json.loads(item[1])
+
+    def save(self, sid, data: dict):
+        with self._lock:
+            self._data[sid] = (time.time() + self.ttl, _dumps(data))
+            self._data.move_to_end(sid)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._data), "evictions": self.evictions}
+
+class SQLiteSessionStore:
+    """
+    Sessions in one SQLite file, so every worker on the host sees the same
+    state. Expired rows are purged at most every SESSION_PURGE_INTERVAL.
+    """
+
+    def __init__(self, path=SESSION_DB_PATH, ttl=SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._purge_lock = threading.Lock()
+        self._last_purge = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+
+    def _conn(self):
+        # One connection per thread (and per process: forked workers reconnect)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, sid):
+        row = self._conn().execute(
+            "SELECT data FROM sessions WHERE sid = ? AND expires > ?", (sid, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, sid, data: dict):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)",
+            (sid, _dumps(data), now + self.ttl),
+        )
+        self._maybe_purge(now)
+
+    def delete(self, sid):
+        self._conn().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def _maybe_purge(self, now):
+        if now - self._last_purge < SESSION_PURGE_INTERVAL or not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_purge = now
+            self._conn().execute("DELETE FROM sessions WHERE expires <= ?", (now,))
+        finally:
+            self._purge_lock.release()
+
+    def stats(self) -> dict:
+        count = self._conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE expires > ?", (time.time(),)
+        ).fetchone()[0]
+        return {"backend": "sqlite", "entries": count}
+
+# --- Flask Integration ---
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Keeps the session dict in a server-side store; the cookie only carries
+    an opaque random ID. Nothing is written for requests that don't change
+    the session (e.g. menu clicks outside a form).
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and len(sid) <= 64:
+            data = self.store.get(sid)
+            if data is not None:
+                return ServerSession(data, sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(24), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified:
+            return
+
+        self.store.save(session.sid, dict(session))
+        if session.new or session.permanent:
+            response.set_cookie(
+                name, session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain, path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+session_store = None
+
+def init_session_store(app):
+    """Installs the configured backend; keeps Flask's cookie sessions on "cookie" or failure."""
+    global session_store
+    try:
+        if SESSION_BACKEND == "memory":
+            session_store = MemorySessionStore()
+        elif SESSION_BACKEND == "sqlite":
+            session_store = SQLiteSessionStore()
+        else:
+            print("[Sessions] Using signed cookie sessions.")
+            return
+    except Exception as e:
+        print(f"[Sessions Error] Could not open {SESSION_BACKEND} session store ({e}). Using cookie sessions.")
+        session_store = None
+        return
+    app.session_interface = ServerSessionInterface(session_store)
+    print(f"[Sessions] Server-side sessions enabled ({SESSION_BACKEND}, ttl={SESSION_TTL}s).")
+
+def get_session_stats() -> dict:
+    if session_store is None:
+        return {"backend": "cookie"}
+    try:
+        return session_store.stats()
+    except Exception as e:
+        return {"backend": SESSION_BACKEND, "error": str(e)}
@@ -161,9 +161,10 @@
 #     return _write_to_sheet(sheet_id, tab_name, row)
 # code for vercel
 # app/utils/sheets.py
-import os, datetime, json
-import gspread
-from google.oauth2.service_account import Credentials
+import os, datetime, json, time, atexit, threading
+from collections import deque
+from app.utils import metrics, resilience
+# gspread and google-auth are imported on first use (see _get_client) to keep cold starts fast
 
 # --- Config ---
 SA_PATH = os.getenv("GOOGLE_SA_PATH", "creds/google-service-account.json")
@@ -171,6 +172,12 @@ SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 _creds = None
 _gc = None
 
+# Analytics rows are queued and appended in batches by a background thread
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "50"))
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "5"))
+ANALYTICS_QUEUE_MAX = int(os.getenv("ANALYTICS_QUEUE_MAX", "5000"))
+ANALYTICS_MAX_ATTEMPTS = 3
+
 # --- Helper ---
 def _get_client():
     global _creds, _gc
@@ -179,9 +186,12 @@ def _get_client():
     # --- This is the original, simple logic for Render ---
     if os.path.isfile(SA_PATH):
         try:
+            import gspread
+            from google.oauth2.service_account import Credentials
             print(f"[Sheets DEBUG] Loading from local file: {SA_PATH}")
             _creds = Credentials.from_service_account_file(SA_PATH, scopes=SCOPES)
             _gc = gspread.authorize(_creds)
+            _gc.set_timeout(resilience.TIMEOUTS["sheets"])  # gspread waits forever by default
             print(f"[Sheets DEBUG] gspread client authorized.")
             return _gc
         except Exception as e:
@@ -191,34 +201,218 @@ def _get_client():
         print(f"[Sheets DEBUG] CRITICAL: Service Account not found at {SA_PATH}")
         return None
 
+# --- Spreadsheet / Worksheet Handle Cache ---
+# Opening a spreadsheet and looking up a tab each cost a metadata request.
+# Handles are kept per process and only re-fetched when they go stale.
+_sh_cache = {}   # sheet_id -> Spreadsheet
+_ws_cache = {}   # (sheet_id, tab_name) -> Worksheet
+_handle_lock = threading.Lock()
+_handle_stats = {"hits": 0, "misses": 0, "metadata_calls_saved": 0, "invalidations": 0}
+
+def _open_worksheet(gc, sheet_id, tab_name):
+    import gspread
+    key = (sheet_id, tab_name)
+    with _handle_lock:
+        ws = _ws_cache.get(key)
+        if ws is not None:
+            _handle_stats["hits"] += 1
+            _handle_stats["metadata_calls_saved"] += 2  # open_by_key + worksheet
+            return ws
+        sh = _sh_cache.get(sheet_id)
+        _handle_stats["misses"] += 1
+
+    if sh is None:
+        print(f"[Sheets DEBUG] Opening sheet by ID: {sheet_id}")
+        sh = gc.open_by_key(sheet_id)
+        print(f"[Sheets DEBUG] Sheet '{sh.title}' opened.")
+    else:
+        with _handle_lock:
+            _handle_stats["metadata_calls_saved"] += 1
+    
+    try:
+        print(f"[Sheets DEBUG] Accessing tab: {tab_name}")
+        ws = sh.worksheet(tab_name)
+        print(f"[Sheets DEBUG] Tab '{tab_name}' found.")
+    except gspread.WorksheetNotFound:
+        print(f"[Sheets DEBUG] Tab '{tab_name}' not found. Creating it...")
+        ws = sh.add_worksheet(title=tab_name, rows=1000, cols=10)
+        print(f"[Sheets DEBUG] Tab '{tab_name}' created.")
+
+    with _handle_lock:
+        _sh_cache[sheet_id] = sh
+        _ws_cache[key] = ws
+    return ws
+
+def _invalidate_handles(sheet_id, tab_name):
+    with _handle_lock:
+        _sh_cache.pop(sheet_id, None)
+        _ws_cache.pop((sheet_id, tab_name), None)
+        _handle_stats["invalidations"] += 1
+
+def _is_stale_handle_error(e) -> bool:
+    """A deleted/renamed sheet or tab shows up as a 404 or an unparsable range."""
+    import gspread
+    if isinstance(e, (gspread.WorksheetNotFound, gspread.SpreadsheetNotFound)):
+        return True
+    if isinstance(e, gspread.exceptions.APIError):
+        code = getattr(e, "code", None)
+        return code == 404 or (code == 400 and "Unable to parse range" in str(e))
+    return False
+
+def _append(gc, sheet_id, tab_name, rows):
+    """append_rows through the handle cache; a stale handle is dropped and retried once."""
+    try:
+        _open_worksheet(gc, sheet_id, tab_name).append_rows(rows)
+    except Exception as e:
+        if not _is_stale_handle_error(e):
+            raise
+        print(f"[Sheets DEBUG] Stale handle for '{tab_name}' ({e}). Re-opening...")
+        _invalidate_handles(sheet_id, tab_name)
+        _open_worksheet(gc, sheet_id, tab_name).append_rows(rows)
+
+def get_handle_cache_stats() -> dict:
+    with _handle_lock:
+        return dict(_handle_stats, cached_worksheets=len(_ws_cache))
+
+def check_access():
+    """Health probe: one metadata read of the first configured spreadsheet. (ok, msg); ok is None if unconfigured."""
+    sheet_id = next(filter(None, (os.getenv(k) for k in (
+        "GOOGLE_SHEET_ID_APPOINTMENT", "GOOGLE_SHEET_ID_FEEDBACK", "GOOGLE_SHEET_ID_ANALYTICS"))), None)
+    if not sheet_id:
+        return None, "No sheet ID configured"
+    gc = _get_client()
+    if not gc:
+        return False, "gspread client not available"
+    gc.open_by_key(sheet_id)
+    return True, None
+
+def _outcome_unknown(e) -> bool:
+    """
+    True when an append may have landed despite the error: the request was
+    sent but the response never arrived (read timeout, dropped connection).
+    Error responses, refused connections and open breakers are known failures.
+    """
+    import requests
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return False
+    return isinstance(e, (requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+                          requests.exceptions.ChunkedEncodingError))
+
 def _write_to_sheet(sheet_id, tab_name, data_row):
     try:
         gc = _get_client()
         if not gc: 
             return False, "Client not authorized"
         
-        print(f"[Sheets DEBUG] Opening sheet by ID: {sheet_id}")
-        sh = gc.open_by_key(sheet_id)
-        print(f"[Sheets DEBUG] Sheet '{sh.title}' opened.")
-        
-        ws = None
-        try:
-            print(f"[Sheets DEBUG] Accessing tab: {tab_name}")
-            ws = sh.worksheet(tab_name)
-            print(f"[Sheets DEBUG] Tab '{tab_name}' found.")
-        except gspread.WorksheetNotFound:
-            print(f"[Sheets DEBUG] Tab '{tab_name}' not found. Creating it...")
-            ws = sh.add_worksheet(title=tab_name, rows=1000, cols=10)
-            print(f"[Sheets DEBUG] Tab '{tab_name}' created.")
-            
-        ws.append_row(data_row)
+        # Appends run on this thread to completion (never abandoned or hedged, see resilience.py)
+        with metrics.span("sheets_write", dependency="sheets"):
+            resilience.call("sheets", _append, gc, sheet_id, tab_name, [data_row])
         print(f"[Sheets DEBUG] Row appended successfully.")
         return True, "Success"
         
     except Exception as e:
-        print(f"[Sheets DEBUG] CRITICAL: Error writing to sheet: {e}")
+        if _outcome_unknown(e):
+            print(f"[Sheets DEBUG] CRITICAL: No response to the append; the row may have been written: {e}")
+        else:
+            print(f"[Sheets DEBUG] CRITICAL: Error writing to sheet: {e}")
         return False, str(e)
 
+def _write_rows_to_sheet(sheet_id, tab_name, rows):
+    """
+    Appends many rows with a single append_rows call. Returns (ok, msg,
+    retry); retry is False when the rows may already be in the sheet.
+    """
+    try:
+        gc = _get_client()
+        if not gc: 
+            return False, "Client not authorized", True
+        
+        with metrics.span("sheets_write", dependency="sheets"):
+            resilience.call("sheets", _append, gc, sheet_id, tab_name, rows)
+        print(f"[Sheets DEBUG] {len(rows)} rows appended successfully.")
+        return True, "Success", False
+        
+    except Exception as e:
+        print(f"[Sheets DEBUG] CRITICAL: Error writing rows to sheet: {e}")
+        return False, str(e), not _outcome_unknown(e)
+
+# --- Write-Behind Analytics Queue ---
+# Each event is [sheet_id, tab_name, row, attempts]. The deque is bounded:
+# when it is full the oldest event is dropped and counted.
+_queue = deque()
+_queue_cond = threading.Condition()
+_flusher = None
+_flusher_pid = None
+# unknown: rows of batches that got no response (maybe written, not retried)
+_analytics_stats = {"enqueued": 0, "flushed": 0, "dropped": 0, "unknown": 0, "batches": 0, "failed_batches": 0}
+
+def _enqueue(sheet_id, tab_name, row):
+    global _flusher, _flusher_pid
+    with _queue_cond:
+        if len(_queue) >= ANALYTICS_QUEUE_MAX:
+            _queue.popleft()
+            _analytics_stats["dropped"] += 1
+        _queue.append([sheet_id, tab_name, row, 0])
+        _analytics_stats["enqueued"] += 1
+        # Start one flusher per process (gunicorn forks after import)
+        if _flusher is None or _flusher_pid != os.getpid() or not _flusher.is_alive():
+            _flusher_pid = os.getpid()
+            _flusher = threading.Thread(target=_flush_loop, name="sheets-analytics-flusher", daemon=True)
+            _flusher.start()
+        if len(_queue) >= ANALYTICS_BATCH_SIZE:
+            _queue_cond.notify()
+    return True, "Queued"
+
+def _flush_loop():
+    while True:
+        with _queue_cond:
+            deadline = time.monotonic() + ANALYTICS_FLUSH_INTERVAL
+            while len(_queue) < ANALYTICS_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                _queue_cond.wait(remaining)
+        flush_analytics()
+
+def flush_analytics():
+    """Sends everything queued so far, one append_rows call per tab and batch."""
+    with _queue_cond:
+        events = [_queue.popleft() for _ in range(len(_queue))]
+    if not events:
+        return
+
+    groups = {}
+    for event in events:
+        groups.setdefault((event[0], event[1]), []).append(event)
+
+    for (sheet_id, tab_name), group in groups.items():
+        for i in range(0, len(group), ANALYTICS_BATCH_SIZE):
+            batch = group[i:i + ANALYTICS_BATCH_SIZE]
+            ok, msg, retry = _write_rows_to_sheet(sheet_id, tab_name, [e[2] for e in batch])
+            with _queue_cond:
+                _analytics_stats["batches"] += 1
+                if ok:
+                    _analytics_stats["flushed"] += len(batch)
+                    continue
+                _analytics_stats["failed_batches"] += 1
+                if not retry:
+                    # Sending them again could write them twice
+                    _analytics_stats["unknown"] += len(batch)
+                    continue
+                # Put failed rows back for the next window, up to a few attempts
+                for event in reversed(batch):
+                    event[3] += 1
+                    if event[3] >= ANALYTICS_MAX_ATTEMPTS or len(_queue) >= ANALYTICS_QUEUE_MAX:
+                        _analytics_stats["dropped"] += 1
+                    else:
+                        _queue.appendleft(event)
+
+def get_analytics_stats() -> dict:
+    with _queue_cond:
+        return dict(_analytics_stats, queued=len(_queue))
+
+atexit.register(flush_analytics)
+
 # --- Public Functions (Appointments & Feedback) ---
 def write_feedback(data: dict):
     print("[Sheets DEBUG] write_feedback called.")
@@ -276,7 +470,7 @@ def write_view():
         return False, "Analytics Sheet ID not configured"
 
     row = [datetime.datetime.utcnow().isoformat() + "Z"]
-    return _write_to_sheet(sheet_id, tab_name, row)
+    return _enqueue(sheet_id, tab_name, row)
 
 def write_query(query: str):
     print("[Sheets DEBUG] write_query called.")
@@ -291,4 +485,4 @@ def write_query(query: str):
         return False, "Analytics Sheet ID not configured"
 
     row = [datetime.datetime.utcnow().isoformat() + "Z", query]
-    return _write_to_sheet(sheet_id, tab_name, row)
\ No newline at end of file
+    return _enqueue(sheet_id, tab_name, row)
\ No newline at end of file
@@ -0,0 +1,20 @@
+# asgi.py
+"""
+ASGI entry point. The chat API runs on asyncio with non-blocking Cohere,
+Pinecone and Groq clients; all other routes are the same Flask app as wsgi.py.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 8000 --workers 2
+"""
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.asgi_app import application
+
+if __name__ == "__main__":
+    import uvicorn
+    print("Starting Uvicorn server on http://127.0.0.1:5001")
+    uvicorn.run(application, host="127.0.0.1", port=5001)
@@ -0,0 +1,18 @@
+# gunicorn.conf.py
+# Picked up automatically by `gunicorn wsgi:application` when started from
+# the project root. Only hooks live here; server settings still come from
+# the command line or GUNICORN_CMD_ARGS.
+import os
+
+def post_worker_init(worker):
+    """Warms the API clients and starts the health checker in each worker right after it loads the app."""
+    if os.getenv("CLIENT_WARMUP", "true").lower() == "true":
+        from app.chatbot import clients
+        clients.warm_up(background=True)
+    from app.chatbot import health
+    health.start()
+
+def child_exit(server, worker):
+    """Folds the exited worker's metrics file into the archive right away (pids get reused)."""
+    from app.utils import metrics
+    metrics.worker_exited(worker.pid)
@@ -1,23 +1,58 @@
 # scripts/ingest_data.py
-import os, time, uuid
+import os, re, sys, time, json, hashlib, argparse, random, queue, threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 from pinecone import Pinecone, ServerlessSpec
 from pypdf import PdfReader
 import cohere
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
 load_dotenv(os.path.join(BASE_DIR, ".env"))
 
+from app.chatbot.local_index import write_local_index, read_local_index
+from app.chatbot.lexical_index import LexicalIndexWriter, read_lexical_docs, POSTINGS_FILE, DOCS_FILE
+
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_ENV = os.getenv("PINECONE_ENVIRONMENT", "us-east-1")
 INDEX_NAME = os.getenv("PINECONE_INDEX", "flcs-chatbot")
 
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")
 EMBED_MODEL = os.getenv("COHERE_EMBED_MODEL", "embed-english-v3.0")
+# The chatbot's semantic cache clears itself when this file changes
+INDEX_VERSION_PATH = os.getenv("INDEX_VERSION_PATH", os.path.join(BASE_DIR, "data", ".index_version"))
+# Must match the chatbot's setting: "pinecone" or "local"
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "pinecone").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join(BASE_DIR, "data", "local_index"))
+# BM25 index over the same chunks (hybrid search, and the fallback when the vector index is down)
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", os.path.join(BASE_DIR, "data", "lexical_index"))
+# Which chunks are already in the index: {id: {"file", "page", "chunk", "hash"}}
+MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", os.path.join(BASE_DIR, "data", ".ingest_manifest.json"))
+MANIFEST_TARGET = f"local:{LOCAL_INDEX_DIR}" if RETRIEVER_BACKEND == "local" else f"pinecone:{INDEX_NAME}"
+# PDF parsing runs in a process pool; at most INGEST_MAX_IN_FLIGHT files are
+# parsed or waiting to be consumed at any time, which bounds memory use.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+INGEST_MAX_IN_FLIGHT = int(os.getenv("INGEST_MAX_IN_FLIGHT", str(INGEST_WORKERS * 2)))
+BATCH = 64
+# Pages are split into chunks of at most CHUNK_TOKENS tokens; consecutive
+# chunks of a section share CHUNK_OVERLAP tokens.
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "300"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "40"))
+# Embedding and upserting overlap across worker threads; the queues between
+# the stages are bounded so a slow stage throttles the one before it.
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "4"))
+INGEST_UPSERT_WORKERS = int(os.getenv("INGEST_UPSERT_WORKERS", "2"))
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "8"))
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "5"))
+# Pages written during a run, flushed into the manifest at the end; a
+# crashed run picks up from here instead of starting over.
+CHECKPOINT_PATH = os.getenv("INGEST_CHECKPOINT_PATH", os.path.join(BASE_DIR, "data", ".ingest_checkpoint.jsonl"))
 
-assert PINECONE_API_KEY and COHERE_API_KEY, "Missing API keys."
+assert COHERE_API_KEY, "Missing COHERE_API_KEY."
+assert PINECONE_API_KEY or RETRIEVER_BACKEND == "local", "Missing PINECONE_API_KEY."
 
-pc = Pinecone(api_key=PINECONE_API_KEY)
+pc = Pinecone(api_key=PINECONE_API_KEY) if RETRIEVER_BACKEND != "local" else None
 co = cohere.Client(COHERE_API_KEY)
 
 def ensure_index():
@@ -34,59 +69,548 @@ def ensure_index():
             time.sleep(5)
     print(f"Index '{INDEX_NAME}' ready.")
 
-def read_pdfs_text(data_dir):
-    docs = []
+def chunk_id(rel_path, page, chunk, text_hash):
+    """Deterministic vector ID: the same chunk content always maps to the same ID."""
+    return hashlib.sha256(f"{rel_path}\x00{page}\x00{chunk}\x00{text_hash}".encode("utf-8")).hexdigest()[:32]
+
+# --- Chunking ---
+# Token counts are approximated with a word/punctuation split, which tracks
+# subword tokenizers closely enough for sizing chunks and needs no model files.
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_NUMBERED_RE = re.compile(r"^\d+(\.\d+)*\.?\s+\S")
+
+def count_tokens(text):
+    return len(_TOKEN_RE.findall(text))
+
+def _is_heading(line):
+    words = line.split()
+    if not words or len(words) > 8 or len(line) > 60 or line[-1] in ".,;!?":
+        return False
+    letters = [c for c in line if c.isalpha()]
+    return bool(letters) and (line.isupper() or line.endswith(":") or line.istitle() or bool(_NUMBERED_RE.match(line)))
+
+def split_sections(text):
+    """Splits page text into sections (lists of paragraphs) at heading lines."""
+    sections, paragraphs, lines = [], [], []
+    for raw in text.splitlines() + [""]:
+        line = raw.strip()
+        if line and not _is_heading(line):
+            lines.append(line)
+            continue
+        if lines:
+            paragraphs.append("\n".join(lines))
+            lines = []
+        if line:  # heading: close the current section, the heading opens the next
+            if paragraphs:
+                sections.append(paragraphs)
+            paragraphs = [line]
+    if paragraphs:
+        sections.append(paragraphs)
+    return sections
+
+def _units(paragraphs, max_tokens):
+    """Paragraphs, or their sentences (or word runs) when a paragraph is too long."""
+    for para in paragraphs:
+        if count_tokens(para) <= max_tokens:
+            yield para
+            continue
+        for sentence in _SENTENCE_RE.split(para):
+            if count_tokens(sentence) <= max_tokens:
+                yield sentence
+                continue
+            piece, n = [], 0
+            for word in sentence.split():
+                t = count_tokens(word)
+                if piece and n + t > max_tokens:
+                    yield " ".join(piece)
+                    piece, n = [], 0
+                piece.append(word)
+                n += t
+            if piece:
+                yield " ".join(piece)
+
+def _tail(text, max_tokens):
+    words, n = [], 0
+    for word in reversed(text.split()):
+        n += count_tokens(word)
+        if n > max_tokens:
+            break
+        words.append(word)
+    return " ".join(reversed(words))
+
+def chunk_text(text, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """
+    Packs paragraphs into chunks of at most max_tokens. A new section starts
+    a new chunk (unless the current one is still tiny); within a section,
+    each chunk repeats the last `overlap` tokens of the previous one.
+    """
+    overlap = min(overlap, max_tokens // 2)
+    chunks, cur, n = [], [], 0
+    for i, section in enumerate(split_sections(text)):
+        if i and cur and n >= max_tokens // 4:
+            chunks.append("\n\n".join(cur))
+            cur, n = [], 0
+        for unit in _units(section, max_tokens - overlap):
+            t = count_tokens(unit)
+            if cur and n + t > max_tokens:
+                chunks.append("\n\n".join(cur))
+                tail = _tail(chunks[-1], overlap)
+                cur, n = ([tail], count_tokens(tail)) if tail else ([], 0)
+            cur.append(unit)
+            n += t
+    if cur:
+        chunks.append("\n\n".join(cur))
+    return chunks
+
+# --- PDF Extraction (process pool, streamed) ---
+def extract_pdf(path, rel_path):
+    """
+    Parses and chunks one PDF. Runs in a worker process, so it must stay
+    top-level and picklable.
+    """
+    started = time.perf_counter()
+    f = os.path.basename(path)
+    chunks = []
+    pages = 0
+    error = None
+    try:
+        reader = PdfReader(path)
+        for i, page in enumerate(reader.pages):
+            text = (page.extract_text() or "").strip()
+            if not text:
+                continue
+            pages += 1
+            for n, chunk in enumerate(chunk_text(text)):
+                text_hash = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+                chunks.append({
+                    "id": chunk_id(rel_path, i+1, n, text_hash),
+                    "text": chunk,
+                    "hash": text_hash,
+                    "file": rel_path,
+                    "meta": {"source": f, "page": i+1, "chunk": n}
+                })
+    except Exception as e:
+        error = str(e)
+    return {"file": rel_path, "chunks": chunks, "pages": pages, "seconds": time.perf_counter() - started, "error": error}
+
+def iter_pdf_files(data_dir):
     for root, _, files in os.walk(data_dir):
-        for f in files:
+        for f in sorted(files):
             if f.lower().endswith(".pdf"):
                 path = os.path.join(root, f)
-                try:
-                    reader = PdfReader(path)
-                    for i, page in enumerate(reader.pages):
-                        text = (page.extract_text() or "").strip()
-                        if text:
-                            docs.append({
-                                "id": str(uuid.uuid4()),
-                                "text": text,
-                                "meta": {"source": f, "page": i+1}
-                            })
-                except Exception as e:
-                    print(f"Warning: Could not read {f}. Error: {e}")
-    return docs
+                yield path, os.path.relpath(path, data_dir)
+
+def iter_pdf_chunks(data_dir, report):
+    """
+    Yields chunk docs as soon as their file is parsed. `report` collects
+    per-file timings ({"file", "pages", "chunks", "seconds"}) and failures.
+    """
+    files = iter_pdf_files(data_dir)
+    with ProcessPoolExecutor(max_workers=INGEST_WORKERS) as pool:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < INGEST_MAX_IN_FLIGHT:
+                nxt = next(files, None)
+                if nxt is None:
+                    exhausted = True
+                else:
+                    pending.add(pool.submit(extract_pdf, *nxt))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                res = fut.result()
+                if res["error"]:
+                    print(f"Warning: Could not read {res['file']}. Error: {res['error']}")
+                    report["failed"].append((res["file"], res["error"]))
+                else:
+                    print(f"Parsed {res['file']}: {res['pages']} pages -> {len(res['chunks'])} chunks in {res['seconds']:.2f}s")
+                    report["files"].append({"file": res["file"], "pages": res["pages"], "chunks": len(res["chunks"]), "seconds": res["seconds"]})
+                yield from res["chunks"]
+
+# --- Manifest (what is already indexed) ---
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as fh:
+            manifest = json.load(fh)
+    except FileNotFoundError:
+        return {}
+    if manifest.get("target") != MANIFEST_TARGET:
+        print(f"Manifest belongs to '{manifest.get('target')}', not '{MANIFEST_TARGET}'. Starting fresh.")
+        return {}
+    return manifest.get("pages", {})
+
+def save_manifest(pages):
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump({"target": MANIFEST_TARGET, "pages": pages}, fh, indent=1, sort_keys=True)
+    os.replace(tmp, MANIFEST_PATH)
+
+def manifest_entry(doc):
+    return {"file": doc["file"], "page": doc["meta"]["page"], "chunk": doc["meta"]["chunk"], "hash": doc["hash"]}
 
 def embed_texts(texts):
     resp = co.embed(model=EMBED_MODEL, input_type="search_document", texts=texts)
     return resp.embeddings
 
-def upsert_pinecone(docs):
-    index = pc.Index(INDEX_NAME)
-    BATCH = 64
-    for i in range(0, len(docs), BATCH):
-        chunk = docs[i:i+BATCH]
+# --- Retries ---
+def _status_of(e):
+    return getattr(e, "status_code", None) or getattr(e, "status", None)
+
+def _retry_delay(e, attempt):
+    """Honours Retry-After on rate limits, otherwise exponential backoff with jitter."""
+    if _status_of(e) == 429:
+        headers = getattr(e, "headers", None) or {}
         try:
-            vectors = embed_texts([d["text"] for d in chunk])
-            items = []
-            for d, v in zip(chunk, vectors):
-                items.append({
-                    "id": d["id"],
-                    "values": v,
-                    "metadata": d["meta"] | {"text": d["text"]},
-                })
-            index.upsert(vectors=items)
-            print(f"Upserted {i+len(chunk)}/{len(docs)}")
+            return min(float(headers.get("retry-after") or headers.get("Retry-After")), 60.0)
+        except (TypeError, ValueError):
+            pass
+    return min(2 ** attempt, 30) + random.uniform(0, 1)
+
+def with_retries(what, fn, *args):
+    for attempt in range(INGEST_MAX_RETRIES + 1):
+        try:
+            return fn(*args)
         except Exception as e:
-            print(f"Error embedding/upserting batch {i}: {e}")
+            status = _status_of(e)
+            # Bad requests and auth errors will not get better by waiting
+            if attempt == INGEST_MAX_RETRIES or status in (400, 401, 403, 404):
+                raise
+            delay = _retry_delay(e, attempt)
+            print(f"{what} failed ({e}). Retry {attempt + 1}/{INGEST_MAX_RETRIES} in {delay:.1f}s ...")
+            time.sleep(delay)
+
+# --- Checkpoint (chunks written during the current run) ---
+class Checkpoint:
+    """
+    Append-only JSONL. Each line is either a written chunk
+    {"id", "entry"[, "vector", "meta"]} or a failed batch {"failed": [...], "error"}.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fh = None
+
+    def load(self):
+        """Returns (written, failed) from an interrupted earlier run."""
+        written, failed = {}, []
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                lines = fh.readlines()
+        except FileNotFoundError:
+            return written, failed
+        for line in lines:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # torn last line after a crash
+            if rec.get("target") not in (None, MANIFEST_TARGET):
+                continue
+            if "failed" in rec:
+                failed.append(rec)
+            else:
+                written[rec["id"]] = rec
+        return written, failed
+
+    def record(self, rec):
+        with self._lock:
+            if self._fh is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._fh = open(self.path, "a", encoding="utf-8")
+            self._fh.write(json.dumps(dict(rec, target=MANIFEST_TARGET)) + "\n")
+            self._fh.flush()
+
+    def clear(self):
+        with self._lock:
+            if self._fh:
+                self._fh.close()
+                self._fh = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+# --- Index Writers ---
+class PineconeWriter:
+    def __init__(self):
+        self.index = pc.Index(INDEX_NAME)
+
+    def write(self, docs, vectors):
+        items = []
+        for d, v in zip(docs, vectors):
+            items.append({
+                "id": d["id"],
+                "values": v,
+                "metadata": d["meta"] | {"text": d["text"]},
+            })
+        self.index.upsert(vectors=items)
+
+    def checkpoint_record(self, doc, vector):
+        return {"id": doc["id"], "entry": manifest_entry(doc)}
+
+    def resume(self, rec):
+        pass  # already in Pinecone
+
+    def finish(self, keep_ids, removed):
+        removed = list(removed)
+        for i in range(0, len(removed), 1000):
+            self.index.delete(ids=removed[i:i+1000])
+
+class LocalWriter:
+    """
+    Rewrites the memory-mapped index used by RETRIEVER_BACKEND=local: the
+    existing rows listed in keep_ids plus the newly embedded docs.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ids, self.vectors, self.metas = [], [], []
+
+    def write(self, docs, vectors):
+        with self._lock:
+            self.vectors.extend(vectors)
+            self.ids.extend(d["id"] for d in docs)
+            self.metas.extend(d["meta"] | {"text": d["text"]} for d in docs)
+
+    def checkpoint_record(self, doc, vector):
+        # The vectors only reach disk at finish(), so the checkpoint carries them
+        return {"id": doc["id"], "entry": manifest_entry(doc), "vector": list(vector), "meta": doc["meta"] | {"text": doc["text"]}}
+
+    def resume(self, rec):
+        with self._lock:
+            self.ids.append(rec["id"])
+            self.vectors.append(rec["vector"])
+            self.metas.append(rec["meta"])
+
+    def finish(self, keep_ids, removed):
+        ids, vectors, metas = [], [], []
+        if keep_ids:
+            old_ids, matrix, old_metas = read_local_index(LOCAL_INDEX_DIR)
+            for row, (doc_id, meta) in enumerate(zip(old_ids, old_metas)):
+                if doc_id in keep_ids:
+                    ids.append(doc_id)
+                    vectors.append(matrix[row])
+                    metas.append(meta)
+        removed = set(removed)
+        for doc_id, vector, meta in zip(self.ids, self.vectors, self.metas):
+            if doc_id not in removed:
+                ids.append(doc_id)
+                vectors.append(vector)
+                metas.append(meta)
+        write_local_index(LOCAL_INDEX_DIR, ids, vectors, metas)
+        print(f"Local index written to {LOCAL_INDEX_DIR} ({len(ids)} vectors).")
+
+# --- Embed / Upsert Pipeline ---
+class IngestPipeline:
+    """
+    batches --> [embed workers] --> bounded queue --> [upsert workers]
+    submit() blocks while the embed queue is full (backpressure on extraction).
+    """
+    _STOP = object()
+
+    def __init__(self, writer, checkpoint):
+        self.writer = writer
+        self.checkpoint = checkpoint
+        self.embed_q = queue.Queue(maxsize=INGEST_QUEUE_DEPTH)
+        self.upsert_q = queue.Queue(maxsize=INGEST_QUEUE_DEPTH)
+        self._lock = threading.Lock()
+        self.written = {}   # id -> manifest entry
+        self.failed = 0
+        self._embedders = [threading.Thread(target=self._embed_loop, daemon=True) for _ in range(INGEST_EMBED_WORKERS)]
+        self._upserters = [threading.Thread(target=self._upsert_loop, daemon=True) for _ in range(INGEST_UPSERT_WORKERS)]
+        for t in self._embedders + self._upserters:
+            t.start()
+
+    def submit(self, docs):
+        self.embed_q.put(docs)
+
+    def close(self):
+        for _ in self._embedders:
+            self.embed_q.put(self._STOP)
+        for t in self._embedders:
+            t.join()
+        for _ in self._upserters:
+            self.upsert_q.put(self._STOP)
+        for t in self._upserters:
+            t.join()
+
+    def _fail(self, docs, stage, e):
+        print(f"Error: {stage} failed for a batch of {len(docs)} after retries: {e}")
+        self.checkpoint.record({"failed": [d["id"] for d in docs], "stage": stage, "error": str(e)})
+        with self._lock:
+            self.failed += len(docs)
+
+    def _embed_loop(self):
+        while True:
+            docs = self.embed_q.get()
+            if docs is self._STOP:
+                return
+            try:
+                vectors = with_retries("Embedding", embed_texts, [d["text"] for d in docs])
+            except Exception as e:
+                self._fail(docs, "embed", e)
+                continue
+            self.upsert_q.put((docs, vectors))
+
+    def _upsert_loop(self):
+        while True:
+            item = self.upsert_q.get()
+            if item is self._STOP:
+                return
+            docs, vectors = item
+            try:
+                with_retries("Upsert", self.writer.write, docs, vectors)
+            except Exception as e:
+                self._fail(docs, "upsert", e)
+                continue
+            for d, v in zip(docs, vectors):
+                self.checkpoint.record(self.writer.checkpoint_record(d, v))
+            with self._lock:
+                for d in docs:
+                    self.written[d["id"]] = manifest_entry(d)
+                print(f"Written {len(self.written)} new chunks")
+
+def local_index_readable():
+    try:
+        read_local_index(LOCAL_INDEX_DIR)
+        return True
+    except (OSError, ValueError, KeyError):
+        return False
+
+def lexical_index_exists():
+    return all(os.path.exists(os.path.join(LEXICAL_INDEX_DIR, f)) for f in (POSTINGS_FILE, DOCS_FILE))
+
+def finish_lexical_index(lexical, carry_ids):
+    """
+    Writes the BM25 index. carry_ids are chunks of files that could not be
+    parsed this run; like their vectors, they are kept from the previous index.
+    """
+    if carry_ids:
+        try:
+            for doc_id, meta in zip(*read_lexical_docs(LEXICAL_INDEX_DIR)):
+                if doc_id in carry_ids:
+                    lexical.add(doc_id, meta)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: Could not read the previous lexical index ({e}). Unreadable files are left out of it.")
+    terms = lexical.finish()
+    print(f"Lexical index written to {LEXICAL_INDEX_DIR} ({len(lexical)} chunks, {terms} terms).")
+
+def touch_index_version():
+    os.makedirs(os.path.dirname(INDEX_VERSION_PATH), exist_ok=True)
+    with open(INDEX_VERSION_PATH, "w") as fh:
+        fh.write(str(time.time()))
 
 def main():
-    ensure_index()
+    parser = argparse.ArgumentParser(description="Index the PDFs under data/ for the chatbot.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="wipe the index and manifest first (also removes vectors left by old random-ID runs)")
+    args = parser.parse_args()
+
+    if RETRIEVER_BACKEND != "local":
+        ensure_index()
     data_dir = os.path.join(BASE_DIR, "data")
     assert os.path.isdir(data_dir), f"Missing folder: {data_dir}"
-    docs = read_pdfs_text(data_dir)
-    if not docs:
+
+    manifest = {} if args.rebuild else load_manifest()
+    if args.rebuild and RETRIEVER_BACKEND != "local":
+        print(f"Rebuild requested. Deleting all vectors in '{INDEX_NAME}' ...")
+        try:
+            pc.Index(INDEX_NAME).delete(delete_all=True)
+        except Exception as e:
+            print(f"Warning: delete_all failed ({e}). The index may be empty already.")
+    elif not manifest:
+        print("No manifest found. Every chunk will be embedded; run with --rebuild to also clear old vectors.")
+
+    if RETRIEVER_BACKEND == "local" and manifest and not local_index_readable():
+        print("Warning: Could not read the existing local index. Re-embedding everything.")
+        manifest = {}
+
+    # --- Resume from an interrupted run ---
+    writer = LocalWriter() if RETRIEVER_BACKEND == "local" else PineconeWriter()
+    checkpoint = Checkpoint(CHECKPOINT_PATH)
+    if args.rebuild:
+        checkpoint.clear()
+    resumed, prev_failed = checkpoint.load()
+    if resumed or prev_failed:
+        print(f"Resuming: {len(resumed)} chunks from the last run's checkpoint, "
+              f"{sum(len(r['failed']) for r in prev_failed)} failed chunks will be retried.")
+    for rec in resumed.values():
+        writer.resume(rec)
+
+    # --- Stream chunks, diffing each one against the manifest ---
+    # Only the batches queued in the pipeline keep chunk texts in memory; the
+    # lexical index gets every chunk (new or not) and spools texts to disk.
+    pipeline = IngestPipeline(writer, checkpoint)
+    lexical = LexicalIndexWriter(LEXICAL_INDEX_DIR)
+    report = {"files": [], "failed": []}
+    started = time.perf_counter()
+    seen = {}
+    new_count = 0
+    batch = []
+    try:
+        for doc in iter_pdf_chunks(data_dir, report):
+            seen[doc["id"]] = manifest_entry(doc)
+            lexical.add(doc["id"], doc["meta"] | {"text": doc["text"]})
+            if doc["id"] in manifest or doc["id"] in resumed:
+                continue
+            new_count += 1
+            batch.append(doc)
+            if len(batch) >= BATCH:
+                pipeline.submit(batch)
+                batch = []
+        if batch:
+            pipeline.submit(batch)
+    finally:
+        pipeline.close()
+    done = {doc_id: rec["entry"] for doc_id, rec in resumed.items()}
+    done.update(pipeline.written)
+    elapsed = time.perf_counter() - started
+
+    if not seen and not report["failed"]:
         print("No extractable text found in PDFs under /data. Add PDFs.")
+        lexical.abort()
         return
-    upsert_pinecone(docs)
+
+    # Pages of files that failed to parse this time are kept, not deleted
+    unreadable = {name for name, _ in report["failed"]}
+    removed = [doc_id for doc_id, entry in manifest.items() if doc_id not in seen and entry["file"] not in unreadable]
+    keep_ids = {doc_id for doc_id, entry in manifest.items() if doc_id in seen or entry["file"] in unreadable}
+    skipped = len(keep_ids)
+    carry_ids = keep_ids - seen.keys()
+    if not new_count and not removed and not resumed:
+        print(f"Nothing to do: {skipped} chunks already indexed.")
+        checkpoint.clear()
+        # First run since the lexical index was introduced (or it was deleted)
+        if lexical_index_exists():
+            lexical.abort()
+        else:
+            finish_lexical_index(lexical, carry_ids)
+        return
+
+    # Resumed chunks that vanished from data/ since the crash are deleted too
+    stale = [doc_id for doc_id in done if doc_id not in seen]
+    writer.finish(keep_ids, removed + stale)
+    finish_lexical_index(lexical, carry_ids)
+    pages = {doc_id: manifest[doc_id] for doc_id in keep_ids}
+    pages.update({doc_id: entry for doc_id, entry in done.items() if doc_id in seen})
+    save_manifest(pages)
+    checkpoint.clear()
+    touch_index_version()
+
+    print(f"Parsed {len(report['files'])} files with {INGEST_WORKERS} workers.")
+    for name, error in report["failed"]:
+        print(f"  FAILED {name}: {error}")
+    failed = pipeline.failed
+    added = len(pipeline.written)
+    print(f"Summary: {skipped} skipped (unchanged), {added} added"
+          + (f", {len(resumed)} resumed" if resumed else "")
+          + f", {len(removed) + len(stale)} deleted"
+          + (f", {failed} failed (will be retried next run)" if failed else "") + ".")
+    page_count = sum(f["pages"] for f in report["files"])
+    print(f"Throughput: {page_count / elapsed if elapsed else 0:.1f} pages/sec, {added / elapsed if elapsed else 0:.1f} new chunks/sec "
+          f"({page_count} pages, {added} chunks embedded in {elapsed:.1f}s, "
+          f"{INGEST_EMBED_WORKERS} embed / {INGEST_UPSERT_WORKERS} upsert workers).")
     print("✅ Ingestion complete.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,394 @@
+# scripts/loadtest.py
+"""
+Offline load test for the chat API; no API quota is used.
+
+Starts the Flask app on a local threaded HTTP server with Cohere, Pinecone,
+Groq, DDGS and Google Sheets replaced by in-process fakes. Each fake has a
+configurable median latency, jitter and error rate. Virtual users then
+replay a mix of menu clicks, appointment/feedback form flows and free-text
+questions (JSON or SSE). The report gives throughput and p50/p95/p99 per
+request type, plus the server-side stage timings from app.utils.metrics.
+
+    python scripts/loadtest.py [--users 20] [--duration 30] [--mix menu=60,form=10,rag=25,stream=5]
+                               [--latency embed=40,pinecone=30,groq=400,web=600,sheets=300]
+                               [--errors groq=0.01] [--unique 0.5] [--json out.json]
+                               [--baseline base.json --max-regression 0.2]
+
+With --baseline, the run fails (exit 1) if any request type's p95 is more
+than --max-regression slower than in the baseline JSON.
+"""
+import os, sys, io, json, time, math, zlib, types, random, logging, argparse, itertools, tempfile, threading, contextlib
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+DEFAULT_LATENCY_MS = {"embed": 40, "pinecone": 30, "groq": 400, "groq_large": 1000, "groq_token": 8, "web": 600, "sheets": 300}
+DEFAULT_MIX = {"menu": 60, "form": 10, "rag": 25, "stream": 5}
+
+MENU_CLICKS = [
+    "hello", "Services", "Admission", "Visa", "Scholarships", "Post-Arrival", "⬅ Services",
+    "Packages", "Silver", "Gold", "Platinum", "Compare", "Add-ons", "⬅ Packages",
+    "Destinations", "About Us", "Reviews", "📞 Contact", "⬅ Menu",
+]
+FORM_FLOWS = [
+    ["Book Appointment", "Jane Doe", "jane@example.com", "+919876543210", "Visa help"],
+    ["Give Feedback", "John Doe", "john@example.com", "+447700900123", "Very helpful, thanks"],
+]
+QUESTIONS = [
+    "What documents do I need for a UK student visa?",
+    "How much does the Gold package cost?",
+    "Can you help with scholarship applications in Canada?",
+    "What is the IELTS score required for Australian universities?",
+    "Do you help with accommodation after arrival?",
+    "How long does the admission process take?",
+    "Which countries do you offer services for?",
+    "What is the deadline for September intake in Germany?",
+]
+ANSWER = ("FLCS can help with that. Our counsellors review your profile, shortlist universities "
+          "and prepare your application documents, then guide you through the visa process.")
+
+# --- Fakes ---
+class FakeServiceError(Exception):
+    pass
+
+class Behaviour:
+    """Latency (lognormal around the median) and error injection for one fake dependency."""
+
+    def __init__(self, name, median_ms, error_rate=0.0, jitter=0.3):
+        self.name, self.median_ms, self.error_rate, self.jitter = name, median_ms, error_rate, jitter
+
+    def delay(self, median_ms=None):
+        median = self.median_ms if median_ms is None else median_ms
+        if median > 0:
+            time.sleep(median * random.lognormvariate(0, self.jitter) / 1000)
+
+    def call(self):
+        self.delay()
+        if random.random() < self.error_rate:
+            raise FakeServiceError(f"injected {self.name} error")
+
+def _fake_embedding(text: str, dim: int = 64):
+    """Deterministic pseudo-random unit vector, so repeats hit the semantic cache."""
+    rng = random.Random(zlib.crc32(text.lower().encode("utf-8")))
+    vec = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in vec))
+    return [v / norm for v in vec]
+
+class FakeCohere:
+    def __init__(self, behaviour):
+        self.b = behaviour
+        self.models = types.SimpleNamespace(list=lambda **kw: [])
+
+    def embed(self, model=None, input_type=None, texts=(), **kw):
+        self.b.call()
+        return types.SimpleNamespace(embeddings=[_fake_embedding(t) for t in texts])
+
+class FakeIndex:
+    """Scores are drawn so some questions fall under RAG_MIN_SCORE or are borderline."""
+
+    def __init__(self, behaviour, low_score_rate=0.15):
+        self.b = behaviour
+        self.low_score_rate = low_score_rate
+
+    def query(self, vector=None, top_k=4, include_metadata=True, **kw):
+        self.b.call()
+        top = random.uniform(0.05, 0.3) if random.random() < self.low_score_rate else random.uniform(0.4, 0.85)
+        return {"matches": [
+            {"score": top - i * 0.03, "metadata": {"text": ANSWER, "source": f"guide-{i}.pdf", "page": i + 1}}
+            for i in range(top_k)
+        ]}
+
+    def describe_index_stats(self, **kw):
+        self.b.call()
+        return {"total_vector_count": 1000}
+
+class _FakeStream:
+    def __init__(self, behaviour, text):
+        self.b, self.words, self.closed = behaviour, text.split(" "), False
+
+    def __iter__(self):
+        for i, word in enumerate(self.words):
+            if self.closed:
+                return
+            self.b.delay(DEFAULT_LATENCY_MS["groq_token"])
+            delta = types.SimpleNamespace(content=word if i == 0 else " " + word)
+            finish = "stop" if i == len(self.words) - 1 else None
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta, finish_reason=finish)])
+
+    def close(self):
+        self.closed = True
+
+class FakeGroq:
+    """
+    Answers from the documents, or the "no info" sentence at no_info_rate (forces
+    the web fallback). Calls routed to the large model use the groq_large latency.
+    """
+
+    def __init__(self, behaviour, no_info_rate=0.1, large_behaviour=None):
+        self.b = behaviour
+        self.large = large_behaviour or behaviour
+        self.no_info_rate = no_info_rate
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._create))
+        self.models = types.SimpleNamespace(list=lambda **kw: [])
+
+    def _create(self, model=None, messages=(), max_tokens=200, stream=False, **kw):
+        from app.chatbot.core import NO_INFO_SENTENCE
+        from app.chatbot.router import GROQ_LARGE_MODEL
+        b = self.large if model == GROQ_LARGE_MODEL else self.b
+        prompt = messages[-1]["content"] if messages else ""
+        no_info = "Context:" in prompt and random.random() < self.no_info_rate
+        text = f"{NO_INFO_SENTENCE} about that topic." if no_info else ANSWER
+        if stream:
+            b.delay(b.median_ms / 4)   # time to first token
+            if random.random() < b.error_rate:
+                raise FakeServiceError("injected groq error")
+            return _FakeStream(b, text)
+        b.call()
+        message = types.SimpleNamespace(content=text)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message, finish_reason="stop")])
+
+def _fake_ddgs_module(behaviour):
+    class DDGS:
+        def __enter__(self): return self
+        def __exit__(self, *exc): return False
+        def text(self, query, max_results=3):
+            behaviour.call()
+            return [{"title": f"Result {i}", "body": ANSWER, "href": f"https://example.com/{i}"} for i in range(max_results)]
+    return types.SimpleNamespace(DDGS=DDGS)
+
+class FakeWorksheet:
+    def __init__(self, behaviour):
+        self.b = behaviour
+        self.rows = 0
+
+    def append_rows(self, rows, **kw):
+        self.b.call()
+        self.rows += len(rows)
+
+class FakeSpreadsheet:
+    def __init__(self, behaviour, sheet_id):
+        self.b, self.title, self._tabs = behaviour, f"sheet-{sheet_id}", {}
+
+    def worksheet(self, tab_name):
+        return self._tabs.setdefault(tab_name, FakeWorksheet(self.b))
+
+class FakeGspread:
+    def __init__(self, behaviour):
+        self.b = behaviour
+
+    def open_by_key(self, sheet_id):
+        self.b.call()
+        return FakeSpreadsheet(self.b, sheet_id)
+
+def install_fakes(latency, errors, jitter, no_info_rate, low_score_rate):
+    """Must run before app.main is imported (the env decides what is "configured")."""
+    tmp = tempfile.mkdtemp(prefix="flcs-loadtest-")
+    for key, value in {
+        "PINECONE_API_KEY": "offline", "COHERE_API_KEY": "offline", "GROQ_API_KEY": "offline",
+        "RETRIEVER_BACKEND": "pinecone", "CLIENT_WARMUP": "false", "RUNTIME_DIR": tmp,
+        "SESSION_BACKEND": "sqlite", "SESSION_DB_PATH": os.path.join(tmp, "sessions.sqlite3"),
+        "METRICS_DIR": os.path.join(tmp, "metrics"),
+        "INDEX_VERSION_PATH": os.path.join(tmp, ".index_version"),
+        "APPOINTMENT_ENABLED": "true", "FEEDBACK_ENABLED": "true", "ANALYTICS_ENABLED": "true",
+        "GOOGLE_SHEET_ID_APPOINTMENT": "appointments", "GOOGLE_SHEET_ID_FEEDBACK": "feedback",
+        "GOOGLE_SHEET_ID_ANALYTICS": "analytics",
+    }.items():
+        os.environ[key] = value
+
+    def behaviour(name, key=None):
+        return Behaviour(name, latency[key or name], errors.get(name, 0.0), jitter)
+
+    from app.chatbot import clients
+    from app.utils import sheets
+    clients.install("cohere", FakeCohere(behaviour("cohere", "embed")))
+    clients.install("pinecone_index", FakeIndex(behaviour("pinecone"), low_score_rate))
+    clients.install("groq", FakeGroq(behaviour("groq"), no_info_rate, behaviour("groq", "groq_large")))
+    sys.modules["ddgs"] = _fake_ddgs_module(behaviour("ddgs", "web"))
+    sheets._get_client = lambda gc=FakeGspread(behaviour("sheets")): gc
+    return tmp
+
+# --- Load Generator ---
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}   # request type -> [seconds]
+        self.errors = {}
+
+    def add(self, kind, seconds, ok):
+        with self.lock:
+            self.samples.setdefault(kind, []).append(seconds)
+            if not ok:
+                self.errors[kind] = self.errors.get(kind, 0) + 1
+
+def _post(client, recorder, kind, path, query):
+    started = time.perf_counter()
+    try:
+        if path.endswith("/stream"):
+            first = None
+            with client.stream("POST", path, json={"query": query}) as resp:
+                body = b""
+                for chunk in resp.iter_bytes():
+                    if first is None:
+                        first = time.perf_counter() - started
+                    body += chunk
+            ok = resp.status_code == 200 and b"event: done" in body and b'"error"' not in body
+            if first is not None:
+                recorder.add(kind + "_first_event", first, ok)
+        else:
+            resp = client.post(path, json={"query": query})
+            ok = resp.status_code == 200 and "error" not in resp.json()
+    except Exception:
+        ok = False
+    recorder.add(kind, time.perf_counter() - started, ok)
+
+def _question(unique_rate, counter):
+    q = random.choice(QUESTIONS)
+    if random.random() < unique_rate:
+        q = f"{q} (case {next(counter)})"   # a different text and embedding: misses every cache
+    return q
+
+def virtual_user(base_url, mix, deadline, recorder, unique_rate, think_ms, counter):
+    import httpx
+    kinds, weights = zip(*mix.items())
+    with httpx.Client(base_url=base_url, timeout=60) as client:   # own cookie jar = own chat session
+        while time.monotonic() < deadline:
+            kind = random.choices(kinds, weights)[0]
+            if kind == "menu":
+                _post(client, recorder, "menu", "/api/chat", random.choice(MENU_CLICKS))
+            elif kind == "form":
+                for step in random.choice(FORM_FLOWS):
+                    _post(client, recorder, "form", "/api/chat", step)
+            elif kind == "rag":
+                _post(client, recorder, "rag", "/api/chat", _question(unique_rate, counter))
+            else:
+                _post(client, recorder, "stream", "/api/chat/stream", _question(unique_rate, counter))
+            if think_ms:
+                time.sleep(random.expovariate(1000 / think_ms))
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(recorder, elapsed):
+    report = {}
+    for kind, values in sorted(recorder.samples.items()):
+        values = sorted(values)
+        report[kind] = {
+            "count": len(values),
+            "errors": recorder.errors.get(kind, 0),
+            "rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 1),
+            **{f"p{p}_ms": round(percentile(values, p) * 1000, 1) for p in (50, 95, 99)},
+            "max_ms": round(values[-1] * 1000, 1),
+        }
+    return report
+
+def server_stages():
+    """Mean and count per stage / answer source, from this process's metrics."""
+    from app.utils import metrics
+    stages, answers = {}, {}
+    for (name, labels), h in metrics._histograms.items():
+        if name == "stage_duration_seconds":
+            count = sum(h[:-1])
+            stages[dict(labels)["stage"]] = {"count": count, "mean_ms": round(h[-1] / count * 1000, 1) if count else 0}
+    for (name, labels), value in metrics._counters.items():
+        if name == "rag_answers_total":
+            answers[dict(labels)["source"]] = value
+    return stages, answers
+
+def _parse_pairs(text, cast=float):
+    pairs = {}
+    for part in filter(None, (p.strip() for p in (text or "").split(","))):
+        key, _, value = part.partition("=")
+        pairs[key.strip()] = cast(value)
+    return pairs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load after warm-up")
+    parser.add_argument("--mix", default="", help="request type weights, e.g. menu=60,form=10,rag=25,stream=5")
+    parser.add_argument("--latency", default="", help="fake median latencies in ms (embed, pinecone, groq, groq_large, groq_token, web, sheets)")
+    parser.add_argument("--errors", default="", help="fake error rates 0-1 (cohere, pinecone, groq, ddgs, sheets)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="lognormal sigma of the fake latencies")
+    parser.add_argument("--no-info-rate", type=float, default=0.1, help="share of RAG answers that trigger the web fallback")
+    parser.add_argument("--low-score-rate", type=float, default=0.15, help="share of retrievals below the score gate")
+    parser.add_argument("--unique", type=float, default=0.5, help="share of questions that miss every cache")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between a user's requests")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report JSON from an earlier run to compare p95 against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 slowdown vs. the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    mix = dict(DEFAULT_MIX, **_parse_pairs(args.mix))
+    mix = {k: v for k, v in mix.items() if v > 0}
+    latency = dict(DEFAULT_LATENCY_MS, **_parse_pairs(args.latency))
+    DEFAULT_LATENCY_MS["groq_token"] = latency["groq_token"]
+    install_fakes(latency, _parse_pairs(args.errors), args.jitter, args.no_info_rate, args.low_score_rate)
+
+    from werkzeug.serving import make_server
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app.main import app, limiter
+    limiter.enabled = False   # every virtual user shares 127.0.0.1
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="loadtest-server", daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"Load test: {args.users} users x {args.duration:g}s against {base_url}")
+    print(f"  mix {mix}\n  latency {latency}  errors {_parse_pairs(args.errors) or 'none'}")
+    counter = itertools.count()
+    # The app prints a line per request; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        virtual_user(base_url, mix, time.monotonic() + 1, Recorder(), args.unique, 0, counter)   # warm-up
+        recorder = Recorder()
+        deadline = time.monotonic() + args.duration
+        started = time.perf_counter()
+        users = [threading.Thread(target=virtual_user, args=(base_url, mix, deadline, recorder, args.unique, args.think_ms, counter))
+                 for _ in range(args.users)]
+        for user in users: user.start()
+        for user in users: user.join()
+        elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    report = summarize(recorder, elapsed)
+    total = sum(r["count"] for kind, r in report.items() if not kind.endswith("_first_event"))
+    print(f"\n{'type':<20}{'count':>7}{'errors':>8}{'req/s':>9}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for kind, r in report.items():
+        print(f"{kind:<20}{r['count']:>7}{r['errors']:>8}{r['rps']:>9}{r['mean_ms']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['max_ms']:>9}")
+    print(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+
+    stages, answers = server_stages()
+    print("\n--- Server-side stages (app.utils.metrics) ---")
+    for stage, s in sorted(stages.items()):
+        print(f"{stage:<14}{s['count']:>7} calls  mean {s['mean_ms']:>8} ms")
+    print(f"answers by source: {answers}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "elapsed_s": round(elapsed, 2), "requests": report,
+                       "stages": stages, "answers": answers}, f, indent=2)
+        print(f"Report written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["requests"]
+        regressions = [
+            f"{kind}: p95 {r['p95_ms']} ms vs {baseline[kind]['p95_ms']} ms"
+            for kind, r in report.items()
+            if kind in baseline and r["p95_ms"] > baseline[kind]["p95_ms"] * (1 + args.max_regression)
+        ]
+        if regressions:
+            print("\nREGRESSION (p95 over +{:.0%}):\n  ".format(args.max_regression) + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nNo p95 regression over +{args.max_regression:.0%} against {args.baseline}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# scripts/profile_startup.py
+"""
+Cold-start profile for the Flask app.
+
+Runs `python -X importtime` on app.main in a fresh interpreter and prints the
+slowest imports (cumulative), then times a cold process from start to its
+first responses: GET / and a menu click on /api/chat.
+
+    python scripts/profile_startup.py [--top 25] [--module app.main]
+"""
+import os, sys, argparse, subprocess
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# These should only be imported by the first request that needs them
+HEAVY_SDKS = ["pinecone", "cohere", "groq", "ddgs", "gspread", "numpy"]
+
+FIRST_RESPONSE_SNIPPET = """
+import time, contextlib, io
+started = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    from app.main import app
+    imported = time.perf_counter()
+    client = app.test_client()
+    client.get("/")
+    index_done = time.perf_counter()
+    client.post("/api/chat", json={"query": "Services"})
+    menu_done = time.perf_counter()
+print(f"{(imported - started) * 1000:.0f} {(index_done - started) * 1000:.0f} {(menu_done - started) * 1000:.0f}")
+"""
+
+def _run(args, env_extra=None):
+    env = dict(os.environ, PYTHONPATH=BASE_DIR, **(env_extra or {}))
+    return subprocess.run([sys.executable] + args, cwd=BASE_DIR, env=env, capture_output=True, text=True)
+
+def import_profile(module: str):
+    """Returns [(cumulative_us, self_us, name)] from -X importtime, slowest first."""
+    proc = _run(["-X", "importtime", "-c", f"import {module}"])
+    if proc.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            self_us, cumulative_us, name = (p.strip() for p in line[len("import time:"):].split("|"))
+            rows.append((int(cumulative_us), int(self_us), name))
+        except ValueError:
+            continue  # the header line
+    return sorted(rows, reverse=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=25, help="number of imports to list")
+    parser.add_argument("--module", default="app.main", help="module to profile")
+    args = parser.parse_args()
+
+    rows = import_profile(args.module)
+    total = next((cum for cum, _, name in rows if name == args.module), 0)
+    print(f"--- Slowest imports for {args.module} (total {total / 1000:.0f} ms) ---")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for cumulative_us, self_us, name in rows[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}  {name}")
+
+    loaded = {name.strip() for _, _, name in rows}
+    eager = [sdk for sdk in HEAVY_SDKS if sdk in loaded]
+    print(f"\nHeavy SDKs imported at startup: {', '.join(eager) if eager else 'none'}")
+
+    proc = _run(["-c", FIRST_RESPONSE_SNIPPET])
+    if proc.returncode != 0:
+        sys.exit(f"First-response run failed:\n{proc.stderr[-2000:]}")
+    imported, index_ms, menu_ms = proc.stdout.split()[-3:]
+    print("\n--- Cold process, time since interpreter start of app import ---")
+    print(f"app imported:         {imported:>6} ms")
+    print(f"first GET /:          {index_ms:>6} ms")
+    print(f"first menu click:     {menu_ms:>6} ms")
+
+if __name__ == "__main__":
+    main()
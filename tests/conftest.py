@@ -0,0 +1,9 @@
+# tests/conftest.py
+import os, sys, tempfile
+
+# Sessions, rate limits and metrics files go to a scratch directory, not instance/
+os.environ.setdefault("RUNTIME_DIR", tempfile.mkdtemp(prefix="flcs-tests-"))
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
@@ -0,0 +1,84 @@
+# tests/test_cache.py
+import os, types
+import pytest
+from app.chatbot import cache
+from app.chatbot.cache import SemanticCache, normalize_query
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(monotonic=clock))
+    return clock
+
+def answer(text):
+    return {"markdown": text, "buttons": ["Main Menu"]}
+
+def test_normalize_query():
+    assert normalize_query("  What   are the FEES?? ") == "what are the fees"
+
+def test_semantic_and_exact_hits(clock):
+    c = SemanticCache(max_entries=4, ttl=60, threshold=0.9)
+    c.store("What are the fees?", [1.0, 0.0], answer("fees"))
+    assert c.lookup_text("what are the fees") == answer("fees")
+    assert c.lookup("how much does it cost", [0.99, 0.05]) == answer("fees")
+    # The paraphrase is now an alias: repeats skip the embedding call
+    assert c.lookup_text("How much does it cost?") == answer("fees")
+    assert c.lookup("visa requirements", [0.0, 1.0]) is None
+    assert c.stats()["hits"] == 3 and c.stats()["misses"] == 1
+
+def test_results_are_copies(clock):
+    c = SemanticCache(max_entries=4, ttl=60, threshold=0.9)
+    c.store("q", [1.0, 0.0], answer("a"))
+    c.lookup_text("q")["buttons"].append("mutated")
+    assert c.lookup_text("q")["buttons"] == ["Main Menu"]
+
+def test_entries_expire_after_ttl(clock):
+    c = SemanticCache(max_entries=4, ttl=60, threshold=0.9)
+    c.store("q", [1.0, 0.0], answer("a"))
+    clock.now += 61
+    assert c.lookup_text("q") is None
+    assert c.lookup("q", [1.0, 0.0]) is None
+    assert c.stats()["entries"] == 0
+
+def test_expired_best_match_does_not_hide_a_live_one(clock):
+    c = SemanticCache(max_entries=4, ttl=100, threshold=0.9)
+    c.store("old", [1.0, 0.0], answer("old"))
+    clock.now += 50
+    c.store("new", [0.95, 0.31], answer("new"))
+    clock.now += 70   # "old" expired, "new" is 70 s old
+    assert c.lookup("query", [1.0, 0.0]) == answer("new")
+
+def test_least_recently_used_entry_is_evicted(clock):
+    c = SemanticCache(max_entries=2, ttl=60, threshold=0.9)
+    c.store("a", [1.0, 0.0, 0.0], answer("a"))
+    c.store("b", [0.0, 1.0, 0.0], answer("b"))
+    c.lookup_text("a")   # "b" is now the least recently used
+    c.store("c", [0.0, 0.0, 1.0], answer("c"))
+    assert c.lookup_text("b") is None
+    assert c.lookup_text("a") == answer("a") and c.lookup_text("c") == answer("c")
+    assert c.stats()["evictions"] == 1
+
+def test_invalidate_clears_everything(clock):
+    c = SemanticCache(max_entries=4, ttl=60, threshold=0.9)
+    c.store("q", [1.0, 0.0], answer("a"))
+    c.invalidate()
+    assert c.lookup_text("q") is None and c.lookup("q", [1.0, 0.0]) is None
+    assert c.stats()["invalidations"] == 1
+
+def test_index_version_change_clears_the_cache(clock, tmp_path):
+    version = tmp_path / ".index_version"
+    version.write_text("1")
+    c = SemanticCache(max_entries=4, ttl=600, threshold=0.9, version_path=str(version))
+    c.store("q", [1.0, 0.0], answer("a"))
+    stat = os.stat(version)
+    os.utime(version, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert c.lookup_text("q") == answer("a")   # version is checked at most every 5 s
+    clock.now += 6
+    assert c.lookup_text("q") is None
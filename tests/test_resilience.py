@@ -0,0 +1,173 @@
+# tests/test_resilience.py
+import asyncio, threading, time
+import pytest
+from app.utils import resilience
+from app.utils.resilience import (
+    Dependency, BulkheadFullError, CircuitOpenError, DeadlineExceeded, RejectedError,
+    BREAKER_FAILURES, BREAKER_COOLDOWN, CLOSED, OPEN, HALF_OPEN,
+)
+
+def fail():
+    raise ConnectionError("refused")
+
+def open_breaker(dep):
+    for _ in range(BREAKER_FAILURES):
+        with pytest.raises(ConnectionError):
+            dep.call(fail)
+    assert dep.state == OPEN
+
+def cool_down(dep):
+    dep._opened_at -= BREAKER_COOLDOWN
+
+def test_breaker_opens_after_consecutive_failures():
+    dep = Dependency("test", timeout=5)
+    open_breaker(dep)
+    called = []
+    with pytest.raises(CircuitOpenError):
+        dep.call(lambda: called.append(1))
+    assert not called and dep.stats["rejected"] == 1
+
+def test_success_resets_the_failure_count():
+    dep = Dependency("test", timeout=5)
+    for _ in range(BREAKER_FAILURES - 1):
+        with pytest.raises(ConnectionError):
+            dep.call(fail)
+    assert dep.call(lambda: "ok") == "ok"
+    with pytest.raises(ConnectionError):
+        dep.call(fail)
+    assert dep.state == CLOSED
+
+def test_half_open_lets_one_trial_through():
+    dep = Dependency("test", timeout=5)
+    open_breaker(dep)
+    cool_down(dep)
+    started, release = threading.Event(), threading.Event()
+    def trial():
+        started.set()
+        release.wait(5)
+        return "ok"
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("value", dep.call(trial)))
+    thread.start()
+    started.wait(5)
+    assert dep.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        dep.call(lambda: "second")
+    release.set()
+    thread.join()
+    assert result["value"] == "ok" and dep.state == CLOSED
+
+def test_failed_trial_reopens_the_breaker():
+    dep = Dependency("test", timeout=5)
+    open_breaker(dep)
+    cool_down(dep)
+    with pytest.raises(ConnectionError):
+        dep.call(fail)
+    assert dep.state == OPEN and dep.stats["opened"] == 2
+
+def test_deadline_abandons_a_hung_call():
+    dep = Dependency("test", timeout=0.05)
+    release = threading.Event()
+    started = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        dep.call(release.wait, 5)
+    assert time.perf_counter() - started < 1
+    assert dep.stats["timeouts"] == 1
+    release.set()
+
+def test_writes_are_never_abandoned_at_the_deadline():
+    dep = Dependency("test", timeout=0.01, hedge=True, write=True)
+    assert not dep.hedge
+    assert dep.call(lambda: (time.sleep(0.05), "appended")[1]) == "appended"
+    assert dep.stats["timeouts"] == 0
+
+def test_bulkhead_rejects_calls_over_the_limit():
+    dep = Dependency("test", timeout=5, max_concurrency=2)
+    release = threading.Event()
+    threads = [threading.Thread(target=dep.call, args=(release.wait, 5)) for _ in range(2)]
+    for t in threads:
+        t.start()
+    while dep.snapshot()["in_flight"] < 2:
+        time.sleep(0.001)
+    with pytest.raises(BulkheadFullError) as info:
+        dep.call(lambda: "third")
+    assert isinstance(info.value, RejectedError)
+    # A full bulkhead is not a dependency failure
+    assert dep.stats["saturated"] == 1 and dep.stats["failures"] == 0 and dep.state == CLOSED
+    release.set()
+    for t in threads:
+        t.join()
+    while dep.snapshot()["in_flight"]:
+        time.sleep(0.001)
+    assert dep.call(lambda: "ok") == "ok"
+
+def test_bulkhead_limit_holds_under_concurrent_admission():
+    dep = Dependency("test", timeout=5, max_concurrency=3)
+    lock, running, peak = threading.Lock(), [0], [0]
+    def work():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+    barrier = threading.Barrier(40)
+    rejected = []
+    def caller():
+        barrier.wait()
+        try:
+            dep.call(work)
+        except BulkheadFullError:
+            rejected.append(1)
+    threads = [threading.Thread(target=caller) for _ in range(40)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak[0] <= 3 and rejected
+    while dep.snapshot()["in_flight"]:
+        time.sleep(0.001)
+
+def test_breaker_rejection_does_not_leak_a_bulkhead_slot():
+    dep = Dependency("test", timeout=5, max_concurrency=1)
+    open_breaker(dep)
+    for _ in range(3):
+        with pytest.raises(CircuitOpenError):
+            dep.call(lambda: None)
+    assert dep.snapshot()["in_flight"] == 0
+
+def test_hedge_wins_when_the_primary_is_slow(monkeypatch):
+    dep = Dependency("test", timeout=5, hedge=True)
+    monkeypatch.setattr(dep, "_hedge_delay", lambda: 0.01)
+    calls = []
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return "slow"
+        return "fast"
+    assert dep.call(fn) == "fast"
+    assert dep.stats["hedged"] == 1 and dep.stats["hedge_wins"] == 1
+
+def test_async_calls_share_the_bulkhead_and_breaker():
+    async def scenario():
+        dep = Dependency("test", timeout=5, max_concurrency=2)
+        async def slow():
+            await asyncio.sleep(0.05)
+            return 1
+        results = await asyncio.gather(*[dep.acall(slow) for _ in range(5)], return_exceptions=True)
+        assert results.count(1) == 2
+        assert sum(isinstance(r, BulkheadFullError) for r in results) == 3
+        assert dep.snapshot()["in_flight"] == 0
+
+        async def hang():
+            await asyncio.sleep(5)
+        dep.timeout = 0.01
+        with pytest.raises(DeadlineExceeded):
+            await dep.acall(hang)
+    asyncio.run(scenario())
+
+def test_registry_has_a_bounded_pool_per_dependency():
+    for name, dep in resilience.DEPENDENCIES.items():
+        assert dep.max_concurrency > 0
+        assert dep.write == (name == "sheets")
@@ -0,0 +1,83 @@
+# tests/test_retrieval.py
+import pytest
+from app.chatbot import core
+from app.chatbot.lexical_index import LexicalIndexWriter, LexicalIndex, tokenize
+from app.chatbot.core import RAG_MIN_SCORE, RAG_CONFIDENT_SCORE
+
+CHUNKS = [
+    "Tuition fees for the master programme are paid in two instalments.",
+    "The student visa requires proof of accommodation and health insurance.",
+    "Scholarships cover tuition fees for students with a low family income.",
+]
+
+@pytest.fixture
+def lexical_index(tmp_path):
+    writer = LexicalIndexWriter(str(tmp_path))
+    for i, text in enumerate(CHUNKS):
+        writer.add(f"doc-{i}", {"text": text, "source": "guide.pdf", "page": i + 1})
+    writer.finish()
+    return LexicalIndex(str(tmp_path))
+
+def test_tokenize_folds_accents_plurals_and_stopwords():
+    assert tokenize("What are the Fees in Città?") == ["fee", "citta"]
+    assert tokenize("the visa status") == ["visa", "status"]
+
+def test_bm25_ranks_the_matching_chunk_first(lexical_index):
+    hits = lexical_index.query("student visa insurance", top_k=3)
+    assert hits[0][2]["page"] == 2
+    assert hits[0][1] == pytest.approx(1.0)   # every query word is in the chunk
+    assert [bm25 for bm25, _, _ in hits] == sorted((bm25 for bm25, _, _ in hits), reverse=True)
+
+def test_bm25_coverage_counts_words_missing_from_the_corpus(lexical_index):
+    bm25, coverage, meta = lexical_index.query("tuition fees bitcoin", top_k=1)[0]
+    assert 0 < coverage < 1 and "fees" in meta["text"]
+
+def test_bm25_without_matches(lexical_index):
+    assert lexical_index.query("bitcoin mining", top_k=3) == []
+    assert lexical_index.query("what is the", top_k=3) == []
+
+# --- Gating (dense scores only) ---
+class FakeLexical:
+    def __init__(self, matches):
+        self.matches = matches
+
+    def query(self, text, top_k):
+        return [dict(m) for m in self.matches]
+
+@pytest.fixture
+def lexical(monkeypatch):
+    monkeypatch.setattr(core, "HYBRID_SEARCH_ENABLED", True)
+    fake = FakeLexical([
+        {"text": "common words chunk", "bm25": 9.0, "coverage": 1.0},
+        {"text": "dense chunk", "bm25": 1.0, "coverage": 0.5},
+    ])
+    monkeypatch.setattr(core, "lexical_retriever", fake)
+    return fake
+
+def test_strong_lexical_match_does_not_pass_a_weak_dense_gate(lexical):
+    contexts, speculate = core._select_contexts("q", [{"text": "dense chunk", "score": RAG_MIN_SCORE - 0.1}])
+    assert contexts == [] and not speculate
+
+def test_confident_dense_match_keeps_lexical_chunks_for_recall(lexical):
+    contexts, speculate = core._select_contexts("q", [{"text": "dense chunk", "score": RAG_CONFIDENT_SCORE + 0.1}])
+    assert not speculate
+    assert {c["text"] for c in contexts} == {"dense chunk", "common words chunk"}
+    fused = next(c for c in contexts if c["text"] == "dense chunk")
+    assert fused["score"] == RAG_CONFIDENT_SCORE + 0.1   # a fused chunk keeps its dense score
+
+def test_borderline_dense_match_starts_a_speculative_search(lexical):
+    score = (RAG_MIN_SCORE + RAG_CONFIDENT_SCORE) / 2
+    contexts, speculate = core._select_contexts("q", [{"text": "other", "score": score}])
+    assert contexts and speculate
+
+def test_dense_chunks_under_the_gate_are_dropped(lexical):
+    dense = [{"text": "good", "score": RAG_CONFIDENT_SCORE + 0.1}, {"text": "dense chunk", "score": RAG_MIN_SCORE - 0.1}]
+    contexts, _ = core._select_contexts("q", dense)
+    assert "dense chunk" not in {c["text"] for c in contexts}
+
+def test_vector_index_down_uses_lexical_matches_speculatively(lexical):
+    contexts, speculate = core._select_contexts("q", None)
+    assert len(contexts) == 2 and speculate
+
+def test_empty_dense_result_skips_the_rag_call(lexical):
+    assert core._select_contexts("q", []) == ([], False)
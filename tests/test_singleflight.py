@@ -0,0 +1,102 @@
+# tests/test_singleflight.py
+import asyncio, threading
+import pytest
+from app.chatbot.singleflight import SingleFlight, AsyncSingleFlight, LeaderError
+
+def follow(flight, call):
+    """Runs flight.wait(call) on another thread; returns a dict filled with its outcome."""
+    out = {}
+    def run():
+        try:
+            out["result"] = flight.wait(call)
+        except Exception as e:
+            out["error"] = e
+    thread = threading.Thread(target=run)
+    thread.start()
+    out["thread"] = thread
+    return out
+
+def test_followers_share_the_leaders_result():
+    flight = SingleFlight(timeout=5)
+    call, leader = flight.begin("k")
+    assert leader
+    followers = []
+    for _ in range(3):
+        same, is_leader = flight.begin("k")
+        assert same is call and not is_leader
+        followers.append(follow(flight, call))
+    flight.finish("k", call, {"markdown": "shared"})
+    for f in followers:
+        f["thread"].join()
+        assert f["result"] == {"markdown": "shared"}
+    assert flight.stats["leaders"] == 1 and flight.stats["coalesced"] == 3
+    assert flight.begin("k")[1]   # finished: the next caller leads a new flight
+
+def test_each_follower_gets_its_own_leader_error():
+    flight = SingleFlight(timeout=5)
+    call, _ = flight.begin("k")
+    followers = [follow(flight, call) for _ in range(3)]
+    error = ValueError("boom")
+    flight.finish("k", call, error=error)
+    errors = []
+    for f in followers:
+        f["thread"].join()
+        errors.append(f["error"])
+    assert all(isinstance(e, LeaderError) and e.__cause__ is error and str(e) == "boom" for e in errors)
+    assert len({id(e) for e in errors}) == 3
+    assert error.__traceback__ is None   # never re-raised by a follower
+
+def test_abandoned_flight_makes_the_follower_run_it_itself():
+    flight = SingleFlight(timeout=5)
+    call, _ = flight.begin("k")
+    f = follow(flight, call)
+    flight.finish("k", call)
+    f["thread"].join()
+    assert f["result"] is None and flight.stats["abandoned"] == 1
+
+def test_follower_gives_up_after_the_timeout():
+    flight = SingleFlight(timeout=0.01)
+    call, _ = flight.begin("k")
+    assert flight.wait(call) is None
+    assert flight.stats["timeouts"] == 1
+
+def test_do_runs_fn_once_for_concurrent_callers():
+    flight = SingleFlight(timeout=5)
+    release, calls, results = threading.Event(), [], []
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "answer"
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", fn))) for _ in range(4)]
+    threads[0].start()
+    while not flight.get_stats()["in_flight"]:
+        pass
+    for t in threads[1:]:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join()
+    assert results == ["answer"] * 4 and len(calls) == 1
+
+def test_async_followers_share_result_and_errors():
+    async def scenario():
+        flight = AsyncSingleFlight(timeout=5)
+        fut, leader = flight.begin("k")
+        waiter = asyncio.ensure_future(flight.wait(fut))
+        assert flight.begin("k") == (fut, False)
+        flight.finish("k", fut, {"markdown": "shared"})
+        assert await waiter == {"markdown": "shared"}
+
+        fut, _ = flight.begin("e")
+        waiters = [asyncio.ensure_future(flight.wait(fut)) for _ in range(2)]
+        error = RuntimeError("down")
+        flight.finish("e", fut, error=error)
+        for w in waiters:
+            with pytest.raises(LeaderError) as info:
+                await w
+            assert info.value.__cause__ is error
+
+        fut, _ = flight.begin("a")
+        flight.finish("a", fut)
+        assert await flight.wait(fut) is None
+    asyncio.run(scenario())